@@ -0,0 +1,156 @@
+"""End-to-end benchmark for make_dualsub.merge_dir.
+
+Notes:
+    It generates a synthetic .msg tree (see make_corpus.py) and runs merge_dir on it.
+    Results (entries/s, MB/s, peak RSS, seconds for each stage) are saved as json.
+    With --baseline, it compares the results with a previous json and
+    exits with 1 when entries/s is slower than the baseline by more than --tolerance.
+
+    python bench/bench_dualsub.py [options]
+    - --work=dir: folder for the corpus and outputs (default: bench_work)
+    - --out=json: results file (default: bench_results.json)
+    - --baseline=json: results file to compare with
+    - --jobs=N: number of worker processes
+    - Other options are the same as make_corpus.py. (--files, --entries, --langs, ...)
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import platform
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from io_util import save_json, load_json  # noqa: E402
+from make_dualsub import merge_dir, read_json, set_merge_cache_size, MERGE_CACHE_SIZE  # noqa: E402
+from entry_classifier import EntryClassifier  # noqa: E402
+from REMessage import SHORT_LANG_TO_INT  # noqa: E402
+from make_corpus import make_corpus  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+STAGES = ["import", "classify", "merge", "export"]
+PATTERNS_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "entry_patterns", "re4.json")
+
+
+def get_peak_rss_mb():
+    """Get peak RSS of this process and its children. (None if unknown)"""
+    if resource is None:
+        return None
+    rss = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+           + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # KiB on Linux, bytes on macOS
+    if sys.platform == "darwin":
+        return rss / (1 << 20)
+    return rss / (1 << 10)
+
+
+def run_bench(corpus_dir, out, main_lang="en", sub_lang="ja", jobs=1, repeat=3) -> dict:
+    patterns_json = read_json(PATTERNS_JSON)
+    best = None
+    for _ in range(repeat):
+        shutil.rmtree(out, ignore_errors=True)
+        # Cold caches for each run.
+        set_merge_cache_size(MERGE_CACHE_SIZE)
+        classifier = EntryClassifier.from_json(patterns_json)
+        profile = []
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            failed = merge_dir(corpus_dir, out, SHORT_LANG_TO_INT[main_lang], SHORT_LANG_TO_INT[sub_lang],
+                               classifier, jobs=jobs, profile=profile)
+        wall_time = time.perf_counter() - start
+        if len(failed) > 0:
+            raise RuntimeError(f"Failed to process {len(failed)} file(s).")
+        if best is None or wall_time < best[0]:
+            best = (wall_time, profile)
+
+    wall_time, profile = best
+    entries = sum(stats["entries"] for stats in profile)
+    in_bytes = sum(stats["in_bytes"] for stats in profile)
+    return {
+        "wall_time": wall_time,
+        "files": len(profile),
+        "entries": entries,
+        "in_bytes": in_bytes,
+        "entries_per_sec": entries / wall_time,
+        "mb_per_sec": in_bytes / (1 << 20) / wall_time,
+        "peak_rss_mb": get_peak_rss_mb(),
+        # Sum of all files. (It can be larger than wall_time when jobs > 1.)
+        "stages": {stage: sum(stats[stage] for stats in profile) for stage in STAGES}
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """Print differences from the baseline. Returns False when it's a regression."""
+    print("Compared with baseline:")
+    keys = ["entries_per_sec", "mb_per_sec", "peak_rss_mb"]
+    for key in keys:
+        new, old = results.get(key), baseline.get(key)
+        if new is None or old is None or old == 0:
+            continue
+        print(f"  {key}: {old:.2f} -> {new:.2f} ({(new / old - 1) * 100:+.1f}%)")
+    for stage in STAGES:
+        new, old = results["stages"].get(stage), baseline.get("stages", {}).get(stage)
+        if new is None or old is None or old == 0:
+            continue
+        print(f"  {stage}: {old:.3f}s -> {new:.3f}s ({(new / old - 1) * 100:+.1f}%)")
+    if baseline.get("corpus") != results["corpus"]:
+        print("  Warning: corpus settings are different from the baseline.")
+    old_speed = baseline.get("entries_per_sec", 0)
+    return results["entries_per_sec"] >= old_speed * (1 - tolerance)
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--work', type=str, default="bench_work", help='folder for the corpus and outputs.')
+    parser.add_argument('--out', type=str, default="bench_results.json", help='results file.')
+    parser.add_argument('--baseline', type=str, default=None, help='results file to compare with.')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed slowdown from the baseline. (0.1 means 10%%)')
+    parser.add_argument('--jobs', type=int, default=1, help='number of worker processes.')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs. The fastest one is used.')
+    parser.add_argument('--files', type=int, default=100, help='number of .msg files.')
+    parser.add_argument('--dirs', type=int, default=4, help='number of sub folders.')
+    parser.add_argument('--entries', type=int, default=200, help='number of entries for each file.')
+    parser.add_argument('--langs', type=int, default=33, help='number of languages.')
+    parser.add_argument('--text_length', type=int, default=8, help='average number of words for each text.')
+    parser.add_argument('--seed', type=int, default=0, help='random seed.')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    corpus_dir = os.path.join(args.work, "corpus")
+    shutil.rmtree(corpus_dir, ignore_errors=True)
+    print("Generating corpus...")
+    corpus = make_corpus(corpus_dir, files=args.files, dirs=args.dirs, entries=args.entries,
+                         langs=args.langs, text_length=args.text_length, seed=args.seed)
+
+    print("Running merge_dir...")
+    results = run_bench(corpus_dir, os.path.join(args.work, "out"),
+                        jobs=args.jobs, repeat=args.repeat)
+    results["corpus"] = corpus
+    results["jobs"] = args.jobs
+    results["python"] = platform.python_version()
+    save_json(results, args.out)
+
+    print(f"Files: {results['files']}, Entries: {results['entries']}")
+    print(f"Time: {results['wall_time']:.3f}s")
+    print(f"Throughput: {results['entries_per_sec']:.1f} entries/s, {results['mb_per_sec']:.2f} MB/s")
+    if results["peak_rss_mb"] is not None:
+        print(f"Peak RSS: {results['peak_rss_mb']:.1f} MB")
+    for stage, sec in results["stages"].items():
+        print(f"  {stage}: {sec:.3f}s")
+    print(f"Saved results to {args.out}")
+
+    if args.baseline is not None:
+        if not compare(results, load_json(args.baseline), args.tolerance):
+            print("Regression detected.")
+            sys.exit(1)
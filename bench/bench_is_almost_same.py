@@ -0,0 +1,86 @@
+"""Micro-benchmark for is_almost_same.
+
+Notes:
+    It compares the old implementation (normalizing both text for each call)
+    with NormalizedText in make_dualsub.py. (normalizing the sub-language text once for each entry)
+    Each "entry" compares 33 languages with the same sub-language text like merge_entry does.
+
+    python bench/bench_is_almost_same.py [--entries=N] [--repeat=N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from make_dualsub import NormalizedText, is_almost_same  # noqa: E402
+
+
+def is_almost_same_old(text1, text2):
+    tl1 = text1.lower()
+    tl2 = text2.lower()
+    if (tl2 in tl1 or tl2 == tl1 + "s"
+        or tl2 == tl1 + "."
+        or tl2 == tl1 + "es"
+        or tl2 == tl1[:-1] + "ies"
+        or tl2 == "the " + tl1):
+        return True
+    if tl1.replace(" ", "") == tl2.replace(" ", ""):
+        return True
+    return False
+
+
+WORDS = ["Item", "Key", "Entry", "Yes", "No", "The Merchant", "Ammo", "Box", "Herb", "Green"]
+
+
+def make_entries(entry_count: int, lang_count: int = 33):
+    random.seed(0)
+    entries = []
+    for _ in range(entry_count):
+        sub_text = " ".join(random.choices(WORDS, k=random.randint(1, 4)))
+        contents = []
+        for _ in range(lang_count):
+            text = random.choice([
+                sub_text, sub_text + "s", sub_text[:-1] + "ies", "the " + sub_text,
+                sub_text.replace(" ", ""), " ".join(random.choices(WORDS, k=3))
+            ])
+            contents.append(text)
+        entries.append((sub_text, contents))
+    return entries
+
+
+def run_old(entries):
+    for sub_text, contents in entries:
+        for text in contents:
+            is_almost_same_old(text, sub_text)
+
+
+def run_new(entries):
+    for sub_text, contents in entries:
+        sub_norm = NormalizedText(sub_text)
+        for text in contents:
+            is_almost_same(text, sub_norm)
+
+
+def check(entries):
+    for sub_text, contents in entries:
+        for text in contents:
+            for t1, t2 in [(text, sub_text), (sub_text, text)]:
+                assert is_almost_same_old(t1, t2) == is_almost_same(t1, NormalizedText(t2)), (t1, t2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=2000, help='number of entries')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs')
+    args = parser.parse_args()
+
+    entries = make_entries(args.entries)
+    check(entries)
+    old = min(timeit.repeat(lambda: run_old(entries), number=1, repeat=args.repeat))
+    new = min(timeit.repeat(lambda: run_new(entries), number=1, repeat=args.repeat))
+    print(f"old: {old * 1000:.2f} ms")
+    print(f"new: {new * 1000:.2f} ms")
+    print(f"speedup: {old / new:.2f}x")
@@ -0,0 +1,106 @@
+"""Generate synthetic .msg trees for benchmarks.
+
+Notes:
+    Entry names are made from prefixes in entry_patterns/re4.json.
+    So, all categories (ignore, one line, three lines) are used.
+    Some text (e.g. "Yes", item names) appears many times like game files.
+
+    python bench/make_corpus.py out [options]
+    - out: output folder
+    - --files=N: number of .msg files
+    - --dirs=N: number of sub folders
+    - --entries=N: number of entries for each file
+    - --langs=N: number of languages (max: 33)
+    - --text_length=N: average number of words for each text
+    - --version=N: .msg version (22 for RE4)
+    - --seed=N: random seed
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from io_util import mkdir  # noqa: E402
+from REMessage import Message, LANG_LIST  # noqa: E402
+
+NAME_PREFIXES = [
+    "ch_mes_main_Sys_", "ch_mes_main_Sys_Caption_", "ch_mes_Main_cs", "ch_mes_Main_Speech_",
+    "ch_mes_Tips_Title_", "ch_mes_Item_Name_", "ch_mes_QuestReward", "ch_mes_RadioLog_",
+    "ch_mes_Subtitle_Name_", "ch_mes_StatusEffect", "ch_mes_Caption_", "Dev1_Term_",
+]
+WORDS = [
+    "the", "merchant", "item", "key", "door", "open", "close", "leon", "ashley", "ammo",
+    "handgun", "shotgun", "herb", "green", "red", "yellow", "village", "castle", "island",
+    "treasure", "case", "attache", "weapon", "upgrade", "quest", "request", "reward", "spinel",
+]
+COMMON_TEXT = ["Yes", "No", "OK", "Cancel", "Back", "Confirm", "Exit"]
+
+
+def make_text(rng: random.Random, lang: int, text_length: int) -> str:
+    if rng.random() < 0.15:
+        return rng.choice(COMMON_TEXT)
+    lines = []
+    for _ in range(rng.choice([1, 1, 1, 2, 3])):
+        words = rng.choices(WORDS, k=max(1, int(rng.expovariate(1 / text_length))))
+        lines.append(f"{lang}:" + " ".join(words).capitalize())
+    return "\r\n".join(lines)
+
+
+def make_msg(rng: random.Random, entry_count: int, lang_count: int,
+             text_length: int, version: int, index: int) -> Message:
+    msg = Message()
+    msg.version = version
+    msg.langs = list(range(lang_count))
+    msg.attr_types = [2]
+    msg.attr_names = ["note"]
+    for i in range(entry_count):
+        name = rng.choice(NAME_PREFIXES) + f"{index:04}_{i:04}"
+        contents = [make_text(rng, lang, text_length) if rng.random() > 0.05 else ""
+                    for lang in range(lang_count)]
+        msg.add_entry(name, contents, attributes=[""])
+    return msg
+
+
+def make_corpus(out, files=100, dirs=4, entries=200, langs=33,
+                text_length=8, version=22, seed=0) -> dict:
+    """Generate .msg files in out/dir_*/ and return the settings."""
+    if langs > len(LANG_LIST):
+        raise RuntimeError(f"--langs should be {len(LANG_LIST)} or less.")
+    rng = random.Random(seed)
+    for i in range(files):
+        directory = os.path.join(out, f"dir_{i % max(dirs, 1):02}")
+        mkdir(directory)
+        msg = make_msg(rng, entries, langs, text_length, version, i)
+        msg.export_msg(os.path.join(directory, f"bench_{i:05}.msg.{version}"))
+    return {
+        "files": files,
+        "dirs": dirs,
+        "entries": entries,
+        "langs": langs,
+        "text_length": text_length,
+        "version": version,
+        "seed": seed
+    }
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('out', type=str, help='output directory.')
+    parser.add_argument('--files', type=int, default=100, help='number of .msg files.')
+    parser.add_argument('--dirs', type=int, default=4, help='number of sub folders.')
+    parser.add_argument('--entries', type=int, default=200, help='number of entries for each file.')
+    parser.add_argument('--langs', type=int, default=33, help='number of languages.')
+    parser.add_argument('--text_length', type=int, default=8, help='average number of words for each text.')
+    parser.add_argument('--version', type=int, default=22, help='.msg version.')
+    parser.add_argument('--seed', type=int, default=0, help='random seed.')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    make_corpus(args.out, files=args.files, dirs=args.dirs, entries=args.entries,
+                langs=args.langs, text_length=args.text_length,
+                version=args.version, seed=args.seed)
+    print(f"Generated {args.files} files in {args.out}")
@@ -14,13 +14,18 @@ Notes:
     fslt2 = FontSlot()
     fslt2.import_json("*.json")
     fslt2.export_fslt("*.fslt.*")
+
+    # In memory
+    from_buffer parses any bytes-like object (bytes, bytearray, mmap, ...) without temp files.
+    fslt = FontSlot.from_bytes(pak.read("natives/stm/..."))
+    data = fslt.to_bytes()
 """
 import io
 import os
+import struct
 from typing import Final
 from io_util import (
-    read_uint32, read_uint32_array, read_uint64, read_uint64_array,
-    read_float32_array, read_wstr,
+    BinaryReader,
     write_uint32, write_uint32_array, write_uint64, write_uint64_array,
     write_float32_array, write_wstr,
     save_json, load_json, check_type, check_length, get_index
@@ -28,6 +33,7 @@ from io_util import (
 
 
 class FileInfo:
+    HEAD: Final[struct.Struct] = struct.Struct("<ffffQ")
     HEAD_SIZE: Final[int] = 24
 
     def __init__(self):
@@ -38,14 +44,11 @@ class FileInfo:
         self.__name_offs: int = 0  # offset for name map
         self.__name_index: int = 0  # index for name map
 
-    def read_head(self, f: io.BufferedReader):
-        # struct.unpack("<ffffQ", f.read(24))
-        self.unk = read_float32_array(f, 4)
-        self.__name_offs = read_uint64(f)
+    def read_head(self, f: BinaryReader):
+        *self.unk, self.__name_offs = f.unpack(FileInfo.HEAD)
 
-    def read_name(self, f: io.BufferedReader):
-        f.seek(self.__name_offs)
-        self.name = read_wstr(f)
+    def read_name(self, f: BinaryReader):
+        self.name = f.read_wstr_at(self.__name_offs)
 
     def update_name_map(self, name_map: list[str]):
         index = get_index(name_map, self.name)
@@ -78,6 +81,7 @@ class FileInfo:
 
 
 class UnkInfo:
+    HEAD: Final[struct.Struct] = struct.Struct("<QQQffIIII")
     HEAD_SIZE: Final[int] = 48
 
     def __init__(self):
@@ -89,17 +93,14 @@ class UnkInfo:
         self.__name_offsets: list[int] = [0, 0, 0]  # offsets for name map
         self.__name_indices: list[int] = [0, 0, 0]  # indices for name map
 
-    def read_head(self, f: io.BufferedReader):
-        # struct.unpack("<QQQffIIII", f.read(48))
-        self.__name_offsets = read_uint64_array(f, 3)
-        self.unk = read_float32_array(f, 2)
-        self.unk2 = read_uint32_array(f, 4)
+    def read_head(self, f: BinaryReader):
+        values = f.unpack(UnkInfo.HEAD)
+        self.__name_offsets = list(values[:3])
+        self.unk = list(values[3:5])
+        self.unk2 = list(values[5:])
 
-    def read_name(self, f: io.BufferedReader):
-        self.names = []
-        for offs in self.__name_offsets:
-            f.seek(offs)
-            self.names.append(read_wstr(f))
+    def read_name(self, f: BinaryReader):
+        self.names = [f.read_wstr_at(offs) for offs in self.__name_offsets]
 
     def update_name_map(self, name_map: list[str]):
         self.__name_indices = []
@@ -157,25 +158,25 @@ class Slot:
             case _:
                 pass
 
-    def read_fileinfo(self, f: io.BufferedReader):
+    def read_fileinfo(self, f: BinaryReader):
         match self.version:
             case 2:
-                count = read_uint64(f)
+                count = f.read_uint64()
                 self.__info_counts = [count]
                 info_list = [FileInfo() for i in range(count)]
                 _ = [info.read_head(f) for info in info_list]
                 self.info_lists = [info_list]
             case 4:
-                self.__info_counts = read_uint32_array(f, 3)
-                nul = read_uint32(f)
+                self.__info_counts = f.read_uint32_array(3).tolist()
+                nul = f.read_uint32()
                 assert nul == 0
-                self.__offset_offsets = read_uint64_array(f, 3)  # offsets to info_offsets
+                self.__offset_offsets = f.read_uint64_array(3).tolist()  # offsets to info_offsets
                 current = f.tell()
                 # self.__info_offsets_list = []
                 self.info_lists = []
                 for offs_offs, count, clas in zip(self.__offset_offsets, self.__info_counts, self.__classes):
                     f.seek(offs_offs)
-                    info_offsets = read_uint64_array(f, count)
+                    info_offsets = f.read_uint64_array(count)
                     # self.__info_offsets_list.append(info_offsets)
                     info_list = [clas() for i in range(count)]
                     for info, offs in zip(info_list, info_offsets):
@@ -186,7 +187,7 @@ class Slot:
             case _:
                 pass
 
-    def read_name(self, f: io.BufferedReader):
+    def read_name(self, f: BinaryReader):
         for info_list in self.info_lists:
             _ = [info.read_name(f) for info in info_list]
 
@@ -243,7 +244,6 @@ class Slot:
                     for offs, info in zip(info_offsets, info_list):
                         f.seek(offs)
                         info.write_head(f)
-                    self.info_lists.append(info_list)
                 f.seek(current)
             case _:
                 pass
@@ -293,8 +293,8 @@ class FontSlot:
         self.version: int = 0
         self.slots: list[Slot] = []
 
-    def read(self, f: io.BufferedReader):
-        self.version = read_uint32(f)
+    def read(self, f: BinaryReader):
+        self.version = f.read_uint32()
         if self.version not in FontSlot.SUPPORTED_VERSIONS:
             raise RuntimeError(f"Unsupported file version. ({self.version})")
 
@@ -302,7 +302,7 @@ class FontSlot:
         if magic != FontSlot.MAGIC:
             raise RuntimeError("Not .fslt file.")
 
-        slot_offsets = read_uint64_array(f, FontSlot.SLOT_COUNT)
+        slot_offsets = f.read_uint64_array(FontSlot.SLOT_COUNT)
 
         self.slots = [Slot(self.version) for i in range(FontSlot.SLOT_COUNT)]
         for slot, offs in zip(self.slots, slot_offsets):
@@ -373,9 +373,27 @@ class FontSlot:
         for slot, j in zip(self.slots, slots_json):
             slot.set_json(j)
 
+    @staticmethod
+    def from_buffer(buffer):
+        """Parse a bytes-like object. (bytes, bytearray, mmap, ...)"""
+        fslt = FontSlot()
+        with BinaryReader(buffer) as reader:
+            fslt.read(reader)
+        return fslt
+
+    @staticmethod
+    def from_bytes(data: bytes):
+        """Same as from_buffer. All data is decoded while parsing, so the buffer isn't kept."""
+        return FontSlot.from_buffer(data)
+
+    def to_bytes(self) -> bytes:
+        f = io.BytesIO()
+        self.write(f)
+        return f.getvalue()
+
     def import_fslt(self, file: str):
-        with io.open(file, "rb") as f:
-            self.read(f)
+        with BinaryReader.open_file(file) as reader:
+            self.read(reader)
 
     def export_fslt(self, file: str):
         with io.open(file, "wb") as f:
@@ -2,7 +2,8 @@
 
 Notes:
     - Still messy codes.
-    - No functions for *.gui export and *.json import yet.
+    - No functions for *.json import yet.
+      *.gui export only writes changed attribute values to the original data. (See to_bytes)
     - Used alphaZomega's .bt to get hints for file structure.
 
     # Sample codes
@@ -10,14 +11,20 @@ Notes:
     gui = GUIResource()
     gui.import_gui("*.gui.540034")
     gui.export_json("*.json")
+
+    # Edit in memory
+    gui = GUIResource.from_bytes(data)
+    attr = gui["main"]["c_caption"]["Position"]
+    attr.set_value([attr.value[0], attr.value[1] - 40])
+    new_data = gui.to_bytes()
 """
 
 import io
 from enum import IntEnum
 import os
+import struct
 from io_util import (
-    mkdir, read_int16, read_uint16, read_int32, read_uint32, read_uint64, read_uint64_array,
-    read_float32, read_float32_array, read_str, read_wstr,
+    BinaryReader, mkdir,
     write_uint32, write_uint64, write_float32_array, write_str,
     save_json
 )
@@ -82,32 +89,32 @@ class PropType(IntEnum):
     GameObjectRef = 0x38
 
 
-def read_prop(f: io.BufferedReader, prop_type: PropType, base_offs=0):
+def read_prop(f: BinaryReader, prop_type: PropType, base_offs=0):
     current = f.tell()
     offset = current
     match prop_type:
         case PropType.Bool:
-            value = read_uint64(f) > 0
+            value = f.read_uint64() > 0
         case PropType.U8 | PropType.U16 | PropType.U32 | PropType.U64:
-            value = read_uint64(f)
+            value = f.read_uint64()
         case PropType.F32:
-            value = read_float32(f)
+            value = f.read_float32()
         case _:
             value = None
-            offset = read_uint64(f)
+            offset = f.read_uint64()
     if offset != current:
         f.seek(base_offs + offset)
         match prop_type:
             case PropType.Str16 | PropType.Asset:
-                value = read_wstr(f)
+                value = f.read_wstr()
             case PropType.Enum | PropType.Str8:
-                value = read_str(f)
+                value = f.read_str()
             case PropType.Size | PropType.Float2:
-                value = read_float32_array(f, 2)
+                value = f.read_float32_array(2).tolist()
             case PropType.Vec3 | PropType.Float3:
-                value = read_float32_array(f, 3)
+                value = f.read_float32_array(3).tolist()
             case PropType.Float4 | PropType.Rect:
-                value = read_float32_array(f, 4)
+                value = f.read_float32_array(4).tolist()
             case PropType.Guid:
                 value = str(f.read(16))
             case PropType.Color:
@@ -116,28 +123,57 @@ def read_prop(f: io.BufferedReader, prop_type: PropType, base_offs=0):
     return value, offset
 
 
+# Formats of values that can be changed in place. (See read_prop)
+PATCH_FORMATS = {
+    PropType.Bool: "<Q",
+    PropType.U8: "<Q",
+    PropType.U16: "<Q",
+    PropType.U32: "<Q",
+    PropType.U64: "<Q",
+    PropType.F32: "<f",
+    PropType.Size: "<2f",
+    PropType.Float2: "<2f",
+    PropType.Vec3: "<3f",
+    PropType.Float3: "<3f",
+    PropType.Float4: "<4f",
+    PropType.Rect: "<4f"
+}
+
+
 class Attribute:
-    def read_head(self, f: io.BufferedReader):
-        self.type = PropType(read_uint32(f))
-        self.unk = read_int32(f)
-        self.name_offs = read_uint64(f)
+    def read_head(self, f: BinaryReader):
+        self.type = PropType(f.read_uint32())
+        self.unk = f.read_int32()
+        self.name_offs = f.read_uint64()
         self.read_value(f)
         self.hash = f.read(4) # hash?
         padding = f.read(4)
         assert padding == b"\x00" * 4
+        self.changed = False
 
-    def read_value(self, f: io.BufferedReader):
+    def read_value(self, f: BinaryReader):
         self.offset_to_offset = f.tell()
         self.value, self.value_offs = read_prop(f, self.type)
 
-    def read_name(self, f: io.BufferedReader):
-        f.seek(self.name_offs)
-        self.name = read_str(f)      
+    def read_name(self, f: BinaryReader):
+        self.name = f.read_str_at(self.name_offs)
 
 
     def seek_to_value(self, f: io.BufferedReader):
         f.seek(self.value_offs)
 
+    def set_value(self, value):
+        """Change the value. It'll be written by GUIResource.to_bytes."""
+        if self.type not in PATCH_FORMATS:
+            raise RuntimeError(f"Can't change values of {self.type.name} attributes. ({self.name})")
+        if isinstance(self.value, list) and (not isinstance(value, (list, tuple)) or len(value) != len(self.value)):
+            raise RuntimeError(f"{self.type.name} attributes require {len(self.value)} values. ({self.name})")
+        self.value = value
+        self.changed = True
+
+    def patch(self, data: bytearray):
+        values = self.value if isinstance(self.value, (list, tuple)) else [self.value]
+        struct.pack_into(PATCH_FORMATS[self.type], data, self.value_offs, *values)
 
     def get_json(self):
         j = {
@@ -153,32 +189,30 @@ class Attribute:
 
 
 class SubElement:
-    def read(self, f: io.BufferedReader):
+    def read(self, f: BinaryReader):
         self.guids = f.read(48)
-        self.name_offs = read_uint64(f)
-        self.class_name_offs = read_uint64(f)
-        self.sub_struct_offs = read_uint64(f)
-        self.sub_structEnd_offs = read_uint64(f)
-        self.extra_attr_offs = read_uint64(f)
+        self.name_offs = f.read_uint64()
+        self.class_name_offs = f.read_uint64()
+        self.sub_struct_offs = f.read_uint64()
+        self.sub_structEnd_offs = f.read_uint64()
+        self.extra_attr_offs = f.read_uint64()
         f.seek(self.sub_struct_offs)
-        attr_count = read_uint64(f)
+        attr_count = f.read_uint64()
         self.attributes = [Attribute() for i in range(attr_count)]
         for attr in self.attributes:
             attr.read_head(f)
         for attr in self.attributes:
             attr.read_name(f)
         f.seek(self.extra_attr_offs)
-        extra_attr_count = read_uint64(f)
+        extra_attr_count = f.read_uint64()
         self.extra_attributes = [Attribute() for i in range(extra_attr_count)]
         for attr in self.extra_attributes:
             attr.read_head(f)
         for attr in self.extra_attributes:
             attr.read_name(f)
 
-        f.seek(self.name_offs)
-        self.name = read_wstr(f)
-        f.seek(self.class_name_offs)
-        self.class_name = read_str(f)
+        self.name = f.read_wstr_at(self.name_offs)
+        self.class_name = f.read_str_at(self.class_name_offs)
 
     def get_json(self, no_attr=False):
         j = {
@@ -200,19 +234,13 @@ class SubElement:
 
 
 class ClipTrack:
-    def read(self, f: io.BufferedReader, name_map_offs: int):
-        self.child_track_count = read_uint16(f)
-        self.prop_count = read_uint16(f)
-        nul = read_uint32(f)
+    HEAD = struct.Struct("<HHI8sQQQ")
+
+    def read(self, f: BinaryReader, name_map_offs: int):
+        (self.child_track_count, self.prop_count, nul, self.hash,
+         name_offs, self.first_child_id, self.first_prop_id) = f.unpack(ClipTrack.HEAD)
         assert nul == 0
-        self.hash = f.read(8)
-        name_offs = read_uint64(f)
-        self.first_child_id = read_uint64(f)
-        self.first_prop_id = read_uint64(f)
-        end_offs = f.tell()
-        f.seek(name_map_offs + name_offs * 2)
-        self.name = read_wstr(f)
-        f.seek(end_offs)
+        self.name = f.read_wstr_at(name_map_offs + name_offs * 2)
 
     def get_json(self):
         j = {
@@ -238,22 +266,15 @@ class ClipProp:
         PropType.Float3,
         PropType.Float4
     ]
-    def read(self, f: io.BufferedReader, name_map_offs: int):
-        self.start_frame = read_uint32(f)
-        self.end_frame = read_float32(f)
-        self.hash = f.read(8)
-        name_offs = read_uint64(f)
-        nul = read_uint64(f)
+    HEAD = struct.Struct("<If8sQQQhhBBH8s")
+
+    def read(self, f: BinaryReader, name_map_offs: int):
+        (self.start_frame, self.end_frame, self.hash, name_offs, nul, self.first_key_id,
+         num, self.unk, nul2, prop_type, self.unk2, nul3) = f.unpack(ClipProp.HEAD)
         assert nul == 0
-        self.first_key_id = read_uint64(f)
-        num = read_int16(f)
-        self.unk = read_int16(f)
-        nul = f.read(1)
-        assert nul == b'\x00'
-        self.type = PropType(f.read(1)[0])
-        self.unk2 = read_uint16(f)
-        nul = f.read(8)
-        assert nul == b'\x00' * 8
+        assert nul2 == 0
+        self.type = PropType(prop_type)
+        assert nul3 == b'\x00' * 8
 
 
         has_child = self.type in ClipProp.ARRAY_TYPES
@@ -264,10 +285,7 @@ class ClipProp:
             self.key_count = num
             self.child_count = 0
 
-        end_offs = f.tell()
-        f.seek(name_map_offs + name_offs)
-        self.name = read_str(f)
-        f.seek(end_offs)
+        self.name = f.read_str_at(name_map_offs + name_offs)
 
     def get_json(self):
         j = {
@@ -287,14 +305,12 @@ class ClipProp:
 
 
 class ClipKey:
-    def read(self, f: io.BufferedReader, prop: ClipProp, clip_start_offs: int):
-        self.frame = read_float32(f)
-        self.rate = read_float32(f)
-        self.interpolation_type = read_uint32(f)
-        self.unk = read_uint32(f)
-        self.unk2 = read_uint32(f)
+    HEAD = struct.Struct("<ffIII")
+
+    def read(self, f: BinaryReader, prop: ClipProp, clip_start_offs: int):
+        self.frame, self.rate, self.interpolation_type, self.unk, self.unk2 = f.unpack(ClipKey.HEAD)
         self.value, self.value_offs = read_prop(f, prop.type, base_offs=clip_start_offs)
-        nul = read_uint32(f)
+        nul = f.read_uint32()
         assert nul == 0
 
     def get_json(self):
@@ -313,32 +329,32 @@ class Clip:
     MAGIC = b"CLIP"
     SUPPORTED_VERSIONS = [54]
 
-    def read(self, f: io.BufferedReader):
+    def read(self, f: BinaryReader):
         self.guid = f.read(16)
         f.seek(8, 1)
-        self.name_offs = read_uint64(f)
+        self.name_offs = f.read_uint64()
         f.seek(8, 1)
         start = f.tell()
         magic = f.read(4)
         if magic != Clip.MAGIC:
             raise RuntimeError("Parse error. (Not a clip object.)")
-        self.version = read_uint32(f)
+        self.version = f.read_uint32()
         if self.version not in Clip.SUPPORTED_VERSIONS:
             raise RuntimeError(f"Unsupported clip version. ({self.version})")
-        self.frame_count = read_float32(f)
-        self.track_count = read_uint32(f)
-        self.prop_count = read_uint32(f)
-        self.key_count = read_uint32(f)
-        self.clip_data_offs = read_uint64(f)
-        self.props_offs = read_uint64(f)
-        self.keys_offs = read_uint64(f)
-        self.unk_offsets = read_uint64(f)
-        self.unk_offsets2 = read_uint64(f)
-        self.name_map_offs = read_uint64(f)
-        self.unk_offsets3 = read_uint64(f)
-        self.wide_name_map_offs = read_uint64(f)
-        self.clip_end_offs = read_uint64(f)
-        nul = read_uint64(f)
+        self.frame_count = f.read_float32()
+        self.track_count = f.read_uint32()
+        self.prop_count = f.read_uint32()
+        self.key_count = f.read_uint32()
+        self.clip_data_offs = f.read_uint64()
+        self.props_offs = f.read_uint64()
+        self.keys_offs = f.read_uint64()
+        self.unk_offsets = f.read_uint64()
+        self.unk_offsets2 = f.read_uint64()
+        self.name_map_offs = f.read_uint64()
+        self.unk_offsets3 = f.read_uint64()
+        self.wide_name_map_offs = f.read_uint64()
+        self.clip_end_offs = f.read_uint64()
+        nul = f.read_uint64()
         assert nul == 0
 
         assert f.tell() == start + self.clip_data_offs
@@ -367,8 +383,7 @@ class Clip:
         #for k, p in zip(self.keys, sorted(self.props, key=lambda x: x.key_id)):
         for k, p in zip(self.keys, props):
             k.read(f, p, start)
-        f.seek(self.name_offs)
-        self.name = read_wstr(f)
+        self.name = f.read_wstr_at(self.name_offs)
 
     def get_json(self):
         return {
@@ -381,14 +396,14 @@ class Clip:
 
 
 class Element:
-    def read(self, f: io.BufferedReader):
+    def read(self, f: BinaryReader):
         self.guid = f.read(16)
-        self.name_offs, self.class_name_offs, self.sub_offs, self.clip_offs = read_uint64_array(f, 4)
+        self.name_offs, self.class_name_offs, self.sub_offs, self.clip_offs = f.read_uint64_array(4)
 
         f.seek(self.sub_offs)
-        sub_element_count = read_uint64(f)
+        sub_element_count = f.read_uint64()
         self.sub_elements = [SubElement() for i in range(sub_element_count)]
-        sub_element_offsets = read_uint64_array(f, sub_element_count)
+        sub_element_offsets = f.read_uint64_array(sub_element_count)
 
         for sub_elm, offs in zip(self.sub_elements, sub_element_offsets):
             f.seek(offs)
@@ -396,17 +411,15 @@ class Element:
 
         f.seek(self.clip_offs)
         f.seek(4, 1)
-        clip_count = read_uint32(f)
+        clip_count = f.read_uint32()
         self.clips = [Clip() for i in range(clip_count)]
-        clip_offsets = read_uint64_array(f, clip_count)
+        clip_offsets = f.read_uint64_array(clip_count)
         for clip, offs in zip(self.clips, clip_offsets):
             f.seek(offs)
             clip.read(f)
 
-        f.seek(self.name_offs)
-        self.name = read_wstr(f)
-        f.seek(self.class_name_offs)
-        self.class_name = read_str(f)
+        self.name = f.read_wstr_at(self.name_offs)
+        self.class_name = f.read_str_at(self.class_name_offs)
 
     def get_json(self, no_attr=False, no_clip=False):
         j = {
@@ -429,8 +442,16 @@ class GUIResource:
     MAGIC = b"GUIR"
     SUPPORTED_VERSIONS = [540034]
 
-    def read(self, f: io.BufferedReader):
-        self.version = read_uint32(f)
+    def __init__(self):
+        self.version = 0
+        self.elements = []
+        self.view = None
+
+        # private
+        self.__source = None  # data from from_buffer or from_bytes
+
+    def read(self, f: BinaryReader):
+        self.version = f.read_uint32()
         if self.version not in GUIResource.SUPPORTED_VERSIONS:
             raise RuntimeError(f"Unsupported file version. ({self.version})")
 
@@ -439,12 +460,12 @@ class GUIResource:
             raise RuntimeError("Not GUI file.")
 
         # read offsets
-        offsetsStart_offset = read_uint64(f)
-        end_offs = read_uint64_array(f, 5)
-        offsetsStart = read_uint64(f)
-        view_offset = read_uint64(f)
-        element_count = read_uint64(f)
-        offsets = read_uint64_array(f, element_count)
+        offsetsStart_offset = f.read_uint64()
+        end_offs = f.read_uint64_array(5)
+        offsetsStart = f.read_uint64()
+        view_offset = f.read_uint64()
+        element_count = f.read_uint64()
+        offsets = f.read_uint64_array(element_count)
 
         # read elements
         self.elements = [Element() for i in range(element_count)]
@@ -472,9 +493,46 @@ class GUIResource:
             raise KeyError(key)
         return elms[0]
 
+    def iter_attributes(self):
+        """Yield attributes of all sub elements and the view."""
+        sub_elements = [sub_elm for elm in self.elements for sub_elm in elm.sub_elements]
+        if self.view is not None:
+            sub_elements.append(self.view)
+        for sub_elm in sub_elements:
+            yield from sub_elm.attributes
+            yield from sub_elm.extra_attributes
+
+    @staticmethod
+    def from_buffer(buffer):
+        """Parse a bytes-like object. (bytes, bytearray, mmap, ...)
+
+        Notes:
+            The buffer is not copied. It's used again by to_bytes, so don't change or close it until then.
+        """
+        gui = GUIResource()
+        with BinaryReader(buffer) as reader:
+            gui.read(reader)
+        gui.__source = buffer
+        return gui
+
+    @staticmethod
+    def from_bytes(data: bytes):
+        """Same as from_buffer but mutable buffers (e.g. bytearray) are copied first."""
+        return GUIResource.from_buffer(bytes(data))
+
+    def to_bytes(self) -> bytes:
+        """Get the original data with changed attribute values. (See Attribute.set_value)"""
+        if self.__source is None:
+            raise RuntimeError("No source data. Use from_buffer or from_bytes to edit gui files.")
+        data = bytearray(self.__source)
+        for attr in self.iter_attributes():
+            if attr.changed:
+                attr.patch(data)
+        return bytes(data)
+
     def import_gui(self, file: str):
-        with io.open(file, "rb") as f:
-            self.read(f)
+        with BinaryReader.open_file(file) as reader:
+            self.read(reader)
 
     """
     def export_gui(self, file: str):
@@ -0,0 +1,771 @@
+"""Message assets (*.msg.*).
+
+Notes:
+    A native reader/writer for .msg files.
+    It reads the file with mmap and decodes names and text only when they are accessed.
+    When exporting an imported file, it keeps the original bytes and
+    appends only new text to the string pool. So, untouched entries stay byte-identical.
+    When most entries are changed, the file is rebuilt instead to drop replaced text from the pool.
+
+    # Sample codes
+    from REMessage import Message
+    msg = Message()
+    msg.import_msg("*.msg.*")
+    entry = msg.entries[0]
+    print(entry.name, entry.langs)
+    entry.set_content([text + "!" for text in entry.langs])
+    msg.export_msg("*.msg.*")
+    msg.close()
+
+    # Newline delimited json
+    export_ndjson writes a compact record for each entry like this.
+    {"name":"...","guid":"...","langs":{"ja":"...","en":"...",...}}
+    Records are written while iterating the entries, and iter_ndjson_entries reads them one by one.
+
+    # Name hashes
+    Entries of version 16 or later have murmur3 hashes of their names.
+    They are verified when reading files to detect broken or mis-parsed entries.
+    Names are hashed in batches (murmur3.hash_wstrs). Use read(..., verify=False) to skip it.
+"""
+
+import io
+import mmap
+import struct
+import uuid
+from typing import Final
+from io_util import save_json, save_ndjson, iter_ndjson, find_wstr_end, NDJSON_FLUSH_LINES
+from murmur3 import hash_wstr, hash_wstrs
+
+LANG_LIST: Final[dict[int, str]] = {
+    0: "Japanese",
+    1: "English",
+    2: "French",
+    3: "Italian",
+    4: "German",
+    5: "Spanish",
+    6: "Russian",
+    7: "Polish",
+    8: "Dutch",
+    9: "Portuguese",
+    10: "PortugueseBr",
+    11: "Korean",
+    12: "TraditionalChinese",
+    13: "SimplifiedChinese",
+    14: "Finnish",
+    15: "Swedish",
+    16: "Danish",
+    17: "Norwegian",
+    18: "Czech",
+    19: "Hungarian",
+    20: "Slovak",
+    21: "Arabic",
+    22: "Turkish",
+    23: "Bulgarian",
+    24: "Greek",
+    25: "Romanian",
+    26: "Thai",
+    27: "Ukrainian",
+    28: "Vietnamese",
+    29: "Indonesian",
+    30: "Fiction",
+    31: "Hindi",
+    32: "LatinAmericanSpanish",
+}
+
+SHORT_LANG_TO_INT: Final[dict[str, int]] = {
+    "ja": 0, "en": 1, "fr": 2, "it": 3, "de": 4, "es": 5, "ru": 6, "pl": 7,
+    "nl": 8, "pt": 9, "ptbr": 10, "ko": 11, "zhtw": 12, "zhcn": 13, "fi": 14, "sv": 15,
+    "da": 16, "no": 17, "cs": 18, "hu": 19, "sk": 20, "ar": 21, "tr": 22, "bg": 23,
+    "el": 24, "ro": 25, "th": 26, "ua": 27, "vi": 28, "id": 29, "cc": 30, "hi": 31,
+    "es419": 32,
+}
+
+INT_TO_SHORT_LANG: Final[dict[int, str]] = {i: key for key, i in SHORT_LANG_TO_INT.items()}
+
+# Key for the string pool.
+KEY: Final[bytes] = bytes([
+    0xCF, 0xCE, 0xFB, 0xF8, 0xEC, 0x0A, 0x33, 0x66,
+    0x93, 0xA9, 0x1D, 0x93, 0x50, 0x39, 0x5F, 0x09
+])
+
+# version, magic, header offset, entry count, attribute count, lang count, padding
+HEAD: Final[struct.Struct] = struct.Struct("<I4sQIII4x")
+U64: Final[struct.Struct] = struct.Struct("<Q")
+I64: Final[struct.Struct] = struct.Struct("<q")
+F64: Final[struct.Struct] = struct.Struct("<d")
+# guid, crc, hash (or index), name offset, attribute offset
+ENTRY_HEAD: Final[struct.Struct] = struct.Struct("<16sIIQQ")
+
+
+def is_encrypted(version: int) -> bool:
+    return version > 12 and version != 0x2022033D
+
+
+def has_entry_hash(version: int) -> bool:
+    return version > 15 and version != 0x2022033D
+
+
+def align(offset: int, size: int) -> int:
+    return (offset + size - 1) // size * size
+
+
+def get_key_stream(start: int, length: int) -> bytes:
+    shift = start % len(KEY)
+    key = KEY[shift:] + KEY[:shift]
+    return (key * (length // len(KEY) + 1))[:length]
+
+
+def decrypt(data, start=0, prev=0) -> bytes:
+    """Decrypt a part of the string pool.
+
+    Args:
+        data: encrypted bytes
+        start: position of data in the string pool
+        prev: the encrypted byte right before data
+    """
+    # plain[i] = data[i] ^ data[i - 1] ^ key[i]
+    # It can be done with xor between big integers instead of a loop for each byte.
+    length = len(data)
+    if length == 0:
+        return b""
+    enc = int.from_bytes(data, "little")
+    key = int.from_bytes(get_key_stream(start, length), "little")
+    plain = enc ^ ((enc << 8) | prev) ^ key
+    return plain.to_bytes(length + 1, "little")[:length]
+
+
+def encrypt(data, start=0, prev=0) -> bytes:
+    """Encrypt a part of the string pool. See decrypt for the arguments."""
+    # enc[i] = plain[i] ^ key[i] ^ enc[i - 1] is a prefix xor of plain ^ key.
+    # Prefix xor can be calculated with log2(length) shifts.
+    length = len(data)
+    if length == 0:
+        return b""
+    enc = int.from_bytes(data, "little") ^ int.from_bytes(get_key_stream(start, length), "little") ^ prev
+    shift = 8
+    while shift < length * 8:
+        enc ^= enc << shift
+        shift *= 2
+    byte_length = max(length, (enc.bit_length() + 7) // 8)
+    return enc.to_bytes(byte_length, "little")[:length]
+
+
+def verify_entry_hashes(entries: list):
+    """Check name hashes of entries. Raises RuntimeError for the first wrong one."""
+    names = [entry.name for entry in entries]
+    for entry, name_hash in zip(entries, hash_wstrs(names)):
+        if entry.hash != name_hash:
+            raise RuntimeError(f"Hash of an entry name doesn't match. The file might be broken. ({entry.name})")
+
+
+def iter_ndjson_entries(file: str):
+    """Read a file from Message.export_ndjson.
+
+    Returns:
+        Iterator of (name, guid, {language id: text})
+    """
+    for record in iter_ndjson(file):
+        langs = {SHORT_LANG_TO_INT[key] if key in SHORT_LANG_TO_INT else int(key): text
+                 for key, text in record["langs"].items()}
+        yield record["name"], uuid.UUID(record["guid"]), langs
+
+
+class StringPool:
+    """Null-terminated UTF-16 strings in a buffer. Strings are decoded once for each offset."""
+
+    def __init__(self, buffer, base: int = 0):
+        self.buffer = buffer  # bytes-like object that has find()
+        self.view = memoryview(buffer)
+        self.base = base  # file offset of the buffer
+        self.__cache: dict[int, str] = {}
+
+    def read(self, offset: int) -> str:
+        string = self.__cache.get(offset)
+        if string is not None:
+            return string
+        start = offset - self.base
+        end = find_wstr_end(self.buffer, start)
+        if end < 0:
+            raise RuntimeError(f"Parse error. (String is not terminated at {offset})")
+        string = str(self.view[start:end], "utf-16-le")
+        self.__cache[offset] = string
+        return string
+
+    def read_many(self, offsets: list[int]) -> list[str]:
+        return [self.read(offs) for offs in offsets]
+
+    def release(self):
+        self.view.release()
+
+
+class StreamStringPool:
+    """Same as StringPool but it keeps no decrypted pool nor decoded strings.
+
+    Notes:
+        Encrypted strings are decrypted with a small window around them.
+        Each read decodes the string again. It's for the low memory mode.
+    """
+
+    WINDOW_SIZE = 256
+    # Strings in this range are decrypted at once by read_many.
+    MAX_SPAN = 1 << 16
+
+    def __init__(self, buffer, data_offs: int = None):
+        self.view = memoryview(buffer)
+        self.data_offs = data_offs  # offset to the encrypted pool. (None for non-encrypted files)
+
+    def get_bytes(self, start: int, end: int) -> bytes:
+        data = bytes(self.view[start:end])
+        if self.data_offs is None:
+            return data
+        prev = self.view[start - 1] if start > self.data_offs else 0
+        return decrypt(data, start=start - self.data_offs, prev=prev)
+
+    def read(self, offset: int) -> str:
+        size = StreamStringPool.WINDOW_SIZE
+        while True:
+            end = min(offset + size, len(self.view))
+            data = self.get_bytes(offset, end)
+            pos = find_wstr_end(data, 0)
+            if pos >= 0:
+                return str(data[:pos], "utf-16-le")
+            if end == len(self.view):
+                raise RuntimeError(f"Parse error. (String is not terminated at {offset})")
+            size *= 4
+
+    def read_many(self, offsets: list[int]) -> list[str]:
+        """Read strings that are close to each other (e.g. text of an entry) with a decryption."""
+        if len(offsets) == 0:
+            return []
+        low, high = min(offsets), max(offsets)
+        if high - low > StreamStringPool.MAX_SPAN:
+            return [self.read(offs) for offs in offsets]
+        data = self.get_bytes(low, min(high + StreamStringPool.WINDOW_SIZE, len(self.view)))
+        strings = []
+        for offs in offsets:
+            start = offs - low
+            end = find_wstr_end(data, start)
+            if end < 0:
+                # Longer than the window.
+                strings.append(self.read(offs))
+            else:
+                strings.append(str(data[start:end], "utf-16-le"))
+        return strings
+
+    def release(self):
+        self.view.release()
+
+
+class StringPoolWriter:
+    """Deduplicated UTF-16 strings for writing."""
+
+    def __init__(self, base: int):
+        self.base = base
+        self.offsets: dict[str, int] = {}
+        self.chunks: list[bytes] = []
+        self.size = 0
+
+    def add(self, string: str) -> int:
+        offset = self.offsets.get(string)
+        if offset is None:
+            offset = self.base + self.size
+            data = string.encode("utf-16-le") + b"\x00\x00"
+            self.chunks.append(data)
+            self.size += len(data)
+            self.offsets[string] = offset
+        return offset
+
+    def get_bytes(self) -> bytes:
+        return b"".join(self.chunks)
+
+
+class MessageEntry:
+    def __init__(self, msg, head_offset: int = 0, contents: list[str] = None):
+        self.__msg = msg
+        self.head_offset: int = head_offset  # offset to the entry head. (0 for new entries)
+        self.guid_bytes: bytes = b"\x00" * 16
+        self.crc: int = 0
+        self.hash: int = 0  # hash for entry name, or index for old versions.
+        self.name_offs: int = 0
+        self.attr_offs: int = 0
+        self.content_offsets: list[int] = []
+
+        self.__name: str = None
+        self.__langs: list[str] = None if contents is None else list(contents)
+        self.__original_langs: list[str] = None  # text in the file
+        self.__attributes: list = None
+        self.__changed_langs: list[int] = []  # indices of edited languages
+
+    def read_head(self, view: memoryview, lang_count: int):
+        self.guid_bytes, self.crc, self.hash, self.name_offs, self.attr_offs = \
+            ENTRY_HEAD.unpack_from(view, self.head_offset)
+        self.content_offsets = list(struct.unpack_from(f"<{lang_count}Q", view,
+                                                       self.head_offset + ENTRY_HEAD.size))
+
+    @property
+    def guid(self) -> uuid.UUID:
+        return uuid.UUID(bytes_le=bytes(self.guid_bytes))
+
+    @property
+    def name(self) -> str:
+        if self.__name is None:
+            self.__name = self.__msg.read_str(self.name_offs)
+        return self.__name
+
+    @name.setter
+    def name(self, name: str):
+        self.__name = name
+
+    @property
+    def langs(self) -> list[str]:
+        if self.__langs is None:
+            self.__langs = self.__msg.read_strs(self.content_offsets)
+            self.__original_langs = self.__langs
+        return self.__langs
+
+    @property
+    def original_langs(self) -> list[str]:
+        """Text in the file. (None for new entries)"""
+        if self.head_offset > 0:
+            self.langs
+        return self.__original_langs
+
+    @property
+    def attributes(self) -> list:
+        if self.__attributes is None:
+            self.__attributes = self.__msg.read_attributes(self.attr_offs)
+        return self.__attributes
+
+    @attributes.setter
+    def attributes(self, attributes: list):
+        self.__attributes = attributes
+
+    @property
+    def changed(self) -> bool:
+        return len(self.__changed_langs) > 0
+
+    @property
+    def changed_langs(self) -> list[int]:
+        return self.__changed_langs
+
+    def set_content(self, contents: list[str]):
+        """Set text for all languages. Only text that differs from the original will be re-encoded."""
+        if len(contents) != len(self.langs):
+            raise RuntimeError(f"Requires {len(self.langs)} languages but there are {len(contents)}.")
+        if self.head_offset > 0:
+            self.__changed_langs = [
+                i for i, (original, text) in enumerate(zip(self.__original_langs, contents))
+                if original != text
+            ]
+        self.__langs = list(contents)
+
+    def get_record(self, lang_keys: list[str]) -> dict:
+        """Compact json for ndjson. See Message.iter_entry_records."""
+        return {
+            "name": self.name,
+            "guid": str(self.guid),
+            "langs": dict(zip(lang_keys, self.langs))
+        }
+
+    def get_json(self, attr_names: list[str]) -> dict:
+        key = "hash" if has_entry_hash(self.__msg.version) else "index"
+        return {
+            "name": self.name,
+            "guid": str(self.guid),
+            "crc?": self.crc,
+            key: self.hash,
+            "attributes": dict(zip(attr_names, self.attributes)),
+            "content": self.langs
+        }
+
+
+class Message:
+    MAGIC: Final[bytes] = b"GMSG"
+    # Number of entries to verify at once in the stream mode
+    VERIFY_CHUNK_SIZE = 256
+    # Rebuild the string pool when replaced strings get larger than this ratio of the file. (See write)
+    REWRITE_RATIO = 0.125
+
+    def __init__(self):
+        self.version: int = 0
+        self.langs: list[int] = []  # language ids
+        self.attr_types: list[int] = []
+        self.attr_names: list[str] = []
+        self.entries: list[MessageEntry] = []
+
+        # private
+        self.__buffer = None  # original file (mmap or bytes)
+        self.__view: memoryview = None
+        self.__mmap: mmap.mmap = None
+        self.__pool: StringPool = None
+        self.__data_offs: int = 0  # offset to the string pool
+        self.__unk_data: bytes = b"\x00" * 8
+        self.__entry_offsets: tuple[int] = ()
+        self.__stream: bool = False
+        self.__verify: bool = False
+
+    @property
+    def entry_count(self) -> int:
+        return len(self.__entry_offsets) if self.__stream else len(self.entries)
+
+    @property
+    def data_offs(self) -> int:
+        return self.__data_offs
+
+    @property
+    def view(self) -> memoryview:
+        """Original file. (None for new messages)"""
+        return self.__view
+
+    def read(self, buffer, stream=False, verify=True):
+        """Read .msg data from a bytes-like object (bytes, bytearray, mmap, ...).
+
+        Args:
+            stream: don't make the entry list, and don't keep decoded text.
+                Use iter_entries and MessageStreamWriter to edit entries one by one.
+            verify: check name hashes of entries. (only for versions that have them)
+                In the stream mode, entries are checked in iter_entries.
+        """
+        self.__buffer = buffer
+        self.__view = view = memoryview(buffer)
+        if len(view) < HEAD.size:
+            raise RuntimeError("Not .msg file.")
+        self.version, magic, _, entry_count, attr_count, lang_count = HEAD.unpack_from(view, 0)
+        if magic != Message.MAGIC:
+            raise RuntimeError("Not .msg file.")
+
+        current = HEAD.size
+        if is_encrypted(self.version):
+            self.__data_offs = U64.unpack_from(view, current)[0]
+            current += 8
+        unk_data_offs, lang_offs, attr_offs, attr_name_offs = struct.unpack_from("<4Q", view, current)
+        current += 32
+        entry_offsets = struct.unpack_from(f"<{entry_count}Q", view, current)
+
+        self.__unk_data = bytes(view[unk_data_offs:unk_data_offs + 8])
+        self.langs = list(struct.unpack_from(f"<{lang_count}I", view, lang_offs))
+        self.attr_types = list(struct.unpack_from(f"<{attr_count}i", view, attr_offs))
+        attr_name_offsets = struct.unpack_from(f"<{attr_count}Q", view, attr_name_offs)
+
+        self.__stream = stream
+        self.__verify = verify and has_entry_hash(self.version)
+        if stream:
+            self.__pool = StreamStringPool(buffer, self.__data_offs if is_encrypted(self.version) else None)
+        elif is_encrypted(self.version):
+            # Decrypt the whole pool at once. Strings will be decoded later.
+            self.__pool = StringPool(decrypt(view[self.__data_offs:]), base=self.__data_offs)
+        else:
+            self.__pool = StringPool(buffer)
+        self.attr_names = [self.read_str(offs) for offs in attr_name_offsets]
+
+        self.__entry_offsets = entry_offsets
+        self.entries = []
+        if not stream:
+            self.entries = [MessageEntry(self, offs) for offs in entry_offsets]
+            for entry in self.entries:
+                entry.read_head(view, lang_count)
+            if self.__verify:
+                verify_entry_hashes(self.entries)
+
+    def iter_entries(self):
+        """Yield entries. In the stream mode, entries are made on the fly and not stored."""
+        if not self.__stream:
+            yield from self.entries
+            return
+        lang_count = len(self.langs)
+        offsets = self.__entry_offsets
+        for i in range(0, len(offsets), Message.VERIFY_CHUNK_SIZE):
+            entries = [MessageEntry(self, offs) for offs in offsets[i:i + Message.VERIFY_CHUNK_SIZE]]
+            for entry in entries:
+                entry.read_head(self.__view, lang_count)
+            if self.__verify:
+                verify_entry_hashes(entries)
+            yield from entries
+
+    def read_str(self, offset: int) -> str:
+        return self.__pool.read(offset)
+
+    def read_strs(self, offsets: list[int]) -> list[str]:
+        return self.__pool.read_many(offsets)
+
+    def read_attributes(self, offset: int) -> list:
+        # Value types: -1 (null wstring?), 0: int64, 1: double, 2: wstring
+        attributes = []
+        for i, attr_type in enumerate(self.attr_types):
+            offs = offset + 8 * i
+            match attr_type:
+                case 0:
+                    value = I64.unpack_from(self.__view, offs)[0]
+                case 1:
+                    value = F64.unpack_from(self.__view, offs)[0]
+                case -1 | 2:
+                    value = self.read_str(U64.unpack_from(self.__view, offs)[0])
+                case _:
+                    value = U64.unpack_from(self.__view, offs)[0]
+            attributes.append(value)
+        return attributes
+
+    def has_changes(self) -> bool:
+        return any(entry.changed for entry in self.entries)
+
+    def get_replaced_size(self) -> int:
+        """Approximate bytes of original strings that changed entries no longer refer to."""
+        return sum(2 * len(entry.original_langs[i]) + 2 for entry in self.entries for i in entry.changed_langs)
+
+    def __write_spliced(self, f: io.BufferedWriter):
+        """Write the original bytes with new strings at the end of the pool."""
+        view = self.__view
+        file_size = len(view)
+        pool = StringPoolWriter(file_size)
+        patches = []  # (offset, new content offset)
+        for entry in self.entries:
+            for i in entry.changed_langs:
+                offs = pool.add(entry.langs[i])
+                patches.append((entry.head_offset + ENTRY_HEAD.size + 8 * i, offs))
+
+        # Only the head part is copied and edited.
+        head_end = max(offs for offs, _ in patches) + 8 if patches else 0
+        head = bytearray(view[:head_end])
+        for offs, value in patches:
+            U64.pack_into(head, offs, value)
+
+        new_data = pool.get_bytes()
+        if is_encrypted(self.version):
+            pool_size = file_size - self.__data_offs
+            prev = view[file_size - 1] if pool_size > 0 else 0
+            new_data = encrypt(new_data, start=pool_size, prev=prev)
+        f.write(head)
+        f.write(view[head_end:])
+        f.write(new_data)
+
+    def __write_new(self, f: io.BufferedWriter):
+        """Write all data from scratch."""
+        encrypted = is_encrypted(self.version)
+        entry_count = len(self.entries)
+        attr_count = len(self.attr_types)
+        lang_count = len(self.langs)
+
+        current = HEAD.size + 8 * encrypted + 32
+        entry_offsets_offs = current
+        current += 8 * entry_count
+        unk_data_offs = current
+        current += 8
+        lang_offs = current
+        current = align(current + 4 * lang_count, 8)
+        attr_offs = current
+        current = align(current + 4 * attr_count, 8)
+        attr_name_offs = current
+        current += 8 * attr_count
+        entry_head_size = ENTRY_HEAD.size + 8 * lang_count
+        entry_offsets = [current + entry_head_size * i for i in range(entry_count)]
+        current += entry_head_size * entry_count
+        entry_attr_offsets = [current + 8 * attr_count * i for i in range(entry_count)]
+        current += 8 * attr_count * entry_count
+        data_offs = align(current, 16)
+
+        # Collect strings
+        pool = StringPoolWriter(data_offs)
+        entry_heads = []
+        entry_attrs = []
+        for entry, attr_offs_i in zip(self.entries, entry_attr_offsets):
+            name_offs = pool.add(entry.name)
+            attr_values = []
+            for attr_type, value in zip(self.attr_types, entry.attributes):
+                match attr_type:
+                    case 0:
+                        attr_values.append(I64.pack(value))
+                    case 1:
+                        attr_values.append(F64.pack(value))
+                    case -1 | 2:
+                        attr_values.append(U64.pack(pool.add(value)))
+                    case _:
+                        attr_values.append(U64.pack(value))
+            content_offsets = [pool.add(text) for text in entry.langs]
+            entry_heads.append(ENTRY_HEAD.pack(entry.guid_bytes, entry.crc, entry.hash,
+                                               name_offs, attr_offs_i)
+                               + struct.pack(f"<{lang_count}Q", *content_offsets))
+            entry_attrs.append(b"".join(attr_values))
+        attr_name_offsets = [pool.add(name) for name in self.attr_names]
+
+        head = bytearray(data_offs)
+        HEAD.pack_into(head, 0, self.version, Message.MAGIC, 16, entry_count, attr_count, lang_count)
+        current = HEAD.size
+        if encrypted:
+            U64.pack_into(head, current, data_offs)
+            current += 8
+        struct.pack_into("<4Q", head, current, unk_data_offs, lang_offs, attr_offs, attr_name_offs)
+        struct.pack_into(f"<{entry_count}Q", head, entry_offsets_offs, *entry_offsets)
+        head[unk_data_offs:unk_data_offs + 8] = self.__unk_data
+        struct.pack_into(f"<{lang_count}I", head, lang_offs, *self.langs)
+        struct.pack_into(f"<{attr_count}i", head, attr_offs, *self.attr_types)
+        struct.pack_into(f"<{attr_count}Q", head, attr_name_offs, *attr_name_offsets)
+        for entry_head, offs in zip(entry_heads, entry_offsets):
+            head[offs:offs + len(entry_head)] = entry_head
+        for attrs, offs in zip(entry_attrs, entry_attr_offsets):
+            head[offs:offs + len(attrs)] = attrs
+
+        data = pool.get_bytes()
+        if encrypted:
+            data = encrypt(data)
+        f.write(head)
+        f.write(data)
+
+    def write(self, f: io.BufferedWriter):
+        """Write the message.
+
+        Notes:
+            Imported files are spliced. (See __write_spliced)
+            But replaced strings stay in the pool as garbage. When they get larger than REWRITE_RATIO
+            of the file (e.g. most entries are merged), all data is written from scratch instead.
+        """
+        if self.__view is not None and self.get_replaced_size() <= len(self.__view) * Message.REWRITE_RATIO:
+            self.__write_spliced(f)
+        else:
+            self.__write_new(f)
+
+    def to_bytes(self) -> bytes:
+        if self.__view is not None and not self.has_changes():
+            return bytes(self.__view)
+        f = io.BytesIO()
+        self.write(f)
+        return f.getvalue()
+
+    def add_entry(self, name: str, contents: list[str], guid: uuid.UUID = None,
+                  attributes: list = None) -> MessageEntry:
+        """Add an entry to a new message. (Not for imported files.)"""
+        if self.__view is not None:
+            raise RuntimeError("Can NOT add entries to imported files.")
+        if len(contents) != len(self.langs):
+            raise RuntimeError(f"Requires {len(self.langs)} languages but there are {len(contents)}.")
+        entry = MessageEntry(self, contents=contents)
+        entry.name = name
+        entry.guid_bytes = (guid or uuid.uuid4()).bytes_le
+        entry.hash = hash_wstr(name) if has_entry_hash(self.version) else len(self.entries)
+        entry.attributes = list(attributes) if attributes is not None else [
+            0 if attr_type in [0, 1] else "" for attr_type in self.attr_types
+        ]
+        self.entries.append(entry)
+        return entry
+
+    def get_json(self) -> dict:
+        return {
+            "version": self.version,
+            "attributeHeaders": [
+                {"valueType": attr_type, "name": name}
+                for attr_type, name in zip(self.attr_types, self.attr_names)
+            ],
+            "entries": [entry.get_json(self.attr_names) for entry in self.entries]
+        }
+
+    def import_msg(self, file: str, stream=False, verify=True):
+        with io.open(file, "rb") as f:
+            try:
+                self.__mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped.
+                raise RuntimeError("Not .msg file.")
+        self.read(self.__mmap, stream=stream, verify=verify)
+
+    def export_msg(self, file: str):
+        with io.open(file, "wb") as f:
+            self.write(f)
+
+    def export_json(self, file: str):
+        save_json(self.get_json(), file)
+
+    def get_lang_keys(self) -> list[str]:
+        """Short language names for records. (e.g. ["ja", "en", ...])"""
+        return [INT_TO_SHORT_LANG.get(lang, str(lang)) for lang in self.langs]
+
+    def iter_entry_records(self):
+        """Yield a compact record (name, guid, and text for each language) for each entry."""
+        lang_keys = self.get_lang_keys()
+        for entry in self.iter_entries():
+            yield entry.get_record(lang_keys)
+
+    def export_ndjson(self, file: str, atomic=True, flush_lines: int = NDJSON_FLUSH_LINES) -> bool:
+        """Export entries as newline delimited json. Returns False if the file had the same content.
+
+        Args:
+            atomic: False to write records to the file directly. See io_util.save_ndjson.
+        """
+        return save_ndjson(self.iter_entry_records(), file, flush_lines=flush_lines, atomic=atomic)
+
+    def close(self):
+        """Release the imported file. Entries can't decode text after this."""
+        if self.__pool is not None:
+            self.__pool.release()
+        if self.__view is not None:
+            self.__view.release()
+        if self.__mmap is not None:
+            self.__mmap.close()
+        self.__mmap = None
+
+    def get_ext(self):
+        return f"msg.{self.version}"
+
+
+class MessageStreamWriter:
+    """Write an imported message entry by entry. (for Message.read(stream=True))
+
+    Notes:
+        It writes the original bytes first, and appends new strings of changed entries
+        to the end of the file while patching their content offsets.
+        Unlike Message.write, new strings are not deduplicated and replaced strings are not removed
+        from the pool to keep memory usage small. So, outputs are larger than the ones of Message.write.
+
+    # Sample codes
+    msg.import_msg("*.msg.*", stream=True)
+    with open("new.msg.*", "wb") as f:
+        writer = MessageStreamWriter(msg, f)
+        for entry in msg.iter_entries():
+            entry.set_content([text + "!" for text in entry.langs])
+            writer.write_entry(entry)
+        writer.close()
+    """
+
+    PATCH_BUFFER_SIZE = 4096
+
+    def __init__(self, msg: Message, f: io.BufferedRandom):
+        if msg.view is None:
+            raise RuntimeError("MessageStreamWriter is only for imported files.")
+        self.f = f
+        self.encrypted = is_encrypted(msg.version)
+        self.data_offs = msg.data_offs
+        view = msg.view
+        f.write(view)
+        self.end = len(view)
+        self.prev = view[-1] if self.encrypted and self.end > self.data_offs else 0
+        self.changed_count = 0
+        self.__patches: list[tuple[int, int]] = []  # (offset, new content offset)
+
+    def write_entry(self, entry: MessageEntry):
+        if not entry.changed:
+            return
+        self.changed_count += 1
+        chunks = []
+        offs = self.end
+        for i in entry.changed_langs:
+            chunk = entry.langs[i].encode("utf-16-le") + b"\x00\x00"
+            chunks.append(chunk)
+            self.__patches.append((entry.head_offset + ENTRY_HEAD.size + 8 * i, offs))
+            offs += len(chunk)
+        # New strings of an entry are encrypted at once.
+        data = b"".join(chunks)
+        if self.encrypted:
+            data = encrypt(data, start=self.end - self.data_offs, prev=self.prev)
+            self.prev = data[-1]
+        self.f.write(data)
+        self.end = offs
+        if len(self.__patches) >= MessageStreamWriter.PATCH_BUFFER_SIZE:
+            self.flush_patches()
+
+    def flush_patches(self):
+        for offs, value in self.__patches:
+            self.f.seek(offs)
+            self.f.write(U64.pack(value))
+        self.__patches = []
+        self.f.seek(self.end)
+
+    def close(self):
+        self.flush_patches()
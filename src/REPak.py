@@ -0,0 +1,353 @@
+"""Pak archives (*.pak) for RE Engine games.
+
+Notes:
+    PakWriter streams files into a .pak (KPKA version 4) without writing loose files.
+    A .pak has a header, a table of entries, and file data.
+    Each entry has murmur3 hashes of its path (lower case and upper case), an offset, and sizes.
+    Paths are relative to natives' parent folder. (e.g. "natives/STM/Message/foo.msg.22")
+
+    The number of entries is unknown until the end. So, file data is kept in a spooled temp file
+    (in memory up to SPOOL_SIZE) and the header and the table are written before it when closing.
+    With compress=True, files are compressed with deflate on a thread pool.
+    Files are stored as they are when compression doesn't make them smaller.
+
+    # Sample codes
+    from REPak import PakWriter
+    with PakWriter("mod.pak", compress=True, jobs=4) as pak:
+        pak.add("natives/STM/Message/foo.msg.22", data)
+        pak.add_file("natives/STM/GUI/bar.gui.540034", "out/natives/STM/GUI/bar.gui.540034")
+
+    # Reading
+    PakReader reads the table of a .pak (version 2 or 4) with mmap and finds files by path hashes.
+    Files compressed with deflate are supported. zstd needs the zstandard module.
+    .pak files with encrypted tables are NOT supported.
+
+    with PakReader("re_chunk_000.pak") as pak:
+        data = pak.read("natives/STM/Message/foo.msg.22")
+    extract_paths([pak1, pak2], paths, "out", jobs=4)
+
+    # Usage
+    python src/REPak.py folder [-o=out.pak] [--compress] [--jobs=N]
+    It packs all files in folder. Paths in the .pak are relative to folder.
+    So, folder should be natives' parent folder.
+"""
+
+import argparse
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from typing import Final
+from io_util import open_temp, commit_temp, remove_temp, mkdir, write_file_atomic
+from murmur3 import hash_path, hash_paths, normalize_path
+from source_walker import walk_files
+
+MAGIC: Final[bytes] = b"KPKA"
+HEADER = struct.Struct("<4sBBHII")  # magic, major version, minor version, feature flags, file count, fingerprint
+ENTRY = struct.Struct("<IIQQQQQ")  # lower hash, upper hash, offset, compressed size, size, attributes, checksum
+ENTRY_V2 = struct.Struct("<QQII")  # offset, size, lower hash, upper hash
+
+FEATURE_ENCRYPTED_TABLE: Final[int] = 8
+
+COMPRESSION_NONE: Final[int] = 0
+COMPRESSION_DEFLATE: Final[int] = 1
+COMPRESSION_ZSTD: Final[int] = 2
+
+try:
+    import zstandard
+except ImportError:
+    # zstd entries can't be read without it.
+    zstandard = None
+
+# Max bytes of file data to keep in memory before spilling to a temp file
+SPOOL_SIZE = 256 << 20
+# Max number of files being compressed for each thread
+PENDING_DEPTH = 4
+
+
+def deflate(data: bytes, level: int = 6) -> bytes:
+    """Compress data as raw deflate. (no zlib header)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_entry(data: bytes, level: int) -> tuple[bytes, int]:
+    """Returns (stored data, compression type)."""
+    compressed = deflate(data, level)
+    if len(compressed) >= len(data):
+        return data, COMPRESSION_NONE
+    return compressed, COMPRESSION_DEFLATE
+
+
+def decompress_entry(data, compression: int, size: int) -> bytes:
+    if compression == COMPRESSION_NONE:
+        return bytes(data)
+    if compression == COMPRESSION_DEFLATE:
+        try:
+            return zlib.decompress(data, -15)
+        except zlib.error:
+            # Some files have zlib headers.
+            return zlib.decompress(data)
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstd compressed files require the zstandard module. (pip install zstandard)")
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=size)
+    raise RuntimeError(f"Unknown compression type. ({compression})")
+
+
+class PakEntry:
+    def __init__(self, path: str = "", size: int = 0):
+        self.path = path
+        self.hash_lower, self.hash_upper = 0, 0
+        if path != "":
+            self.hash_lower, self.hash_upper = hash_path(path)
+        self.offset = 0  # offset from the start of file data (absolute offset for read entries)
+        self.compressed_size = size
+        self.size = size
+        self.compression = COMPRESSION_NONE
+        self.encryption = 0
+
+    def read(self, buffer, offset: int, major_version: int):
+        if major_version == 2:
+            self.offset, self.size, self.hash_lower, self.hash_upper = ENTRY_V2.unpack_from(buffer, offset)
+            self.compressed_size = self.size
+            return
+        (self.hash_lower, self.hash_upper, self.offset,
+         self.compressed_size, self.size, attributes, _) = ENTRY.unpack_from(buffer, offset)
+        self.compression = attributes & 0xF
+        self.encryption = (attributes >> 16) & 0xFF
+
+    def write(self, f, data_offset: int):
+        f.write(ENTRY.pack(self.hash_lower, self.hash_upper, data_offset + self.offset,
+                           self.compressed_size, self.size, self.compression, 0))
+
+
+class PakWriter:
+    VERSION: Final[tuple[int, int]] = (4, 0)
+
+    def __init__(self, file: str, compress=False, level: int = 6, jobs: int = 1):
+        self.file = file
+        self.compress = compress
+        self.level = level
+        self.entries: list[PakEntry] = []
+        self.__hashes = set()
+        self.__data = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        self.__data_size = 0
+        self.__pending = collections.deque()
+        self.__depth = max(1, jobs) * PENDING_DEPTH
+        self.__executor = None
+        if compress and jobs > 1:
+            self.__executor = ThreadPoolExecutor(max_workers=jobs)
+
+    def add(self, path: str, data: bytes):
+        """Add a file. Files are written in the order they are added."""
+        entry = PakEntry(normalize_path(path), len(data))
+        key = (entry.hash_lower, entry.hash_upper)
+        if key in self.__hashes:
+            raise RuntimeError(f"{entry.path} is already in the pak.")
+        self.__hashes.add(key)
+        self.entries.append(entry)
+        if not self.compress:
+            result = (data, COMPRESSION_NONE)
+        elif self.__executor is None:
+            result = compress_entry(data, self.level)
+        else:
+            result = self.__executor.submit(compress_entry, data, self.level)
+        self.__pending.append((entry, result))
+        if len(self.__pending) >= self.__depth:
+            self.__write_pending(1)
+
+    def add_file(self, path: str, file: str):
+        with open(file, "rb") as f:
+            self.add(path, f.read())
+
+    def __write_pending(self, count: int):
+        for _ in range(count):
+            entry, result = self.__pending.popleft()
+            if not isinstance(result, tuple):
+                result = result.result()
+            data, entry.compression = result
+            entry.offset = self.__data_size
+            entry.compressed_size = len(data)
+            self.__data.write(data)
+            self.__data_size += len(data)
+
+    def close(self) -> bool:
+        """Write the .pak file.
+
+        Returns:
+            bool: False if the file already has the same content.
+        """
+        try:
+            self.__write_pending(len(self.__pending))
+            directory = os.path.dirname(self.file)
+            if directory != "":
+                mkdir(directory)
+            f, tmp = open_temp(self.file)
+            try:
+                with f:
+                    f.write(HEADER.pack(MAGIC, *PakWriter.VERSION, 0, len(self.entries), 0))
+                    data_offset = HEADER.size + ENTRY.size * len(self.entries)
+                    for entry in self.entries:
+                        entry.write(f, data_offset)
+                    self.__data.seek(0)
+                    shutil.copyfileobj(self.__data, f, 1 << 20)
+                return commit_temp(tmp, self.file)
+            except BaseException:
+                remove_temp(tmp)
+                raise
+        finally:
+            self.abort()
+
+    def abort(self):
+        """Discard added files without writing the .pak file."""
+        self.__pending.clear()
+        if self.__executor is not None:
+            self.__executor.shutdown(cancel_futures=True)
+            self.__executor = None
+        self.__data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class PakReader:
+    def __init__(self, file: str):
+        self.file = file
+        self.entries: dict[tuple[int, int], PakEntry] = {}
+        self.__buffer = None
+        self.__f = open(file, "rb")
+        try:
+            self.__buffer = mmap.mmap(self.__f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.read_table()
+        except BaseException:
+            self.close()
+            raise
+
+    def read_table(self):
+        buffer = self.__buffer
+        if len(buffer) < HEADER.size:
+            raise RuntimeError(f"{self.file} is not a .pak file.")
+        magic, major, minor, feature, count, _ = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise RuntimeError(f"{self.file} is not a .pak file.")
+        if major not in [2, 4]:
+            raise RuntimeError(f"Unsupported .pak version. ({major}.{minor})")
+        if feature & FEATURE_ENCRYPTED_TABLE:
+            raise RuntimeError(f"{self.file} has an encrypted table. It's not supported. (Use REtool instead.)")
+        entry_size = ENTRY_V2.size if major == 2 else ENTRY.size
+        if HEADER.size + entry_size * count > len(buffer):
+            raise RuntimeError(f"{self.file} is broken. (The table is larger than the file.)")
+        for i in range(count):
+            entry = PakEntry()
+            entry.read(buffer, HEADER.size + entry_size * i, major)
+            self.entries[(entry.hash_lower, entry.hash_upper)] = entry
+
+    def find(self, path: str) -> PakEntry:
+        """Get the entry for a path. (None if it's not in the .pak)"""
+        return self.entries.get(hash_path(path))
+
+    def read_entry(self, entry: PakEntry) -> bytes:
+        if entry.encryption != 0:
+            raise RuntimeError(f"Encrypted files are not supported. Use REtool instead. ({entry.path or hex(entry.hash_lower)})")
+        end = entry.offset + entry.compressed_size
+        if end > len(self.__buffer):
+            raise RuntimeError(f"{self.file} is broken. (An entry is out of the file.)")
+        with memoryview(self.__buffer)[entry.offset:end] as data:
+            return decompress_entry(data, entry.compression, entry.size)
+
+    def read(self, path: str) -> bytes:
+        entry = self.find(path)
+        if entry is None:
+            raise RuntimeError(f"{path} is not in {self.file}.")
+        return self.read_entry(entry)
+
+    def close(self):
+        if self.__buffer is not None:
+            self.__buffer.close()
+            self.__buffer = None
+        self.__f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def extract_paths(paks: list[PakReader], paths: list[str], out: str, jobs: int = 1):
+    """Extract files from .pak files to out/path.
+
+    Notes:
+        Later .pak files override earlier ones. (e.g. [base pak, patch pak])
+        Files are decompressed and written on jobs threads.
+        Existing files that have the same content are not rewritten.
+
+    Returns:
+        (list[str], list[str]): extracted files, and paths that are not in the .pak files
+    """
+    found = []
+    missing = []
+    paths = [normalize_path(path) for path in paths]
+    for path, key in zip(paths, hash_paths(paths)):
+        for pak in reversed(paks):
+            entry = pak.entries.get(key)
+            if entry is not None:
+                found.append((pak, entry, path))
+                break
+        else:
+            missing.append(path)
+
+    def extract(item):
+        pak, entry, path = item
+        new_file = os.path.join(out, path)
+        mkdir(os.path.dirname(new_file))
+        write_file_atomic(pak.read_entry(entry), new_file)
+        return new_file
+
+    if jobs <= 1:
+        return [extract(item) for item in found], missing
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(extract, found)), missing
+
+
+def pack_dir(directory: str, file: str, compress=False, jobs: int = 1) -> int:
+    """Pack all files in a folder. Returns the number of files."""
+    with PakWriter(file, compress=compress, jobs=jobs) as pak:
+        for src, _ in walk_files(directory):
+            if os.path.abspath(src) == os.path.abspath(file):
+                continue
+            pak.add_file(os.path.relpath(src, directory), src)
+        return len(pak.entries)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+                prog = 'python REPak.py',
+                description = 'Pack files into a .pak for RE Engine games.')
+    parser.add_argument('folder', type=str, help="natives' parent folder")
+    parser.add_argument('-o', '--out', type=str, default="out.pak", help='output .pak file.')
+    parser.add_argument('--compress', action='store_true', help='Compress files with deflate.')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of threads for compression.')
+    args = parser.parse_args()
+    if not os.path.isdir(args.folder):
+        raise RuntimeError(f"{args.folder} is NOT a folder.")
+    if args.jobs < 1:
+        raise RuntimeError(f"--jobs should be 1 or more. ({args.jobs})")
+    return args
+
+
+if __name__ == "__main__":
+    args = get_args()
+    count = pack_dir(args.folder, args.out, compress=args.compress, jobs=args.jobs)
+    print(f"Packed {count} file(s) into {args.out}")
@@ -0,0 +1,159 @@
+"""Build manifest for incremental rebuilds.
+
+Notes:
+    The manifest is saved in the output folder as .dualsub_manifest.json.
+    It stores the content hash of each source file and the settings used to build it.
+    A source file will be skipped when both of them are the same as the previous build
+    and its outputs still exist.
+
+    # Sample codes
+    from build_cache import BuildManifest
+    manifest = BuildManifest("out", {"main_lang": "en", "sub_lang": "ja"})
+    if not manifest.is_up_to_date(file):
+        new_file = build(file)
+        manifest.update(file, [new_file])
+    manifest.save()
+
+    # Classification cache
+    ClassificationCache stores results of EntryClassifier for each patterns hash and entry name.
+    Entry names are stable across game patches, so later runs classify most names by a dict lookup.
+    Only tables of the last MAX_TABLES patterns are kept. (e.g. while editing the patterns file)
+
+    cache = ClassificationCache("classes.json", hash_json(patterns_json))
+    classifier.cache = cache.table
+    ...
+    if len(classifier.pop_new_flags()) > 0:
+        cache.save()
+"""
+
+import hashlib
+import json
+import os
+from io_util import mkdir, load_json, json_to_bytes, write_file_atomic
+
+MANIFEST_VERSION = 1
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(file: str) -> str:
+    sha = hashlib.sha256()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def hash_json(j) -> str:
+    """Hash a json object. Key order and indents don't affect the hash."""
+    return hash_bytes(json.dumps(j, sort_keys=True, ensure_ascii=False).encode())
+
+
+class BuildManifest:
+    FILE_NAME = ".dualsub_manifest.json"
+
+    def __init__(self, out: str, settings: dict, rebuild=False):
+        self.out = out
+        self.path = os.path.join(out, BuildManifest.FILE_NAME)
+        self.settings_hash = hash_json(settings)
+        self.rebuild = rebuild  # treat all files as outdated. Built files are still recorded.
+        self.files: dict[str, dict] = {}
+        self.__pending_hashes: dict[str, str] = {}  # hashes of files that are not built yet
+        self.load()
+
+    def load(self):
+        try:
+            j = load_json(self.path)
+        except (OSError, ValueError):
+            return
+        if j.get("version") != MANIFEST_VERSION:
+            return
+        self.files = j.get("files", {})
+
+    def save(self):
+        mkdir(self.out)
+        write_file_atomic(json_to_bytes({"version": MANIFEST_VERSION, "files": self.files}), self.path)
+
+    @staticmethod
+    def get_key(file: str) -> str:
+        return os.path.abspath(file)
+
+    def is_up_to_date(self, file: str, data: bytes = None) -> bool:
+        """Check if a file is the same as the previous build. data is the content if it's already loaded."""
+        if self.rebuild:
+            return False
+        key = BuildManifest.get_key(file)
+        file_hash = hash_file(file) if data is None else hash_bytes(data)
+        self.__pending_hashes[key] = file_hash
+        record = self.files.get(key)
+        if record is None:
+            return False
+        if record["hash"] != file_hash or record["settings"] != self.settings_hash:
+            return False
+        return all(os.path.isfile(os.path.join(self.out, output)) for output in record["outputs"])
+
+    def update(self, file: str, outputs: list[str]):
+        """Record a built file. Call is_up_to_date before building it."""
+        key = BuildManifest.get_key(file)
+        file_hash = self.__pending_hashes.pop(key, None)
+        if file_hash is None:
+            file_hash = hash_file(file)
+        self.files[key] = {
+            "hash": file_hash,
+            "settings": self.settings_hash,
+            "outputs": [os.path.relpath(output, self.out) for output in outputs]
+        }
+
+    def refresh(self, file: str, outputs: list[str]):
+        """Same as update but reuses the recorded hash. It's for files that are not changed since the last update."""
+        record = self.files.get(BuildManifest.get_key(file))
+        if record is None:
+            self.update(file, outputs)
+            return
+        record["settings"] = self.settings_hash
+        record["outputs"] = [os.path.relpath(output, self.out) for output in outputs]
+
+    def get_outputs(self, file: str) -> list[str]:
+        record = self.files.get(BuildManifest.get_key(file), {})
+        return [os.path.join(self.out, output) for output in record.get("outputs", [])]
+
+
+class ClassificationCache:
+    """Tables of packed flags from EntryClassifier. (patterns hash -> entry name -> flags)"""
+    FILE_NAME = ".dualsub_classes.json"
+    CACHE_VERSION = 1
+    # Number of tables to keep. Tables are ordered from the least recently used one.
+    MAX_TABLES = 4
+
+    def __init__(self, path: str, patterns_hash: str):
+        self.path = path
+        self.patterns_hash = patterns_hash
+        self.tables: dict[str, dict[str, int]] = {}
+        self.load()
+        # Move the current table to the end.
+        self.tables[patterns_hash] = self.tables.pop(patterns_hash, {})
+
+    @property
+    def table(self) -> dict[str, int]:
+        """Table for the current patterns."""
+        return self.tables.setdefault(self.patterns_hash, {})
+
+    def load(self):
+        try:
+            j = load_json(self.path)
+        except (OSError, ValueError):
+            return
+        if j.get("version") != ClassificationCache.CACHE_VERSION:
+            return
+        self.tables = j.get("tables", {})
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory != "":
+            mkdir(directory)
+        keys = list(self.tables.keys())[-ClassificationCache.MAX_TABLES:]
+        self.tables = {key: self.tables[key] for key in keys}
+        write_file_atomic(json_to_bytes({"version": ClassificationCache.CACHE_VERSION, "tables": self.tables}),
+                          self.path)
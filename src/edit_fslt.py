@@ -10,6 +10,9 @@ import argparse
 import os
 from io_util import mkdir
 from REFontSlot import FontSlot, Slot
+from source_walker import walk_files
+
+FSLT_PATTERNS = [".fslt.*"]
 
 
 def is_fslt_file(file: str) -> bool:
@@ -83,15 +86,12 @@ if __name__ == "__main__":
             src_fslt = FontSlot()
             src_fslt.import_fslt(file)
             mkdir(out)
-            for trg in sorted(os.listdir(directory)):
-                if not is_fslt_file(trg):
-                    continue
-                trg_file = os.path.join(directory, trg)
+            for trg_file, _ in walk_files(directory, include=FSLT_PATTERNS, recursive=False):
                 print(f"processing {trg_file}...")
                 trg_fslt = FontSlot()
                 trg_fslt.import_fslt(trg_file)
                 merge_fslt(trg_fslt, src_fslt)
-                new_file = os.path.join(out, trg)
+                new_file = os.path.join(out, os.path.basename(trg_file))
                 trg_fslt.export_fslt(new_file)
         case _:
             raise RuntimeError(f"Unsupported mode. ({args.mode})")
@@ -10,95 +10,76 @@ Notes:
 """
 
 import argparse
-import io
 import os
-from io_util import mkdir, write_float32_array
+from io_util import mkdir, write_file_atomic
 from REGUI import GUIResource
+from source_walker import walk_files
 
-def edit_gui(file, out):
-    if (os.path.basename(file) != "cs_ui0600.gui.540034"
-        and os.path.basename(file) != "cs_ui3070.gui.540034"
-        and os.path.basename(file) != "cs_ui3080.gui.540034"
-        and os.path.basename(file) != "cs_ui3090.gui.540034"):
-        return
+EDIT_TARGETS = ["cs_ui0600.gui.540034", "cs_ui3070.gui.540034", "cs_ui3080.gui.540034", "cs_ui3090.gui.540034"]
+GUI_PATTERNS = [".gui.*"]
 
-    print(f"processing {file}...")
-    gui = GUIResource()
-    gui.import_gui(file)
-    mkdir(out)
+def edit_gui_data(name: str, data: bytes) -> bytes:
+    """Edit a gui file in memory. name is the file name. (e.g. cs_ui0600.gui.540034)"""
+    gui = GUIResource.from_bytes(data)
 
-    def mult_attr(f, attr, factor=[1, 2]):
-        attr.seek_to_value(f)
+    # Only x and y are changed. Other components (e.g. z of Vec3) are kept.
+    def mult_attr(attr, factor=[1, 2]):
         value = attr.value
-        write_float32_array(f, [value[0] * factor[0], value[1] * factor[1]])
+        attr.set_value([value[0] * factor[0], value[1] * factor[1]] + list(value[2:]))
 
-    def add_attr(f, attr, add):
-        attr.seek_to_value(f)
+    def add_attr(attr, add):
         value = attr.value
-        write_float32_array(f, [value[0] + add[0], value[1] + add[1]])
-
-    gui_path = os.path.join(out, os.path.basename(file))
-    with io.open(gui_path, "wb") as f:
-        readf = io.open(file, "rb")
-        f.write(readf.read())
-        if os.path.basename(file) == "cs_ui0600.gui.540034":
-            elm = gui["c_tips_text"]
-            attr = elm["mask"]["Size"]
-            mult_attr(f, attr)
-            attr = elm["mask"]["Position"]
-            mult_attr(f, attr)
-            attr = elm["m_tips0"]["RegionSize"]
-            mult_attr(f, attr)
-            attr = elm["m_tips1"]["RegionSize"]
-            mult_attr(f, attr)
-            attr = gui["c_tips"]["c_pageguide"]["Position"]
-            mult_attr(f, attr, factor=[1, 1.6])
-        elif os.path.basename(file) == "cs_ui3070.gui.540034":
-            attr = gui["main"]["c_caption"]["Position"]
-            add_attr(f, attr, [0, -40])
-        elif os.path.basename(file) == "cs_ui3080.gui.540034":
-            attr = gui["c_mode"]["c_preview"]["Position"]
-            add_attr(f, attr, [0, 50])
-        elif os.path.basename(file) == "cs_ui3090.gui.540034":
-            attr = gui["main"]["c_value"]["Position"]
-            add_attr(f, attr, [0, 50])
-        readf.close()
+        attr.set_value([value[0] + add[0], value[1] + add[1]] + list(value[2:]))
+
+    if name == "cs_ui0600.gui.540034":
+        elm = gui["c_tips_text"]
+        attr = elm["mask"]["Size"]
+        mult_attr(attr)
+        attr = elm["mask"]["Position"]
+        mult_attr(attr)
+        attr = elm["m_tips0"]["RegionSize"]
+        mult_attr(attr)
+        attr = elm["m_tips1"]["RegionSize"]
+        mult_attr(attr)
+        attr = gui["c_tips"]["c_pageguide"]["Position"]
+        mult_attr(attr, factor=[1, 1.6])
+    elif name == "cs_ui3070.gui.540034":
+        attr = gui["main"]["c_caption"]["Position"]
+        add_attr(attr, [0, -40])
+    elif name == "cs_ui3080.gui.540034":
+        attr = gui["c_mode"]["c_preview"]["Position"]
+        add_attr(attr, [0, 50])
+    elif name == "cs_ui3090.gui.540034":
+        attr = gui["main"]["c_value"]["Position"]
+        add_attr(attr, [0, 50])
+    return gui.to_bytes()
 
 
-def edit_gui_dir(directory, out):
-    if os.path.isfile(directory):
-        if is_gui_file(directory):
-            edit_gui(directory, out)
+def edit_gui(file, out):
+    if os.path.basename(file) not in EDIT_TARGETS:
         return
 
-    out = os.path.join(out, os.path.basename(directory))
-    for file_base in sorted(os.listdir(directory)):
-        file = os.path.join(directory, file_base)
-        edit_gui_dir(file, out)
+    print(f"processing {file}...")
+    with open(file, "rb") as f:
+        data = f.read()
+    mkdir(out)
+    gui_path = os.path.join(out, os.path.basename(file))
+    write_file_atomic(edit_gui_data(os.path.basename(file), data), gui_path)
 
 
-def is_gui_file(file):
-    splitted = file.split(".")
-    if len(splitted) < 3:
-        return False
-    return splitted[-2] == "gui"
+def edit_gui_dir(directory, out):
+    for file, file_out in walk_files(directory, out, include=EDIT_TARGETS):
+        edit_gui(file, file_out)
 
 
-def dump_gui(file, out, no_attr=False, no_clip=False):
-    if os.path.isfile(file) and is_gui_file(file):
+def dump_gui(directory, out, no_attr=False, no_clip=False):
+    for file, file_out in walk_files(directory, out, include=GUI_PATTERNS):
         print(f"processing {file}...")
         gui = GUIResource()
         gui.import_gui(file)
-        mkdir(out)
-        json_path = os.path.join(out, os.path.basename(file) + ".json")
+        mkdir(file_out)
+        json_path = os.path.join(file_out, os.path.basename(file) + ".json")
         gui.export_json(json_path, no_attr=no_attr, no_clip=no_clip)
-        return
-
-    directory = file
-    out = os.path.join(out, os.path.basename(directory))
-    for file_base in sorted(os.listdir(directory)):
-        file = os.path.join(directory, file_base)
-        dump_gui(file, out, no_attr=no_attr, no_clip=no_clip)
 
 
 def get_args():
@@ -129,5 +110,4 @@ if __name__=="__main__":
             no_clip = args.no_clip
             dump_gui(directory, out, no_attr=no_attr, no_clip=no_clip)
         case _:
-            print(args.mode == "dump")
             raise RuntimeError(f"Unsupported mode. ({args.mode})")
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""Classifier for entry name patterns (entry_patterns/*.json).
+
+Notes:
+    Patterns are compiled once.
+    Simple patterns (e.g. ".*_QuestReward$", "^Dev1_Term.*") are checked with str methods.
+    Other patterns are joined into a regex for each category.
+    Results are cached by entry names. The cache can be saved with build_cache.ClassificationCache
+    to skip patterns for known names in later runs.
+
+    # Sample codes
+    from entry_classifier import EntryClassifier
+    classifier = EntryClassifier.from_json(load_json("entry_patterns/re4.json"))
+    ignored, one_line, three_lines = classifier.classify("ch_mes_main_sys_00")
+"""
+
+import re
+
+CATEGORY_KEYS = ["ignore_entries", "one_line_entries", "three_lines_entries"]
+
+# Matches a literal text that has no special characters for regex.
+_LITERAL = r"[A-Za-z0-9_\- ]+"
+# (pattern, match type) for literal fast paths. Patterns are used with re.match.
+_FAST_PATHS = [
+    (re.compile(rf"\.\*({_LITERAL})\.\*"), "in"),
+    (re.compile(rf"\.\*({_LITERAL})\$"), "endswith"),
+    (re.compile(rf"\.\*({_LITERAL})"), "in"),
+    (re.compile(rf"\^?({_LITERAL})\$"), "equal"),
+    (re.compile(rf"\^?({_LITERAL})(?:\.\*)?"), "startswith"),
+]
+
+
+# (ignore, one_line, three_lines) for packed flags (bit 0: ignore, bit 1: one line, bit 2: three lines)
+_UNPACKED_FLAGS = [tuple(bool(packed >> i & 1) for i in range(3)) for packed in range(8)]
+
+
+def pack_flags(flags: tuple[bool, bool, bool]) -> int:
+    return flags[0] | flags[1] << 1 | flags[2] << 2
+
+
+def parse_fast_path(pattern: str):
+    """Get (match type, literal) for a simple pattern. Returns None for other patterns."""
+    for regex, match_type in _FAST_PATHS:
+        m = regex.fullmatch(pattern)
+        if m is not None:
+            return match_type, m.group(1)
+    return None
+
+
+class PatternSet:
+    """Patterns for a category."""
+
+    def __init__(self, patterns: list[str]):
+        self.patterns = list(patterns)
+        self.equal: set[str] = set()
+        self.prefixes: list[str] = []
+        self.suffixes: list[str] = []
+        self.substrings: list[str] = []
+        regex_patterns = []
+        for pt in self.patterns:
+            fast_path = parse_fast_path(pt)
+            if fast_path is None:
+                regex_patterns.append(pt)
+                continue
+            match_type, literal = fast_path
+            match match_type:
+                case "equal":
+                    self.equal.add(literal)
+                case "startswith":
+                    self.prefixes.append(literal)
+                case "endswith":
+                    self.suffixes.append(literal)
+                case "in":
+                    self.substrings.append(literal)
+
+        # str.startswith and str.endswith can take a tuple.
+        self.prefixes = tuple(self.prefixes)
+        self.suffixes = tuple(self.suffixes)
+        self.regex = None
+        self.regex_list = []
+        if len(regex_patterns) > 0:
+            try:
+                self.regex = re.compile("|".join(f"(?:{pt})" for pt in regex_patterns))
+            except re.error:
+                # Patterns can't be joined (e.g. global flags). Use them one by one.
+                self.regex_list = [re.compile(pt) for pt in regex_patterns]
+
+        # Same as re.match for all patterns. It's used for names that have line feeds.
+        self.slow_regex_list = [re.compile(pt) for pt in self.patterns]
+
+    def match(self, name: str) -> bool:
+        if "\n" in name:
+            # "$" and "." behave differently around line feeds. Use regex as is.
+            return any(regex.match(name) for regex in self.slow_regex_list)
+        if name in self.equal:
+            return True
+        if self.prefixes and name.startswith(self.prefixes):
+            return True
+        if self.suffixes and name.endswith(self.suffixes):
+            return True
+        for sub in self.substrings:
+            if sub in name:
+                return True
+        if self.regex is not None and self.regex.match(name):
+            return True
+        for regex in self.regex_list:
+            if regex.match(name):
+                return True
+        return False
+
+
+class EntryClassifier:
+    """Classify entry names into ignore_entries, one_line_entries, and three_lines_entries."""
+
+    def __init__(self, ignore_entries: list[str] = (),
+                 one_line_entries: list[str] = (),
+                 three_lines_entries: list[str] = ()):
+        self.ignore = PatternSet(ignore_entries)
+        self.one_line = PatternSet(one_line_entries)
+        self.three_lines = PatternSet(three_lines_entries)
+        self.cache: dict[str, int] = {}  # entry name -> packed flags
+        self.new_flags: dict[str, int] = {}  # names that were not in the cache
+
+    @staticmethod
+    def from_json(patterns_json: dict):
+        return EntryClassifier(*[patterns_json.get(key, []) for key in CATEGORY_KEYS])
+
+    def match(self, name: str) -> tuple[bool, bool, bool]:
+        """Same as classify but always uses the patterns."""
+        return (self.ignore.match(name),
+                self.one_line.match(name),
+                self.three_lines.match(name))
+
+    def classify(self, name: str) -> tuple[bool, bool, bool]:
+        """Get flags for (ignore_entries, one_line_entries, three_lines_entries)."""
+        packed = self.cache.get(name)
+        if packed is not None:
+            return _UNPACKED_FLAGS[packed]
+        flags = self.match(name)
+        packed = pack_flags(flags)
+        self.cache[name] = packed
+        self.new_flags[name] = packed
+        return flags
+
+    def pop_new_flags(self) -> dict[str, int]:
+        """Get packed flags of names that were classified with the patterns since the last call."""
+        new_flags = self.new_flags
+        self.new_flags = {}
+        return new_flags
+
+    def add_flags(self, flags: dict[str, int]):
+        """Add packed flags from other classifiers. (e.g. pop_new_flags() in worker processes)"""
+        for name, packed in flags.items():
+            if name not in self.cache:
+                self.cache[name] = packed
+                self.new_flags[name] = packed
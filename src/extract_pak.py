@@ -0,0 +1,78 @@
+"""Extract only UI related files from *.pak without REtool.exe
+
+Notes:
+    It's a portable version of run_retool.py. It doesn't need Windows.
+    But it doesn't support encrypted .pak files. (encrypted tables or entries)
+    Use run_retool.py for games that encrypt them.
+    It'll use only UI related files (.msg, .fslt, .gui) from *.list.
+    Files are decompressed and written on threads.
+
+    python src/extract_pak.py pak [pak ...] file_list [-o=out] [--jobs=N]
+    - pak: path to .pak. Later .pak files override earlier ones. (e.g. re_chunk_000.pak re_chunk_000.pak.patch_001.pak)
+    - file_list: path to *.list.
+    - out: output folder
+"""
+
+import argparse
+import os
+import time
+from REPak import PakReader, extract_paths
+from list_filter import ListRules, DEFAULT_RULES, iter_list
+
+
+def read_ui_paths(file_list) -> list[str]:
+    """Get paths of UI related files in *.list. (See list_filter.DEFAULT_RULES)"""
+    return [path for _, path, _ in iter_list(file_list, ListRules(DEFAULT_RULES))]
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+                prog = 'python extract_pak.py',
+                description = 'Extract UI related files from RE Engine games.\n'
+                              'Encrypted .pak files are not supported. Use run_retool.py for them.',
+                formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('pak', type=str, nargs='+', help='.pak for RE Engine games')
+    parser.add_argument('file_list', type=str, help='.list for RETool')
+    parser.add_argument('-o', '--out', type=str, default="out", help='output directory.')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Number of threads to decompress and write files.')
+    args = parser.parse_args()
+    for pak in args.pak:
+        check_file_path(pak, "pak")
+    check_file_path(args.file_list, "list")
+    if args.jobs < 1:
+        raise RuntimeError(f"--jobs should be 1 or more. ({args.jobs})")
+    print("Settings")
+    print(f"  pak   : {', '.join(args.pak)}")
+    print(f"  list  : {args.file_list}")
+    print(f"  output: {args.out}")
+    print(f"  jobs  : {args.jobs}")
+    return args
+
+
+def check_file_path(file, ext):
+    if not file.endswith("." + ext):
+        raise RuntimeError(f"{file} should be .{ext} file")
+    if not os.path.isfile(file):
+        raise RuntimeError(f"{file} is NOT a file.")
+
+
+if __name__ == "__main__":
+    args = get_args()
+    paths = read_ui_paths(args.file_list)
+    if len(paths) == 0:
+        raise RuntimeError(f"No msg files in {args.file_list}")
+    print(f"Found {len(paths)} UI related path(s) in {args.file_list}")
+    start = time.perf_counter()
+    paks = []
+    try:
+        for pak in args.pak:
+            paks.append(PakReader(pak))
+        extracted, missing = extract_paths(paks, paths, args.out, jobs=args.jobs)
+    finally:
+        for pak in paks:
+            pak.close()
+    print(f"Extracted {len(extracted)} file(s) in {time.perf_counter() - start:.2f}s")
+    if len(missing) > 0:
+        print(f"{len(missing)} path(s) are not in the .pak files.")
+    print("Done!")
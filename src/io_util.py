@@ -1,7 +1,13 @@
+import array
+import hashlib
 import io
 import json
+import mmap
 import os
+import shutil
 import struct
+import sys
+import tempfile
 
 
 def mkdir(dir):
@@ -18,6 +24,407 @@ def load_json(file):
         return json.load(f)
 
 
+def json_to_bytes(j) -> bytes:
+    return json.dumps(j, indent=4, ensure_ascii=False).encode("utf-8")
+
+
+def hash_file_content(file: str) -> bytes:
+    sha = hashlib.sha256()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.digest()
+
+
+def is_same_hash(file: str, size: int, digest: bytes) -> bool:
+    """Check if a file has the size and sha256 digest. Sizes are compared before hashes."""
+    try:
+        return os.path.getsize(file) == size and hash_file_content(file) == digest
+    except OSError:
+        return False
+
+
+def is_same_content(data: bytes, file: str) -> bool:
+    """Check if a file already has the data."""
+    return is_same_hash(file, len(data), hashlib.sha256(data).digest())
+
+
+def get_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Read once because os.umask changes it for all threads.
+UMASK = get_umask()
+
+
+def open_temp(file: str):
+    """Open a temp file in the same directory as file. Returns (file object, temp path)."""
+    directory = os.path.dirname(os.path.abspath(file))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(file) + ".", suffix=".tmp")
+    # mkstemp makes a private file. Use the same permissions as open() does.
+    os.chmod(tmp, 0o666 & ~UMASK)
+    return os.fdopen(fd, "wb"), tmp
+
+
+def remove_temp(tmp: str):
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+
+def is_same_file_content(file1: str, file2: str) -> bool:
+    """Check if two files have the same content. Sizes are compared before hashes."""
+    try:
+        return (os.path.getsize(file1) == os.path.getsize(file2)
+                and hash_file_content(file1) == hash_file_content(file2))
+    except OSError:
+        return False
+
+
+def commit_temp(tmp: str, file: str) -> bool:
+    """Rename a temp file from open_temp to file.
+    The temp file is removed instead when file already has the same content.
+
+    Returns:
+        bool: True if file is replaced.
+    """
+    if is_same_file_content(tmp, file):
+        remove_temp(tmp)
+        return False
+    os.replace(tmp, file)
+    return True
+
+
+def write_file_atomic(data: bytes, file: str) -> bool:
+    """Write data via a temp file and rename it.
+
+    Notes:
+        It won't touch the file when it already has the same content.
+
+    Returns:
+        bool: True if the file is written.
+    """
+    if is_same_content(data, file):
+        return False
+    f, tmp = open_temp(file)
+    try:
+        with f:
+            f.write(data)
+        os.replace(tmp, file)
+    except BaseException:
+        remove_temp(tmp)
+        raise
+    return True
+
+
+def copy_file_atomic(src: str, dst: str, hardlink=False) -> bool:
+    """Copy or hard-link a file via a temp file and rename it.
+
+    Notes:
+        It won't touch dst when it's already the same file or has the same content.
+        Hard links fall back to copies when they are not supported. (e.g. different drives)
+
+    Returns:
+        bool: True if dst is written.
+    """
+    try:
+        if os.path.samefile(src, dst):
+            return False
+    except OSError:
+        pass
+    if is_same_file_content(src, dst):
+        return False
+    f, tmp = open_temp(dst)
+    try:
+        with f:
+            if not hardlink:
+                with open(src, "rb") as src_f:
+                    shutil.copyfileobj(src_f, f, 1 << 20)
+        if hardlink:
+            try:
+                os.remove(tmp)
+                os.link(src, tmp)
+            except OSError:
+                return copy_file_atomic(src, dst)
+        os.replace(tmp, dst)
+    except BaseException:
+        remove_temp(tmp)
+        raise
+    return True
+
+
+NDJSON_FLUSH_LINES = 256
+
+
+def to_ndjson_line(record) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def save_ndjson(records, file: str, flush_lines: int = NDJSON_FLUSH_LINES, atomic=True) -> bool:
+    """Save records as newline delimited json. (a compact json object for each line)
+
+    Notes:
+        records can be a generator. Lines are flushed every flush_lines records,
+        so the whole document is never built in memory.
+        Like write_file_atomic, it writes a temp file and renames it at the end,
+        and won't touch the file when it already has the same content.
+        With atomic=False, lines are written to the file directly. Readers can consume flushed records
+        while it's still writing. (e.g. tail -f) Use flush_lines=1 to flush each record.
+
+    Returns:
+        bool: True if the file is written. (always True when atomic=False)
+    """
+    if atomic:
+        f, tmp = open_temp(file)
+    else:
+        f, tmp = open(file, "wb"), None
+    sha = hashlib.sha256()
+    size = 0
+
+    def write_lines(lines):
+        nonlocal size
+        chunk = "".join(lines).encode("utf-8")
+        sha.update(chunk)
+        size += len(chunk)
+        f.write(chunk)
+        f.flush()
+
+    try:
+        with f:
+            lines = []
+            for record in records:
+                lines.append(to_ndjson_line(record))
+                if len(lines) >= flush_lines:
+                    write_lines(lines)
+                    lines = []
+            if len(lines) > 0:
+                write_lines(lines)
+        if tmp is None:
+            return True
+        if is_same_hash(file, size, sha.digest()):
+            remove_temp(tmp)
+            return False
+        os.replace(tmp, file)
+    except BaseException:
+        if tmp is not None:
+            remove_temp(tmp)
+        raise
+    return True
+
+
+def ndjson_to_bytes(records) -> bytes:
+    """Same as save_ndjson but returns the content."""
+    return "".join(to_ndjson_line(record) for record in records).encode("utf-8")
+
+
+def iter_ndjson(file: str):
+    """Read newline delimited json line by line. Blank lines are skipped."""
+    with open(file, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line != "":
+                yield json.loads(line)
+
+
+def find_str_end(buffer, start: int) -> int:
+    """Find the null terminator of a string in a bytes-like object that has find(). (-1 if not found)"""
+    return buffer.find(b"\x00", start)
+
+
+def find_wstr_end(buffer, start: int) -> int:
+    """Same as find_str_end but for UTF-16 strings. Terminators should be aligned to 2 bytes from start."""
+    end = buffer.find(b"\x00\x00", start)
+    while end >= 0 and (end - start) % 2 != 0:
+        end = buffer.find(b"\x00\x00", end + 1)
+    return end
+
+
+I16 = struct.Struct("<h")
+U16 = struct.Struct("<H")
+I32 = struct.Struct("<i")
+U32 = struct.Struct("<I")
+U64 = struct.Struct("<Q")
+F32 = struct.Struct("<f")
+
+
+class BinaryReader:
+    """File-like reader for little endian data in a bytes-like object (bytes, bytearray, mmap, ...).
+
+    Notes:
+        Values are unpacked from the buffer with precompiled structs. No data is copied
+        except for read() and strings. Array reads return memoryview casts of the buffer.
+        Use tolist() for arrays that should live longer than the reader.
+
+        # String pool
+        Strings are decoded once for each offset and interned. (e.g. attribute names like "Position")
+        read_str_at and read_wstr_at read them without moving the current position.
+
+    # Sample codes
+    from io_util import BinaryReader, U64
+    with BinaryReader.open_file("*.gui.*") as reader:
+        version = reader.read_uint32()
+        offsets = reader.read_uint64_array(4).tolist()
+        count = reader.unpack_from(U64, offsets[0])[0]
+    """
+
+    def __init__(self, buffer, offset: int = 0):
+        self.view = memoryview(buffer).cast("B")
+        # bytes-like object that has find() to search strings. (bytes, bytearray, mmap)
+        self.buffer = buffer if hasattr(buffer, "find") else self.view.tobytes()
+        self.offset = offset
+        self.__mmap: mmap.mmap = None
+        # offset -> (string, offset after the terminator)
+        self.__strs: dict[int, tuple[str, int]] = {}
+        self.__wstrs: dict[int, tuple[str, int]] = {}
+
+    @staticmethod
+    def open_file(file: str):
+        """Map a file to memory and make a reader for it. Use close() to unmap it."""
+        with io.open(file, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # Empty files can't be mapped.
+                return BinaryReader(b"")
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        reader = BinaryReader(buffer)
+        reader.__mmap = buffer
+        return reader
+
+    def __len__(self):
+        return len(self.view)
+
+    def seek(self, offset: int, whence: int = 0):
+        match whence:
+            case 0:
+                self.offset = offset
+            case 1:
+                self.offset += offset
+            case 2:
+                self.offset = len(self.view) + offset
+            case _:
+                raise ValueError(f"Invalid whence. ({whence})")
+        return self.offset
+
+    def tell(self) -> int:
+        return self.offset
+
+    def read(self, size: int = -1) -> bytes:
+        start = self.offset
+        end = len(self.view) if size < 0 else min(start + size, len(self.view))
+        self.offset = max(start, end)
+        return bytes(self.view[start:end])
+
+    def unpack_from(self, st: struct.Struct, offset: int) -> tuple:
+        """Unpack values at an offset. It doesn't move the current position."""
+        return st.unpack_from(self.view, offset)
+
+    def unpack(self, st: struct.Struct) -> tuple:
+        """Unpack values at the current position and skip them."""
+        values = st.unpack_from(self.view, self.offset)
+        self.offset += st.size
+        return values
+
+    def read_value(self, st: struct.Struct):
+        value = st.unpack_from(self.view, self.offset)[0]
+        self.offset += st.size
+        return value
+
+    def read_int16(self) -> int:
+        return self.read_value(I16)
+
+    def read_uint16(self) -> int:
+        return self.read_value(U16)
+
+    def read_int32(self) -> int:
+        return self.read_value(I32)
+
+    def read_uint32(self) -> int:
+        return self.read_value(U32)
+
+    def read_uint64(self) -> int:
+        return self.read_value(U64)
+
+    def read_float32(self) -> float:
+        return self.read_value(F32)
+
+    def read_array(self, fmt: str, num: int):
+        """Read num values of a format character. (e.g. "I", "Q", "f")
+
+        Returns:
+            memoryview (or array.array on big endian machines): values in the buffer
+        """
+        start = self.offset
+        end = start + struct.calcsize(fmt) * num
+        if end > len(self.view):
+            raise struct.error(f"Not enough data for {num} values at {start}.")
+        self.offset = end
+        if sys.byteorder == "little":
+            return self.view[start:end].cast(fmt)
+        ary = array.array(fmt, self.view[start:end])
+        ary.byteswap()
+        return ary
+
+    def read_uint32_array(self, num: int):
+        return self.read_array("I", num)
+
+    def read_uint64_array(self, num: int):
+        return self.read_array("Q", num)
+
+    def read_float32_array(self, num: int):
+        return self.read_array("f", num)
+
+    def __read_pooled(self, offset: int, wide: bool) -> tuple[str, int]:
+        pool = self.__wstrs if wide else self.__strs
+        item = pool.get(offset)
+        if item is None:
+            if wide:
+                end = find_wstr_end(self.buffer, offset)
+            else:
+                end = find_str_end(self.buffer, offset)
+            if end < 0:
+                raise RuntimeError(f"Parse error. (String is not terminated at {offset})")
+            string = str(self.view[offset:end], "utf-16-le" if wide else "utf-8")
+            item = (sys.intern(string), end + (2 if wide else 1))
+            pool[offset] = item
+        return item
+
+    def read_str_at(self, offset: int) -> str:
+        """Read a null-terminated UTF-8 string at an offset."""
+        return self.__read_pooled(offset, False)[0]
+
+    def read_wstr_at(self, offset: int) -> str:
+        """Read a null-terminated UTF-16 string at an offset."""
+        return self.__read_pooled(offset, True)[0]
+
+    def read_str(self) -> str:
+        string, self.offset = self.__read_pooled(self.offset, False)
+        return string
+
+    def read_wstr(self) -> str:
+        string, self.offset = self.__read_pooled(self.offset, True)
+        return string
+
+    def release(self):
+        self.view.release()
+
+    def close(self):
+        """Release the buffer. Mapped files are unmapped."""
+        self.release()
+        if self.__mmap is not None:
+            try:
+                self.__mmap.close()
+            except BufferError:
+                # Some arrays still refer to it. It'll be unmapped when they are freed.
+                pass
+            self.__mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 def read_int16(f: io.BufferedReader):
     return struct.unpack("<h", f.read(2))[0]
 
@@ -54,15 +461,29 @@ def read_float32_array(f: io.BufferedReader, num: int):
     return struct.unpack("<" + "f" * num, f.read(4 * num))
 
 
-def read_str(f):
+# Initial size of chunks to search null terminators in files
+STR_CHUNK_SIZE = 256
+
+
+def read_null_terminated(f, wide=False) -> bytes:
+    """Read bytes until a null terminator. The file position is moved to the end of the terminator."""
     start = f.tell()
-    while f.read(1) != b"\x00":
-        pass
-    length = f.tell() - start
-    f.seek(-length, 1)
-    string = f.read(length - 1).decode()
-    f.seek(1, 1)
-    return string
+    data = bytearray()
+    size = STR_CHUNK_SIZE
+    while True:
+        chunk = f.read(size)
+        data += chunk
+        end = find_wstr_end(data, 0) if wide else find_str_end(data, 0)
+        if end >= 0:
+            f.seek(start + end + (2 if wide else 1))
+            return bytes(data[:end])
+        if len(chunk) < size:
+            raise RuntimeError(f"Parse error. (String is not terminated at {start})")
+        size *= 2
+
+
+def read_str(f):
+    return read_null_terminated(f).decode()
 
 
 def write_str(f, wstr):
@@ -71,14 +492,7 @@ def write_str(f, wstr):
 
 
 def read_wstr(f):
-    start = f.tell()
-    while f.read(2) != b"\x00\x00":
-        pass
-    length = f.tell() - start
-    f.seek(-length, 1)
-    string = f.read(length - 2).decode(encoding="utf-16-le")
-    f.seek(1, 2)
-    return string
+    return read_null_terminated(f, wide=True).decode(encoding="utf-16-le")
 
 
 def write_wstr(f, wstr):
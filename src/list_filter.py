@@ -0,0 +1,282 @@
+"""Filter for *.list of REtool.
+
+Notes:
+    It reads a .list (a path for each line) once and picks paths that match rules.
+    It replaces make_list.bat, which ran findstr over the whole .list for each file type.
+
+    # Rules
+    Rules are a dict of category -> patterns. (See DEFAULT_RULES)
+    - Patterns that start with "re:" are regular expressions matched from the start of paths.
+      (e.g. "re:.*/message/.*\\.msg\\.")
+    - Other patterns are the same as source_walker.py. (e.g. ".msg.*" for suffixes, or globs)
+      They are matched with whole paths.
+    A path is counted for the first category it matches.
+    The default rules pick paths that contain .msg., .fslt., or .gui. like findstr in make_list.bat did.
+    So, paths with platform or language suffixes (e.g. foo.msg.22.X64) are also picked.
+    Use a json file for --rules to change them. (e.g. {"msg": ["re:.*\\.msg\\."], "tex": [".tex.*"]})
+
+    # Index
+    ListIndex has hashes (the same as .pak files) of all paths in a .list.
+    It's saved with the sha256 of the .list and reused until the .list is changed.
+    Then, "is this path in the game?" is a set lookup.
+    filter_list computes the sha256 while filtering. So, a current index costs no extra reads.
+
+    # Sample codes
+    from list_filter import filter_list, load_index
+    counts = filter_list("RE4.list", "custom.list", index_file="RE4.list.index")
+    index = load_index("RE4.list", "RE4.list.index")
+    print("natives/STM/Message/foo.msg.22" in index)
+
+    # Usage
+    python src/list_filter.py file_list [-o=custom.list] [--rules=json] [--index=file]
+"""
+
+import argparse
+import array
+import hashlib
+import os
+import re
+import struct
+from io_util import load_json, open_temp, commit_temp, remove_temp, hash_file_content
+from murmur3 import hash_path, hash_paths
+from source_walker import pattern_to_regex
+
+DEFAULT_RULES = {
+    "msg": ["re:.*\\.msg\\."],
+    "fslt": ["re:.*\\.fslt\\."],
+    "gui": ["re:.*\\.gui\\."]
+}
+
+# Number of paths to hash at once for the index
+HASH_BATCH_SIZE = 4096
+
+
+def rule_to_regex(pattern: str) -> str:
+    if pattern.startswith("re:"):
+        return pattern[3:]
+    return pattern_to_regex(pattern)
+
+
+class ListRules:
+    """Rules compiled into a single regex. Each category is a named group."""
+    def __init__(self, rules: dict[str, list[str]]):
+        self.categories = list(rules.keys())
+        groups = []
+        for i, patterns in enumerate(rules.values()):
+            if len(patterns) == 0:
+                continue
+            groups.append(f"(?P<c{i}>" + "|".join(f"(?:{rule_to_regex(pattern)})" for pattern in patterns) + ")")
+        self.regex = re.compile("|".join(groups)) if len(groups) > 0 else None
+
+    def match(self, path: str) -> str:
+        """Get the category of a path. (None if it doesn't match any rules)"""
+        if self.regex is None:
+            return None
+        m = self.regex.match(path)
+        if m is None:
+            return None
+        return self.categories[int(m.lastgroup[1:])]
+
+
+def get_key(hashes: tuple[int, int]) -> int:
+    return hashes[0] << 32 | hashes[1]
+
+
+def hash_list_paths(paths: list[str]) -> array.array:
+    """Get keys of paths. Paths are hashed in batches."""
+    keys = array.array("Q")
+    for i in range(0, len(paths), HASH_BATCH_SIZE):
+        keys.extend(get_key(hashes) for hashes in hash_paths(paths[i:i + HASH_BATCH_SIZE]))
+    return keys
+
+
+class ListIndex:
+    """Set of path hashes in a .list"""
+    MAGIC = b"DSLI"
+    VERSION = 1
+    # magic, version, sha256 of the .list, number of paths
+    HEAD = struct.Struct("<4sI32sQ")
+
+    def __init__(self, keys=None, digest: bytes = b""):
+        self.keys: set[int] = set(keys or [])
+        self.digest = digest  # sha256 of the .list
+
+    def __contains__(self, path: str) -> bool:
+        return get_key(hash_path(path)) in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def save(self, file: str):
+        keys = array.array("Q", sorted(self.keys))
+        f, tmp = open_temp(file)
+        try:
+            with f:
+                f.write(ListIndex.HEAD.pack(ListIndex.MAGIC, ListIndex.VERSION, self.digest, len(keys)))
+                f.write(keys.tobytes())
+            commit_temp(tmp, file)
+        except BaseException:
+            remove_temp(tmp)
+            raise
+
+    @staticmethod
+    def read_digest(file: str) -> bytes:
+        """Get the sha256 of the .list from an index file. (None if it's missing or broken)"""
+        try:
+            with open(file, "rb") as f:
+                magic, version, digest, _ = ListIndex.HEAD.unpack(f.read(ListIndex.HEAD.size))
+        except (OSError, struct.error):
+            return None
+        if magic != ListIndex.MAGIC or version != ListIndex.VERSION:
+            return None
+        return digest
+
+    @staticmethod
+    def load(file: str, digest: bytes = None):
+        """Load an index. Returns None when it's missing, broken, or made from another .list."""
+        try:
+            with open(file, "rb") as f:
+                magic, version, file_digest, count = ListIndex.HEAD.unpack(f.read(ListIndex.HEAD.size))
+                if magic != ListIndex.MAGIC or version != ListIndex.VERSION:
+                    return None
+                if digest is not None and file_digest != digest:
+                    return None
+                keys = array.array("Q")
+                keys.frombytes(f.read())
+        except (OSError, struct.error, ValueError):
+            return None
+        if len(keys) != count:
+            return None
+        return ListIndex(keys, file_digest)
+
+
+def iter_list(file_list: str, rules: ListRules, on_line=None):
+    """Yield (category, path, line) for paths that match rules.
+
+    Args:
+        on_line: function called with (raw line, path) for every line. (e.g. to hash all paths)
+    """
+    with open(file_list, "rb") as f:
+        for line in f:
+            path = line.decode("utf-8", errors="replace").strip()
+            if on_line is not None:
+                on_line(line, path)
+            if path == "":
+                continue
+            category = rules.match(path)
+            if category is not None:
+                yield category, path, line
+
+
+class ListHasher:
+    """Hash paths of a .list in batches while streaming. Only keys are kept."""
+    def __init__(self):
+        self.keys = array.array("Q")
+        self.batch = []
+
+    def add(self, path: str):
+        if path == "":
+            return
+        self.batch.append(path)
+        if len(self.batch) >= HASH_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.keys.extend(hash_list_paths(self.batch))
+        self.batch.clear()
+
+
+def hash_list_file(file_list: str) -> array.array:
+    """Get keys of all paths in a .list."""
+    hasher = ListHasher()
+    with open(file_list, "rb") as f:
+        for line in f:
+            hasher.add(line.decode("utf-8", errors="replace").strip())
+    hasher.flush()
+    return hasher.keys
+
+
+def filter_list(file_list: str, out: str, rules: dict[str, list[str]] = None, index_file: str = None) -> dict[str, int]:
+    """Write paths that match rules to out with a single pass over the .list.
+
+    Notes:
+        Lines are written as they are, in the same order as the .list.
+        With index_file, the sha256 of the .list is computed while streaming and
+        compared with the saved index at the end. When there is no index, paths are also hashed while streaming.
+        Only when the saved index is made from another .list, the .list is read again to rebuild it.
+
+    Returns:
+        dict[str, int]: number of paths for each category
+    """
+    list_rules = ListRules(DEFAULT_RULES if rules is None else rules)
+    counts = {category: 0 for category in list_rules.categories}
+    on_line = None
+    if index_file is not None:
+        saved_digest = ListIndex.read_digest(index_file)
+        sha = hashlib.sha256()
+        hasher = ListHasher() if saved_digest is None else None
+
+        def on_line(line: bytes, path: str):
+            sha.update(line)
+            if hasher is not None:
+                hasher.add(path)
+
+    f, tmp = open_temp(out)
+    try:
+        with f:
+            for category, _, line in iter_list(file_list, list_rules, on_line=on_line):
+                counts[category] += 1
+                f.write(line if line.endswith(b"\n") else line + b"\n")
+        commit_temp(tmp, out)
+    except BaseException:
+        remove_temp(tmp)
+        raise
+    if on_line is not None:
+        digest = sha.digest()
+        if hasher is not None:
+            hasher.flush()
+            ListIndex(hasher.keys, digest).save(index_file)
+        elif saved_digest != digest:
+            ListIndex(hash_list_file(file_list), digest).save(index_file)
+    return counts
+
+
+def load_index(file_list: str, index_file: str) -> ListIndex:
+    """Load the index of a .list. It's rebuilt when the .list is changed."""
+    digest = hash_file_content(file_list)
+    index = ListIndex.load(index_file, digest)
+    if index is not None:
+        return index
+    index = ListIndex(hash_list_file(file_list), digest)
+    index.save(index_file)
+    return index
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+                prog = 'python list_filter.py',
+                description = 'Pick paths from .list for REtool.')
+    parser.add_argument('file_list', type=str, help='.list for REtool')
+    parser.add_argument('-o', '--out', type=str, default="custom.list", help='output .list')
+    parser.add_argument('--rules', type=str, default=None,
+                        help='json file that has patterns for each category. (default: msg, fslt, and gui files)')
+    parser.add_argument('--index', type=str, default=None,
+                        help='file to save hashes of all paths in the .list.')
+    args = parser.parse_args()
+    if not os.path.isfile(args.file_list):
+        raise RuntimeError(f"{args.file_list} is NOT a file.")
+    return args
+
+
+def print_counts(counts: dict[str, int]):
+    for category, count in counts.items():
+        print(f"  {category}: {count}")
+    print(f"  total: {sum(counts.values())}")
+
+
+if __name__ == "__main__":
+    args = get_args()
+    rules = None if args.rules is None else load_json(args.rules)
+    counts = filter_list(args.file_list, args.out, rules=rules, index_file=args.index)
+    print(f"Saved {args.out}")
+    print_counts(counts)
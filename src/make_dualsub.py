@@ -10,6 +10,45 @@ Notes:
     - l1: use this as 2nd language when user's language is the same as l2.
     - l2: use this as 2nd language for other languages.
     - json: json file that has entry name patterns. use entry_patterns/re4.json for RE4 files.
+    - --jobs=N: process .msg files with N worker processes.
+    - --pipeline: read and write files on threads while merging files in worker processes.
+      It hides I/O latency on slow (e.g. network) storage.
+    - --low_memory: process entries one by one instead of loading all entries of a file.
+      Peak memory for each file is printed. With --profile_report, it's also saved in the report.
+
+    # Watch mode
+    python src/make_dualsub.py src -j=json --watch [options]
+    It keeps parsed files in memory and polls mtimes of src and the patterns file.
+    Only changed files, or entries whose flags are changed by the new patterns, are merged again.
+
+    # Multiple language pairs
+    python src/make_dualsub.py src --pairs=en+ja,ja+en,zhcn+en -j=json [options]
+    - Each pair is main_lang+sub_lang.
+    - Each .msg file is parsed only once, and each pair is saved in out/main_lang_sub_lang.
+
+    # Profiling
+    Use --profile-report=path.json to save seconds for each stage (import, classify, merge, export),
+    byte sizes, and entry counts of each file, with histograms and the slowest files.
+
+    # Incremental builds
+    The output folder has a build manifest (.dualsub_manifest.json).
+    Files are skipped when their contents and the settings are the same as the previous build.
+    Use --rebuild to process all files. The manifest is still updated for the next build.
+    Classified entry names are cached for each patterns file in out/.dualsub_classes.json.
+    Use --class_cache=path to share it between output folders (e.g. game versions).
+    Files with no changed entries are not exported.
+    Use --pass_through=copy (or hardlink) to put them in the output folder as they are.
+    Outputs are written via temp files, and files that have the same content as before are not rewritten.
+
+    # Pak output
+    Use --pak=name.pak to put outputs in out/name.pak instead of writing loose files.
+    Paths in the .pak are relative to the output folder. So, src should be the natives folder.
+    Use --pak_compress to compress files with deflate. (on --jobs threads)
+    All files are processed every time. (It implies --rebuild.)
+
+    # Newline delimited json
+    Use --ndjson to save a compact json record (name, guid, text for each language) for each entry.
+    Records are written while merging. Use REMessage.iter_ndjson_entries to read them one by one.
 
     # Language list
     ja: Japanese               en: English
@@ -33,15 +72,31 @@ Notes:
 
 import argparse
 from argparse import RawTextHelpFormatter
+import collections
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import functools
+import io
 import json
 import os
-import re
+import queue
+import sys
 import textwrap
+import threading
+import time
+import traceback
+import tracemalloc
 
-import REMSGUtil
-from REMSG import MSG, LANG_LIST
+from REMessage import Message, MessageStreamWriter, LANG_LIST, SHORT_LANG_TO_INT
+from entry_classifier import EntryClassifier
+from build_cache import BuildManifest, ClassificationCache, hash_json
+from profile_report import save_report, print_summary, format_size
+from io_util import (load_json, json_to_bytes, ndjson_to_bytes, to_ndjson_line, write_file_atomic,
+                     copy_file_atomic, open_temp, commit_temp, remove_temp)
+from REPak import PakWriter
+from source_walker import (walk_files, prefetch_files, parse_patterns, snapshot_files, diff_snapshots,
+                           PREFETCH_DEPTH)
 
-SHORT_LANG_TO_INT = REMSGUtil.SHORT_LANG_LU
 SHORT_LANG_TO_LONG = {key: LANG_LIST[i] for key, i in SHORT_LANG_TO_INT.items()}
 
 
@@ -70,12 +125,58 @@ def get_args():
     parser.add_argument('-l2', '--sub_lang', type=str, default="ja",
                         help='use this as 2nd language for other languages.')
     parser.add_argument('-o', '--out', type=str, default="out", help='output directory.')
+    parser.add_argument('--pairs', type=str, default="",
+                        help='comma separated main_lang+sub_lang pairs (e.g. en+ja,ja+en).\n'
+                             'main_lang and sub_lang will be ignored when using this option.')
     parser.add_argument('-j', '--patterns_json', type=str, default="",
                         help='json file that has entry name patterns.')
     parser.add_argument('--save_as_json', action='store_true',
                         help='Save editted files as json.')
+    parser.add_argument('--ndjson', action='store_true',
+                        help='Save editted files as newline delimited json (a compact record for each entry).\n'
+                             'It implies --save_as_json.')
     parser.add_argument('--ignore_one_line', action='store_true',
                         help='Use "one_line_entries" patters as "ignore_entries".')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of worker processes for a directory.')
+    parser.add_argument('--merge_cache_size', type=int, default=MERGE_CACHE_SIZE,
+                        help='Max number of merged text to memoize for each process.')
+    parser.add_argument('--profile_report', '--profile-report', type=str, default=None,
+                        help='json file to save seconds for each stage, sizes, and entry counts of each file.')
+    parser.add_argument('--profile_slowest', type=int, default=20,
+                        help='Number of the slowest files in the profile report.')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Process all files even if they are up to date in the build manifest.\n'
+                             'The manifest is still updated for the next build.')
+    parser.add_argument('--pass_through', type=str, default=None, choices=["copy", "hardlink"],
+                        help='Copy or hard-link files that have no changed entries to the output folder.\n'
+                             'They are not exported by default. (only for .msg outputs)\n'
+                             'Note that hard-linked outputs share data with the sources.')
+    parser.add_argument('--pak', type=str, default=None,
+                        help='Save outputs in out/PAK instead of loose files. It implies --rebuild.')
+    parser.add_argument('--pak_compress', action='store_true',
+                        help='Compress files in the .pak with deflate.')
+    parser.add_argument('--low_memory', action='store_true',
+                        help='Decode, merge, and write entries one by one.\n'
+                             'Peak memory for each file is printed and saved in --profile_report.\n'
+                             'It supports .msg and --ndjson outputs. It can NOT be used with --pipeline.')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep sources in memory and rebuild outputs when sources or the patterns file change.')
+    parser.add_argument('--watch_interval', type=float, default=WATCH_INTERVAL,
+                        help='Seconds between polls for the watch mode.')
+    parser.add_argument('--class_cache', type=str, default=None,
+                        help='json file to cache classified entry names across runs.\n'
+                             '(default: out/.dualsub_classes.json)')
+    parser.add_argument('--no_class_cache', action='store_true',
+                        help='Classify all entry names with the patterns and don\'t save the cache.')
+    parser.add_argument('--exclude', type=str, default="",
+                        help='comma separated patterns of file and folder names to skip.\n'
+                             '(e.g. "streaming,*_old.msg.*")')
+    parser.add_argument('--prefetch', action='store_true',
+                        help='Read the next files on a background thread. (only for --jobs=1)')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Overlap reading, merging, and writing files.\n'
+                             'Files are merged in --jobs worker processes while other threads read and write files.')
     args = parser.parse_args()
 
     # Check args
@@ -83,20 +184,73 @@ def get_args():
         raise RuntimeError(f"{args.main_lang} is not supported.\n{lang_list}")
     if args.sub_lang not in SHORT_LANG_TO_LONG.keys():
         raise RuntimeError(f"{args.sub_lang} is not supported.\n{lang_list}")
+    args.pairs = parse_pairs(args.pairs)
+    args.exclude = parse_patterns(args.exclude)
+    for pair in args.pairs:
+        for lang in pair:
+            if lang not in SHORT_LANG_TO_LONG.keys():
+                raise RuntimeError(f"{lang} is not supported.\n{lang_list}")
     if not os.path.exists(args.source):
         raise RuntimeError(f"Specified path does NOT exist. ({args.source})")
+    if args.jobs < 1:
+        raise RuntimeError(f"--jobs should be 1 or more. ({args.jobs})")
+    if args.low_memory and args.pipeline:
+        raise RuntimeError("--low_memory can NOT be used with --pipeline.")
+    if args.low_memory and args.save_as_json and not args.ndjson:
+        raise RuntimeError("--low_memory can NOT save files as json. Use --ndjson instead.")
+    if args.pass_through is not None and args.save_as_json:
+        raise RuntimeError("--pass_through can NOT be used with --save_as_json nor --ndjson.")
+    if args.watch and (args.low_memory or args.pipeline):
+        raise RuntimeError("--watch can NOT be used with --low_memory nor --pipeline.")
+    if args.pak is not None and (args.save_as_json or args.ndjson or args.low_memory or args.watch):
+        raise RuntimeError("--pak can NOT be used with --save_as_json, --ndjson, --low_memory, nor --watch.")
+    if args.pak is None and args.pak_compress:
+        raise RuntimeError("--pak_compress requires --pak.")
+    if args.watch and args.patterns_json == "":
+        raise RuntimeError("--watch requires --patterns_json.")
+    if args.merge_cache_size < 0:
+        raise RuntimeError(f"--merge_cache_size should be 0 or more. ({args.merge_cache_size})")
 
     print(f"Input: {args.source}")
     print(f"Output: {args.out}")
-    print(f"Main lang: {SHORT_LANG_TO_LONG[args.main_lang]}")
-    print(f"2nd lang: {SHORT_LANG_TO_LONG[args.sub_lang]}")
+    if len(args.pairs) == 0:
+        print(f"Main lang: {SHORT_LANG_TO_LONG[args.main_lang]}")
+        print(f"2nd lang: {SHORT_LANG_TO_LONG[args.sub_lang]}")
+    else:
+        print("Pairs: " + ", ".join(f"{main}+{sub}" for main, sub in args.pairs))
     print(f"Patterns file: {args.patterns_json}")
-    print(f"Save as json: {args.save_as_json}")
+    if args.ndjson:
+        args.save_as_json = True
+    print(f"Save as json: {args.save_as_json}" + (" (ndjson)" if args.ndjson else ""))
     print(f"Ignore one line: {args.ignore_one_line}")
+    print(f"Jobs: {args.jobs}")
+    print(f"Rebuild: {args.rebuild}")
+    print(f"Low memory: {args.low_memory}")
+    if args.pak is not None:
+        print(f"Pak: {args.pak}" + (" (compressed)" if args.pak_compress else ""))
+        args.rebuild = True
+    if len(args.exclude) > 0:
+        print("Exclude: " + ", ".join(args.exclude))
+    if args.profile_report is not None:
+        print(f"Profile report: {args.profile_report}")
 
     return args
 
 
+def parse_pairs(pairs: str) -> list[tuple[str, str]]:
+    """Parse "en+ja,ja+en" into [("en", "ja"), ("ja", "en")]."""
+    parsed = []
+    for pair in pairs.split(","):
+        pair = pair.strip()
+        if pair == "":
+            continue
+        langs = pair.split("+")
+        if len(langs) != 2:
+            raise RuntimeError(f"Language pair should be main_lang+sub_lang. ({pair})")
+        parsed.append((langs[0].strip(), langs[1].strip()))
+    return parsed
+
+
 def read_json(json_path):
     try:
         with open(json_path, encoding='utf-8') as f:
@@ -105,17 +259,10 @@ def read_json(json_path):
         return {}
 
 
-def has_pattern(entry, patterns: list[str]):
-    for pt in patterns:
-        if re.match(pt, entry.name):
-            return True
-    return False
-
-
-def should_skip(entry, ignore_entries: list[str]):
-    # ignore_entries: entry name pattern whose text should be displayed in a language.
+def should_skip(entry, is_ignored: bool):
+    # is_ignored: entry name matches ignore_entries. (text should be displayed in a language.)
     text = entry.langs[0]
-    if has_pattern(entry, ignore_entries):
+    if is_ignored:
         return True
     if text.startswith("<COLOR"):
         return True
@@ -124,33 +271,56 @@ def should_skip(entry, ignore_entries: list[str]):
     return False
 
 
-def should_be_one_line(entry, one_line_entries: list[str]):
-    # one_line_entries: entry name pattern whose text should be displayed in a line.
+def should_be_one_line(entry, is_one_line: bool):
+    # is_one_line: entry name matches one_line_entries. (text should be displayed in a line.)
     text = entry.langs[0]
-    if has_pattern(entry, one_line_entries) and "\r\n" not in text:
+    if is_one_line and "\r\n" not in text:
         return True
     if text.startswith("<ICON") and "\r\n" not in text:
         return True
     return False
 
 
-def is_almost_same(text1, text2):
+class NormalizedText:
+    """Precomputed forms of a text to compare other text with it in is_almost_same."""
+    __slots__ = ("lower", "no_space", "variants", "ies_stem")
+
+    def __init__(self, text: str):
+        tl = text.lower()
+        self.lower = tl
+        self.no_space = tl.replace(" ", "")
+        # Other text is almost the same as this text if its lower() is in variants.
+        # (e.g. "items" -> "item", "the item" -> "item")
+        variants = []
+        if tl.endswith("s") or tl.endswith("."):
+            variants.append(tl[:-1])
+        if tl.endswith("es"):
+            variants.append(tl[:-2])
+        if tl.startswith("the "):
+            variants.append(tl[4:])
+        self.variants = tuple(variants)
+        # Stem for "-ies". (e.g. "entry" and "entries" have the same stem "entr".)
+        self.ies_stem = tl[:-3] if tl.endswith("ies") else None
+
+
+# Normalized forms are reused for all languages of an entry and across entries.
+normalize_text = functools.lru_cache(maxsize=1 << 16)(NormalizedText)
+
+
+def is_almost_same(text1: str, text2: NormalizedText):
     tl1 = text1.lower()
-    tl2 = text2.lower()
-    if (tl2 in tl1 or tl2 == tl1 + "s"
-        or tl2 == tl1 + "."
-        or tl2 == tl1 + "es"
-        or tl2 == tl1[:-1] + "ies"
-        or tl2 == "the " + tl1):
+    if (text2.lower in tl1
+        or tl1 in text2.variants
+        or (text2.ies_stem is not None and tl1[:-1] == text2.ies_stem)):
         return True
-    if tl1.replace(" ", "") == tl2.replace(" ", ""):
+    if tl1.replace(" ", "") == text2.no_space:
         return True
     return False
 
 
 def merge_text(main_text, sub_text, sep="\r\n", is_three_lines=False):
     if (len(main_text) <= 100 and len(sub_text) <= 100
-        and is_almost_same(main_text, sub_text)):
+        and is_almost_same(main_text, normalize_text(sub_text))):
         return main_text
     if is_three_lines and ("\r\n" in main_text) and ("\r\n" in sub_text):
         main_splitted = main_text.split("\r\n")
@@ -166,22 +336,55 @@ def merge_text(main_text, sub_text, sep="\r\n", is_three_lines=False):
     return main_text + sep + sub_text
 
 
+# Max number of (text, other_text, separator, is_three_lines) to memoize.
+MERGE_CACHE_SIZE = 1 << 16
+# merge_text with a bounded LRU cache. The same text appears many times across files.
+cached_merge_text = functools.lru_cache(maxsize=MERGE_CACHE_SIZE)(merge_text)
+
+
+def set_merge_cache_size(size: int):
+    global cached_merge_text
+    cached_merge_text = functools.lru_cache(maxsize=size)(merge_text)
+
+
+def get_merge_cache_counts() -> tuple[int, int]:
+    """Get (hits, misses) of cached_merge_text."""
+    info = cached_merge_text.cache_info()
+    return info.hits, info.misses
+
+
+def print_merge_cache_stats(hits: int, misses: int):
+    calls = hits + misses
+    rate = hits / calls * 100 if calls > 0 else 0
+    print(f"merge_text cache: {hits}/{calls} hits ({rate:.1f}%)")
+
+
 def merge_entry(entry, main_lang: int, sub_lang: int,
-                ignore_entries, one_line_entries,
-                three_lines_entries,
-                ignore_one_line=False):
+                classifier: EntryClassifier,
+                ignore_one_line=False, flags: tuple[bool, bool, bool] = None) -> bool:
+    """Merge sub_lang's text into other languages' text.
+
+    Args:
+        flags: result of classifier.classify(entry.name). It'll be classified when None.
+
+    Returns:
+        bool: True if entry.set_content is called.
+    """
     contents = entry.langs
     sub_text = contents[sub_lang]
-    if sub_text in ["", "\n"] or should_skip(entry, ignore_entries):
-        return
+    if sub_text in ["", "\n"]:
+        return False
+    if flags is None:
+        flags = classifier.classify(entry.name)
+    is_ignored, is_one_line, is_three_lines = flags
+    if should_skip(entry, is_ignored):
+        return False
     separator = "\r\n"
-    if should_be_one_line(entry, one_line_entries):
+    if should_be_one_line(entry, is_one_line):
         if ignore_one_line:
-            return
+            return False
         separator = " / "
 
-    is_three_lines = has_pattern(entry, three_lines_entries)
-
     new_contents = []
 
     for i, text in zip(range(len(contents)), contents):
@@ -193,83 +396,1057 @@ def merge_entry(entry, main_lang: int, sub_lang: int,
             if main_text in ["", "\n"]:
                 new_contents.append(text)
                 continue
-            new_text = merge_text(text, main_text,
-                                  sep=separator,
-                                  is_three_lines=is_three_lines)
+            new_text = cached_merge_text(text, main_text, separator, is_three_lines)
         else:
-            new_text = merge_text(text, sub_text,
-                                  sep=separator,
-                                  is_three_lines=is_three_lines)
+            new_text = cached_merge_text(text, sub_text, separator, is_three_lines)
         new_contents.append(new_text)
-    entry.setContent(new_contents)
+    entry.set_content(new_contents)
+    return True
 
 
-def merge_msg(file, out, main_lang: int, sub_lang: int,
-              ignore_entries, one_line_entries,
-              three_lines_entries,
-              save_as_json=False, ignore_one_line=False):
-    print(f"Processing {file}...")
-    msg: MSG = REMSGUtil.importMSG(os.path.abspath(file))
-    mkdir(out)
+def get_new_file(file, out, save_as_json=False, ndjson=False):
     new_file = os.path.abspath(os.path.join(out, os.path.basename(file)))
+    if ndjson:
+        new_file += ".ndjson"
+    elif save_as_json:
+        new_file += ".json"
+    return new_file
 
-    for entry in msg.entrys:
-        merge_entry(entry, main_lang, sub_lang,
-                    ignore_entries, one_line_entries,
-                    three_lines_entries,
-                    ignore_one_line=ignore_one_line)
+
+def render_msg(msg: Message, save_as_json=False, ndjson=False) -> bytes:
+    """Get the content of a merged .msg file without writing it."""
+    if ndjson:
+        return ndjson_to_bytes(msg.iter_entry_records())
     if save_as_json:
-        REMSGUtil.exportJson(msg, new_file + ".json")
+        return json_to_bytes(msg.get_json())
+    return msg.to_bytes()
+
+
+def write_output(new_file, data: bytes, log=print):
+    """Write a file via a temp file and an atomic rename.
+    The existing file won't be touched when it has the same content as the previous build.
+
+    Args:
+        log: function to print messages. (e.g. to print them on another thread)
+    """
+    mkdir(os.path.dirname(new_file))
+    if not write_file_atomic(data, new_file):
+        log(f"{new_file} is up to date.")
+
+
+def export_msg(msg: Message, file, out, save_as_json=False, ndjson=False):
+    """Export a merged .msg file.
+
+    Notes:
+        See write_output for how files are written.
+        With ndjson=True, entries are written one by one instead of building the whole file in memory.
+
+    Returns:
+        (str, int): new file and its size
+    """
+    new_file = get_new_file(file, out, save_as_json=save_as_json, ndjson=ndjson)
+    if ndjson:
+        mkdir(out)
+        if not msg.export_ndjson(new_file):
+            print(f"{new_file} is up to date.")
+        return new_file, os.path.getsize(new_file)
+    data = render_msg(msg, save_as_json=save_as_json)
+    write_output(new_file, data)
+    return new_file, len(data)
+
+
+def is_same_file(file, new_file) -> bool:
+    """Check if an output is the source file itself. (e.g. -o=. for a single file)"""
+    try:
+        return os.path.samefile(file, new_file)
+    except OSError:
+        return False
+
+
+def remove_stale_output(new_file, file=None, log=print):
+    """Remove an output of the previous build. It's for files that have no changes now.
+    It won't remove the source file when the output path points to it.
+    """
+    if file is not None and is_same_file(file, new_file):
+        return
+    if os.path.isfile(new_file):
+        os.remove(new_file)
+        log(f"Removed {new_file}")
+
+
+def pass_through_file(file, new_file, hardlink=False, log=print):
+    """Copy or hard-link a source file that has no changes to the output."""
+    mkdir(os.path.dirname(new_file))
+    if not copy_file_atomic(file, new_file, hardlink=hardlink):
+        log(f"{new_file} is up to date.")
+
+
+def skip_unchanged(file, out, main_lang: int, sub_lang: int, save_as_json=False, ndjson=False,
+                   pass_through: str = None, outputs: list = None):
+    """Handle a target that has no changed entries.
+
+    Notes:
+        The output of the previous build is removed by default.
+        With pass_through="copy" or "hardlink", the source file is copied or hard-linked to the output instead.
+
+    Args:
+        outputs: see merge_msg_pairs.
+
+    Returns:
+        str: the passed-through file (None if it's skipped)
+    """
+    pair = f"{LANG_LIST[main_lang]}+{LANG_LIST[sub_lang]}"
+    if pass_through is None:
+        print(f"No entries were changed for {pair}. Skipped.")
+        new_file = get_new_file(file, out, save_as_json=save_as_json, ndjson=ndjson)
+        if outputs is None:
+            remove_stale_output(new_file, file=file)
+        elif not is_same_file(file, new_file):
+            outputs.append((new_file, None))
+        return None
+    print(f"No entries were changed for {pair}. Passed through.")
+    new_file = get_new_file(file, out)
+    if outputs is None:
+        pass_through_file(file, new_file, hardlink=pass_through == "hardlink")
     else:
-        REMSGUtil.exportMSG(msg, new_file)
+        outputs.append((new_file, file))
+    return new_file
+
+
+def add_to_paks(paks: dict[str, PakWriter], new_file, data):
+    """Add an output to the .pak of its output folder.
+
+    Args:
+        paks: output folder (absolute path) -> PakWriter
+        data: bytes or a path to a source file to pass through
+    """
+    for out, pak in paks.items():
+        if new_file.startswith(out + os.sep):
+            path = os.path.relpath(new_file, out)
+            if isinstance(data, str):
+                pak.add_file(path, data)
+            else:
+                pak.add(path, data)
+            return
+    raise RuntimeError(f"No .pak for {new_file}.")
+
+
+def write_outputs(outputs: list[tuple[str, bytes]], pass_through: str = None,
+                  paks: dict[str, PakWriter] = None, log=print):
+    """Write outputs from merge_msg_pairs.
+
+    Notes:
+        data=None means the file should be removed.
+        data can be a path (str) to a source file to pass through. (See skip_unchanged.)
+        With paks, outputs are added to the .pak files instead. (See add_to_paks.)
+
+    Args:
+        log: see write_output.
+    """
+    for new_file, data in outputs:
+        if paks is not None:
+            if data is not None:
+                add_to_paks(paks, new_file, data)
+        elif data is None:
+            remove_stale_output(new_file, log=log)
+        elif isinstance(data, str):
+            pass_through_file(data, new_file, hardlink=pass_through == "hardlink", log=log)
+        else:
+            write_output(new_file, data, log=log)
+
+
+def merge_msg_stream(file, targets: list[tuple[str, int, int]],
+                     classifier: EntryClassifier,
+                     ignore_one_line=False,
+                     stats: dict = None, ndjson=False, data: bytes = None,
+                     pass_through: str = None, trace_memory=True) -> list[str]:
+    """Low memory version of merge_msg_pairs.
+
+    Notes:
+        Entries are decoded, merged for each pair, written, and released one by one.
+        So, it doesn't make the entry list nor keep decoded text of the file.
+        Outputs are .msg or ndjson. (json is not supported.)
+
+    Args:
+        trace_memory: measure peak memory allocated by Python while processing the file with tracemalloc.
+            It's printed and stored in stats as peak_memory. Disable it for speed if you don't need it.
+    """
+    print(f"Processing {file}...")
+    if trace_memory:
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        base_memory = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    msg = Message()
+    if data is None:
+        msg.import_msg(file, stream=True)
+    else:
+        msg.read(data, stream=True)
+    import_time = time.perf_counter() - start
+
+    # (new_file, temp file object, temp path, MessageStreamWriter)
+    sinks = []
+    changed_counts = [0] * len(targets)
+    lang_keys = msg.get_lang_keys()
+    classify_time = 0
+    merge_time = 0
+    export_time = 0
+    try:
+        start = time.perf_counter()
+        for out, _, _ in targets:
+            new_file = get_new_file(file, out, ndjson=ndjson)
+            mkdir(out)
+            f, tmp = open_temp(new_file)
+            sinks.append((new_file, f, tmp, None if ndjson else MessageStreamWriter(msg, f)))
+        export_time += time.perf_counter() - start
+
+        for entry in msg.iter_entries():
+            start = time.perf_counter()
+            flags = classifier.classify(entry.name)
+            classify_time += time.perf_counter() - start
+            original_contents = entry.langs
+            for i, ((_, main_lang, sub_lang), (_, f, _, writer)) in enumerate(zip(targets, sinks)):
+                start = time.perf_counter()
+                if i > 0:
+                    entry.set_content(original_contents)
+                merge_entry(entry, main_lang, sub_lang, classifier,
+                            ignore_one_line=ignore_one_line, flags=flags)
+                changed_counts[i] += entry.changed
+                merge_time += time.perf_counter() - start
+
+                start = time.perf_counter()
+                if writer is None:
+                    f.write(to_ndjson_line(entry.get_record(lang_keys)).encode("utf-8"))
+                else:
+                    writer.write_entry(entry)
+                export_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        new_files = []
+        out_bytes = 0
+        for (new_file, f, tmp, writer), (out, main_lang, sub_lang), count in zip(sinks, targets, changed_counts):
+            if writer is not None:
+                writer.close()
+            f.close()
+            if count == 0:
+                remove_temp(tmp)
+                passed_file = skip_unchanged(file, out, main_lang, sub_lang, ndjson=ndjson,
+                                             pass_through=pass_through)
+                if passed_file is not None:
+                    new_files.append(passed_file)
+                continue
+            out_bytes += os.path.getsize(tmp)
+            if not commit_temp(tmp, new_file):
+                print(f"{new_file} is up to date.")
+            new_files.append(new_file)
+        export_time += time.perf_counter() - start
+    except BaseException:
+        for _, f, tmp, _ in sinks:
+            f.close()
+            remove_temp(tmp)
+        raise
+    finally:
+        msg.close()
+        if trace_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1] - base_memory
+            if not tracing:
+                tracemalloc.stop()
+
+    if trace_memory:
+        print(f"Peak memory: {format_size(peak_memory)}")
+    if stats is not None:
+        stats.update({
+            "file": file,
+            "entries": msg.entry_count,
+            "in_bytes": os.path.getsize(file) if data is None else len(data),
+            "out_bytes": out_bytes,
+            "import": import_time,
+            "classify": classify_time,
+            "merge": merge_time,
+            "export": export_time,
+            "changed_entries": changed_counts
+        })
+        if trace_memory:
+            stats["peak_memory"] = peak_memory
+    return new_files
+
+
+def merge_msg_pairs(file, targets: list[tuple[str, int, int]],
+                    classifier: EntryClassifier,
+                    save_as_json=False, ignore_one_line=False,
+                    stats: dict = None, ndjson=False, data: bytes = None,
+                    outputs: list = None, low_memory=False, pass_through: str = None,
+                    trace_memory=True) -> list[str]:
+    """Parse a .msg file once and merge it for each language pair.
+
+    Args:
+        targets: list of (out, main_lang, sub_lang)
+        data: content of the file if it's already loaded. (e.g. by prefetch_files)
+        outputs: list to store (new_file, data) instead of writing files.
+            data is None for files that should be removed. Use write_outputs to write them later.
+        low_memory: use merge_msg_stream. outputs and json (without ndjson) are not supported.
+        trace_memory: see merge_msg_stream. (only for low_memory)
+        pass_through: "copy" or "hardlink" to output source files as they are when no entries are changed.
+            (only for .msg outputs) See skip_unchanged for the details.
+        stats: dict to store entry count, byte sizes, and seconds for each stage.
+            (import, classify, merge, export)
+            Text is decoded lazily. So, decoding time is included in classify and merge.
+            It also has changed_entries. (number of changed entries for each target)
+
+    Returns:
+        list[str]: new files for targets.
+            Targets with no changes are skipped and not in the list.
+    """
+    if low_memory:
+        if outputs is not None or (save_as_json and not ndjson):
+            raise RuntimeError("Low memory mode only supports .msg and ndjson files.")
+        return merge_msg_stream(file, targets, classifier, ignore_one_line=ignore_one_line,
+                                stats=stats, ndjson=ndjson, data=data, pass_through=pass_through,
+                                trace_memory=trace_memory)
+    print(f"Processing {file}...")
+    start = time.perf_counter()
+    msg = Message()
+    if data is None:
+        msg.import_msg(file)
+    else:
+        msg.read(data)
+    import_time = time.perf_counter() - start
+
+    try:
+        start = time.perf_counter()
+        flags_list = [classifier.classify(entry.name) for entry in msg.entries]
+        classify_time = time.perf_counter() - start
+
+        # Shallow copies of the original text to restore entries for the next pair.
+        original_contents = None
+        if len(targets) > 1:
+            original_contents = [list(entry.langs) for entry in msg.entries]
+
+        new_files = []
+        out_bytes = 0
+        changed_counts = []
+        changed_list = []
+        merge_time = 0
+        export_time = 0
+        for out, main_lang, sub_lang in targets:
+            start = time.perf_counter()
+            # Restore entries that were edited for the previous pair.
+            for entry, contents, changed in zip(msg.entries, original_contents or [], changed_list):
+                if changed:
+                    entry.set_content(contents)
+            changed_list = [merge_entry(entry, main_lang, sub_lang,
+                                        classifier,
+                                        ignore_one_line=ignore_one_line, flags=flags)
+                            for entry, flags in zip(msg.entries, flags_list)]
+            merge_time += time.perf_counter() - start
 
+            start = time.perf_counter()
+            changed_count = sum(entry.changed for entry in msg.entries)
+            changed_counts.append(changed_count)
+            if changed_count == 0:
+                passed_file = skip_unchanged(file, out, main_lang, sub_lang,
+                                             save_as_json=save_as_json, ndjson=ndjson,
+                                             pass_through=pass_through, outputs=outputs)
+                if passed_file is not None:
+                    new_files.append(passed_file)
+            elif outputs is None:
+                new_file, size = export_msg(msg, file, out, save_as_json=save_as_json, ndjson=ndjson)
+                new_files.append(new_file)
+                out_bytes += size
+            else:
+                new_file = get_new_file(file, out, save_as_json=save_as_json, ndjson=ndjson)
+                new_data = render_msg(msg, save_as_json=save_as_json, ndjson=ndjson)
+                outputs.append((new_file, new_data))
+                new_files.append(new_file)
+                out_bytes += len(new_data)
+            export_time += time.perf_counter() - start
+    finally:
+        msg.close()
 
-def is_msg(file):
-    splitted = file.split(".")
-    return len(splitted) >= 3 and splitted[-2] == "msg"
+    if stats is not None:
+        stats.update({
+            "file": file,
+            "entries": len(msg.entries),
+            "in_bytes": os.path.getsize(file) if data is None else len(data),
+            "out_bytes": out_bytes,
+            "import": import_time,
+            "classify": classify_time,
+            "merge": merge_time,
+            "export": export_time,
+            "changed_entries": changed_counts
+        })
+    return new_files
+
+
+def merge_msg(file, out, main_lang: int, sub_lang: int,
+              classifier: EntryClassifier,
+              save_as_json=False, ignore_one_line=False, ndjson=False, low_memory=False,
+              pass_through: str = None):
+    """Returns the new file. (None if no entries were changed and pass_through is None.)"""
+    new_files = merge_msg_pairs(file, [(out, main_lang, sub_lang)],
+                                classifier,
+                                save_as_json=save_as_json, ignore_one_line=ignore_one_line,
+                                ndjson=ndjson, low_memory=low_memory, pass_through=pass_through)
+    return new_files[0] if new_files else None
+
+
+MSG_PATTERNS = [".msg.*"]
+
+
+def list_msg_files(directory, out, exclude: list[str] = None):
+    """Get (file, out) pairs in the same order as merge_dir processes them."""
+    return list(walk_files(directory, out, include=MSG_PATTERNS, exclude=exclude))
+
+
+# Arguments for merge_msg_pairs. They are sent to each worker process only once.
+_worker_args = None
+
+
+def init_worker(args, kwargs, merge_cache_size):
+    global _worker_args
+    _worker_args = (args, kwargs)
+    set_merge_cache_size(merge_cache_size)
+
+
+def merge_msg_task(task):
+    """Run merge_msg_pairs in a worker process.
+
+    Args:
+        task: (file, targets) or (file, targets, data) for the pipeline mode.
+            In the pipeline mode, it merges the data and returns outputs instead of writing them.
+            data can be None to read the file in the worker. (e.g. for .pak outputs)
+
+    Returns:
+        dict: result for the file
+            - file: path to the .msg file
+            - log: captured console output
+            - new_files: output files
+            - outputs: (new_file, data) for write_outputs (only when task has data)
+            - error: traceback string, or None when succeeded
+            - cache_counts: (hits, misses) of cached_merge_text for this task
+            - new_flags: classifier results for new entry names (see EntryClassifier.pop_new_flags)
+            - stats: stats from merge_msg_pairs
+    """
+    file, targets = task[:2]
+    data, outputs = None, None
+    if len(task) > 2:
+        data, outputs = task[2], []
+    args, kwargs = _worker_args
+    log = io.StringIO()
+    new_files = None
+    error = None
+    stats = {}
+    hits, misses = get_merge_cache_counts()
+    try:
+        with contextlib.redirect_stdout(log):
+            new_files = merge_msg_pairs(file, targets, *args, **kwargs, stats=stats,
+                                        data=data, outputs=outputs)
+    except Exception:
+        error = traceback.format_exc()
+    new_hits, new_misses = get_merge_cache_counts()
+    classifier: EntryClassifier = args[0]
+    return {
+        "file": file,
+        "log": log.getvalue(),
+        "new_files": new_files,
+        "outputs": outputs,
+        "error": error,
+        "cache_counts": (new_hits - hits, new_misses - misses),
+        "new_flags": classifier.pop_new_flags(),
+        "stats": stats
+    }
+
+
+# Max number of files in each stage of the pipeline mode for each worker.
+PIPELINE_DEPTH = 4
+# Seconds to wait for the writer thread before checking if it's still running.
+WRITER_POLL_INTERVAL = 0.1
+
+
+def merge_pipeline(items, get_file_targets, args, kwargs, jobs=1,
+                   manifest: BuildManifest = None, profile: list[dict] = None,
+                   paks: dict[str, PakWriter] = None):
+    """Merge files with overlapped reading, merging, and writing.
+
+    Notes:
+        A reader thread loads file bytes (prefetch_files), worker processes merge them,
+        and a writer thread writes the outputs.
+        Stages are connected with bounded queues. So, only jobs * PIPELINE_DEPTH files
+        are kept in memory for each stage.
+        Messages of the writer thread are sent to the main thread and printed there.
+        Errors of each file are recorded in failed. When the writer thread stops unexpectedly,
+        RuntimeError is raised instead of waiting for it forever.
+
+    Args:
+        items: iterable of (file, rel_out, data). (e.g. prefetch_files with depth=jobs * PIPELINE_DEPTH)
+        get_file_targets: function to get targets for rel_out
+        paks: see write_outputs.
+
+    Returns:
+        (failed, hits, misses): failed files and cache counts
+    """
+    classifier: EntryClassifier = args[0]
+    depth = jobs * PIPELINE_DEPTH
+    write_queue = queue.Queue(maxsize=depth)
+    # Console output of the writer thread for each file. It's printed by the main thread.
+    write_logs = queue.Queue()
+    writer_errors = []
+    end = object()
+    failed = []
+    hits, misses = 0, 0
+
+    def write_result(result):
+        file = result["file"]
+        log = io.StringIO()
+        start = time.perf_counter()
+        try:
+            write_outputs(result["outputs"], pass_through=kwargs.get("pass_through"), paks=paks,
+                          log=functools.partial(print, file=log))
+            if manifest is not None:
+                manifest.update(file, result["new_files"])
+            if profile is not None:
+                result["stats"]["export"] += time.perf_counter() - start
+                profile.append(result["stats"])
+        except Exception:
+            error = traceback.format_exc()
+            print(f"Failed to write outputs of {file}.\n{error}", end="", file=log)
+            failed.append((file, error))
+        write_logs.put(log.getvalue())
+
+    def write_results():
+        try:
+            while True:
+                result = write_queue.get()
+                if result is end:
+                    return
+                write_result(result)
+        except BaseException as e:
+            writer_errors.append(e)
+
+    def print_write_logs():
+        while True:
+            try:
+                print(write_logs.get_nowait(), end="")
+            except queue.Empty:
+                return
+
+    def put_result(item):
+        while True:
+            try:
+                write_queue.put(item, timeout=WRITER_POLL_INTERVAL)
+                return
+            except queue.Full:
+                if not writer.is_alive():
+                    raise RuntimeError("The writer thread stopped unexpectedly.") from (
+                        writer_errors[0] if len(writer_errors) > 0 else None)
+
+    def handle_result(result):
+        nonlocal hits, misses
+        print_write_logs()
+        print(result["log"], end="")
+        hits += result["cache_counts"][0]
+        misses += result["cache_counts"][1]
+        classifier.add_flags(result["new_flags"])
+        if result["error"] is not None:
+            print(f"Failed to process {result['file']}.\n{result['error']}", end="")
+            failed.append((result["file"], result["error"]))
+            return
+        put_result(result)
+
+    writer = threading.Thread(target=write_results)
+    writer.start()
+    try:
+        merge_cache_size = cached_merge_text.cache_parameters()["maxsize"]
+        with ProcessPoolExecutor(max_workers=jobs,
+                                 initializer=init_worker,
+                                 initargs=(args, kwargs, merge_cache_size)) as executor:
+            # Results are handled in submission order. So, logs are printed in order.
+            running = collections.deque()
+            for file, rel_out, data in items:
+                running.append(executor.submit(merge_msg_task, (file, get_file_targets(rel_out), data)))
+                if len(running) >= depth:
+                    handle_result(running.popleft().result())
+            while len(running) > 0:
+                handle_result(running.popleft().result())
+    finally:
+        if writer.is_alive():
+            with contextlib.suppress(RuntimeError):
+                put_result(end)
+        writer.join()
+        print_write_logs()
+    if len(writer_errors) > 0:
+        raise RuntimeError("The writer thread stopped unexpectedly.") from writer_errors[0]
+    return failed, hits, misses
+
+
+def merge_dir_pairs(directory, targets: list[tuple[str, int, int]],
+                    classifier: EntryClassifier,
+                    save_as_json=False, ignore_one_line=False, jobs=1,
+                    manifest: BuildManifest = None, profile: list[dict] = None,
+                    ndjson=False, exclude: list[str] = None, prefetch=False, pipeline=False,
+                    low_memory=False, pass_through: str = None, paks: dict[str, PakWriter] = None,
+                    trace_memory=True):
+    """Merge all .msg files in a directory for each language pair.
+
+    Notes:
+        Files recorded as up to date in the manifest will be skipped.
+        Hit rate of the merge_text cache will be printed at the end.
+
+    Args:
+        targets: list of (out, main_lang, sub_lang)
+        profile: list to store stats of processed files. See merge_msg_pairs for the details.
+        exclude: patterns of file and folder names to skip. See source_walker.py for the details.
+        prefetch: read the next files on a background thread. (only for jobs=1)
+        pipeline: overlap reading, merging, and writing. See merge_pipeline for the details.
+        low_memory: process entries one by one. See merge_msg_stream for the details.
+        trace_memory: measure peak memory for each file in the low memory mode. See merge_msg_stream.
+        pass_through: "copy" or "hardlink" for files with no changes. See skip_unchanged for the details.
+        paks: output folder -> PakWriter to add outputs to .pak files instead of writing them.
+            Outputs are added in the same order as files are processed.
+
+    Returns:
+        list of (file, error) for failed files. It's always empty when jobs=1
+            because errors are raised immediately.
+    """
+    def iter_sources():
+        """Yield (file, rel_out) for files that are not up to date."""
+        nonlocal skipped
+        for file, rel_out in walk_files(directory, "", include=MSG_PATTERNS, exclude=exclude):
+            if manifest is not None and manifest.is_up_to_date(file):
+                skipped += 1
+                continue
+            yield file, rel_out
+
+    def iter_prefetched(depth: int):
+        """Same as iter_sources but yields (file, rel_out, data).
+        Files are read on a background thread, and checked with the manifest on this thread
+        by the bytes already read. So, each file is read only once.
+        """
+        nonlocal skipped
+        sources = walk_files(directory, "", include=MSG_PATTERNS, exclude=exclude)
+        for file, rel_out, data in prefetch_files(sources, depth=depth):
+            if manifest is not None and manifest.is_up_to_date(file, data=data):
+                skipped += 1
+                continue
+            yield file, rel_out, data
+
+    def get_file_targets(rel_out):
+        return [(os.path.join(out, rel_out), main_lang, sub_lang)
+                for out, main_lang, sub_lang in targets]
+
+    def print_skipped():
+        if skipped > 0:
+            print(f"Skipped {skipped} up-to-date file(s).")
+
+    skipped = 0
+    args = (classifier, )
+    kwargs = {"save_as_json": save_as_json, "ignore_one_line": ignore_one_line, "ndjson": ndjson,
+              "low_memory": low_memory, "pass_through": pass_through, "trace_memory": trace_memory}
+    if pipeline:
+        items = iter_prefetched(jobs * PIPELINE_DEPTH)
+        failed, hits, misses = merge_pipeline(items, get_file_targets, args, kwargs, jobs=jobs,
+                                              manifest=manifest, profile=profile, paks=paks)
+        print_skipped()
+        print_merge_cache_stats(hits, misses)
+        return failed
+    sources = None
+    if jobs > 1:
+        # The pool needs the number of files for the chunk size.
+        sources = list(iter_sources())
+    if jobs <= 1 or len(sources) <= 1:
+        hits, misses = get_merge_cache_counts()
+        if sources is not None:
+            items = ((file, rel_out, None) for file, rel_out in sources)
+        elif prefetch:
+            items = iter_prefetched(PREFETCH_DEPTH)
+        else:
+            items = ((file, rel_out, None) for file, rel_out in iter_sources())
+        for file, rel_out, data in items:
+            stats = {}
+            outputs = None if paks is None else []
+            new_files = merge_msg_pairs(file, get_file_targets(rel_out), *args, **kwargs,
+                                        stats=stats, data=data, outputs=outputs)
+            if outputs is not None:
+                write_outputs(outputs, pass_through=pass_through, paks=paks)
+            if manifest is not None:
+                manifest.update(file, new_files)
+            if profile is not None:
+                profile.append(stats)
+        print_skipped()
+        new_hits, new_misses = get_merge_cache_counts()
+        print_merge_cache_stats(new_hits - hits, new_misses - misses)
+        return []
+
+    # (file, targets for the file)
+    tasks = [(file, get_file_targets(rel_out)) for file, rel_out in sources]
+    if paks is not None:
+        # Workers return outputs instead of writing them.
+        tasks = [(file, file_targets, None) for file, file_targets in tasks]
+    print_skipped()
+    failed = []
+    hits, misses = 0, 0
+    chunksize = max(1, min(16, len(tasks) // (jobs * 4)))
+    merge_cache_size = cached_merge_text.cache_parameters()["maxsize"]
+    with ProcessPoolExecutor(max_workers=jobs,
+                             initializer=init_worker,
+                             initargs=(args, kwargs, merge_cache_size)) as executor:
+        # map() yields results in submission order. So, logs are printed in order.
+        for result in executor.map(merge_msg_task, tasks, chunksize=chunksize):
+            file = result["file"]
+            print(result["log"], end="")
+            hits += result["cache_counts"][0]
+            misses += result["cache_counts"][1]
+            classifier.add_flags(result["new_flags"])
+            if result["error"] is not None:
+                print(f"Failed to process {file}.\n{result['error']}", end="")
+                failed.append((file, result["error"]))
+                continue
+            if paks is not None:
+                write_outputs(result["outputs"], pass_through=pass_through, paks=paks)
+            if manifest is not None:
+                manifest.update(file, result["new_files"])
+            if profile is not None:
+                profile.append(result["stats"])
+    print_merge_cache_stats(hits, misses)
+    return failed
 
 
 def merge_dir(directory, out, main_lang: int, sub_lang: int,
-              ignore_entries, one_line_entries,
-              three_lines_entries,
-              save_as_json=False, ignore_one_line=False):
-    out = os.path.join(out, os.path.basename(directory))
-    for base in sorted(os.listdir(directory)):
-        file = os.path.join(directory, base)
-        if os.path.isfile(file):
-            if is_msg(file):
-                merge_msg(file, out, main_lang, sub_lang,
-                          ignore_entries, one_line_entries,
-                          three_lines_entries,
-                          save_as_json=save_as_json, ignore_one_line=ignore_one_line)
+              classifier: EntryClassifier,
+              save_as_json=False, ignore_one_line=False, jobs=1,
+              manifest: BuildManifest = None, profile: list[dict] = None,
+              ndjson=False, exclude: list[str] = None, prefetch=False, pipeline=False,
+              low_memory=False, pass_through: str = None, pak: PakWriter = None, trace_memory=True):
+    """Merge all .msg files in a directory. See merge_dir_pairs for the details."""
+    return merge_dir_pairs(directory, [(out, main_lang, sub_lang)],
+                           classifier,
+                           save_as_json=save_as_json, ignore_one_line=ignore_one_line,
+                           jobs=jobs, manifest=manifest, profile=profile, ndjson=ndjson,
+                           exclude=exclude, prefetch=prefetch, pipeline=pipeline,
+                           low_memory=low_memory, pass_through=pass_through,
+                           paks=None if pak is None else {os.path.abspath(out): pak},
+                           trace_memory=trace_memory)
+
+
+def get_settings(pairs: list[tuple[str, str]], patterns_json: dict,
+                 ignore_one_line=False, save_as_json=False, ndjson=False, pass_through: str = None) -> dict:
+    """Settings for the build manifest."""
+    return {
+        "pairs": [list(pair) for pair in pairs],
+        "patterns": hash_json(patterns_json),
+        "ignore_one_line": ignore_one_line,
+        "save_as_json": save_as_json,
+        "ndjson": ndjson,
+        "pass_through": pass_through
+    }
+
+
+def load_classifier(patterns_json: dict, class_cache_path: str = None):
+    """Make a classifier that uses a classification cache.
+
+    Returns:
+        (EntryClassifier, ClassificationCache): The cache is None when class_cache_path is None.
+    """
+    classifier = EntryClassifier.from_json(patterns_json)
+    class_cache = None
+    if class_cache_path is not None:
+        class_cache = ClassificationCache(class_cache_path, hash_json(patterns_json))
+        classifier.cache = class_cache.table
+        print(f"Classification cache: {len(classifier.cache)} known names")
+    return classifier, class_cache
+
+
+class ResidentSource:
+    """A .msg file kept in memory for the watch mode.
+
+    Notes:
+        It keeps the parsed file, flags of the entries, and merged text for each target.
+        Merged text is applied to the entries only while exporting.
+        So, entries always have the original text.
+    """
+
+    def __init__(self, file, targets: list[tuple[str, int, int]]):
+        self.file = file
+        self.targets = targets
+        self.msg: Message = None
+        self.flags_list: list[tuple[bool, bool, bool]] = []
+        self.merged: list[list[list[str]]] = []  # merged text for each target (None for unchanged entries)
+        self.new_files: list[str] = []
+
+    def load(self, classifier: EntryClassifier, ignore_one_line=False):
+        print(f"Processing {self.file}...")
+        with open(self.file, "rb") as f:
+            data = f.read()
+        msg = Message()
+        # Use bytes instead of mmap. So, the file can be replaced while watching.
+        msg.read(data)
+        self.msg = msg
+        self.flags_list = [classifier.classify(entry.name) for entry in msg.entries]
+        self.merged = [[None] * len(msg.entries) for _ in self.targets]
+        self.merge_entries(range(len(msg.entries)), classifier, ignore_one_line=ignore_one_line)
+
+    def merge_entries(self, indices, classifier: EntryClassifier, ignore_one_line=False):
+        for i in indices:
+            entry = self.msg.entries[i]
+            original_contents = entry.langs
+            for merged, (_, main_lang, sub_lang) in zip(self.merged, self.targets):
+                merge_entry(entry, main_lang, sub_lang, classifier,
+                            ignore_one_line=ignore_one_line, flags=self.flags_list[i])
+                merged[i] = None
+                if entry.changed:
+                    merged[i] = entry.langs
+                    entry.set_content(original_contents)
+
+    def reclassify(self, classifier: EntryClassifier, ignore_one_line=False) -> int:
+        """Merge entries whose flags are changed by new patterns again. Returns the number of them."""
+        flags_list = [classifier.classify(entry.name) for entry in self.msg.entries]
+        indices = [i for i, (old, new) in enumerate(zip(self.flags_list, flags_list)) if old != new]
+        self.flags_list = flags_list
+        self.merge_entries(indices, classifier, ignore_one_line=ignore_one_line)
+        return len(indices)
+
+    def export(self, save_as_json=False, ndjson=False, pass_through: str = None):
+        self.new_files = []
+        for (out, main_lang, sub_lang), merged in zip(self.targets, self.merged):
+            changed = [(entry, contents) for entry, contents in zip(self.msg.entries, merged)
+                       if contents is not None]
+            if len(changed) == 0:
+                passed_file = skip_unchanged(self.file, out, main_lang, sub_lang,
+                                             save_as_json=save_as_json, ndjson=ndjson,
+                                             pass_through=pass_through)
+                if passed_file is not None:
+                    self.new_files.append(passed_file)
+                continue
+            original_contents = [entry.langs for entry, _ in changed]
+            try:
+                for entry, contents in changed:
+                    entry.set_content(contents)
+                new_file, _ = export_msg(self.msg, self.file, out, save_as_json=save_as_json, ndjson=ndjson)
+                self.new_files.append(new_file)
+            finally:
+                for (entry, _), contents in zip(changed, original_contents):
+                    entry.set_content(contents)
+
+    def remove_outputs(self):
+        for new_file in self.new_files:
+            remove_stale_output(new_file, file=self.file)
+
+
+WATCH_INTERVAL = 0.5
+
+
+def get_mtime(file) -> int:
+    try:
+        return os.stat(file).st_mtime_ns
+    except OSError:
+        return None
+
+
+def watch(source, out, pairs: list[tuple[str, str]], targets: list[tuple[str, int, int]],
+          patterns_path: str, save_as_json=False, ignore_one_line=False, ndjson=False,
+          exclude: list[str] = None, class_cache_path: str = None, rebuild=False,
+          interval: float = WATCH_INTERVAL, pass_through: str = None):
+    """Keep sources in memory and rebuild outputs when sources or the patterns file change.
+
+    Notes:
+        Changes are detected by polling mtimes and sizes.
+        When a source file changes, only the file is parsed and merged again.
+        When the patterns file changes, only entries whose flags are changed are merged again,
+        and only files that have such entries are exported.
+        It runs until Ctrl+C is pressed.
+
+    Args:
+        targets: list of (out, main_lang, sub_lang)
+        rebuild: see BuildManifest.
+    """
+    patterns_json = read_json(patterns_path)
+    patterns_mtime = get_mtime(patterns_path)
+    classifier, class_cache = load_classifier(patterns_json, class_cache_path)
+    manifest = BuildManifest(out, get_settings(pairs, patterns_json, ignore_one_line=ignore_one_line,
+                                               save_as_json=save_as_json, ndjson=ndjson,
+                                               pass_through=pass_through),
+                             rebuild=rebuild)
+    sources: dict[str, ResidentSource] = {}
+    snapshot = {}
+    first = True
+    try:
+        while True:
+            start = time.perf_counter()
+            updated = []
+
+            new_mtime = get_mtime(patterns_path)
+            patterns_changed = new_mtime != patterns_mtime
+            if patterns_changed:
+                patterns_mtime = new_mtime
+                try:
+                    # Don't use read_json. It returns {} for broken files (e.g. while editing).
+                    patterns_json = load_json(patterns_path)
+                except (OSError, ValueError) as e:
+                    print(f"Failed to load {patterns_path}. ({e})")
+                else:
+                    print(f"{patterns_path} was changed.")
+                    classifier, class_cache = load_classifier(patterns_json, class_cache_path)
+                    for file, resident in sources.items():
+                        count = resident.reclassify(classifier, ignore_one_line=ignore_one_line)
+                        if count > 0:
+                            print(f"{file}: {count} entries were reclassified.")
+                            resident.export(save_as_json=save_as_json, ndjson=ndjson, pass_through=pass_through)
+                            updated.append(resident)
+                    if manifest is not None:
+                        manifest.settings_hash = hash_json(get_settings(
+                            pairs, patterns_json, ignore_one_line=ignore_one_line,
+                            save_as_json=save_as_json, ndjson=ndjson, pass_through=pass_through))
+                        for resident in sources.values():
+                            manifest.refresh(resident.file, resident.new_files)
+
+            new_snapshot = snapshot_files(source, "", include=MSG_PATTERNS, exclude=exclude)
+            changed, removed = diff_snapshots(snapshot, new_snapshot)
+            snapshot = new_snapshot
+            for file in changed:
+                rel_out = snapshot[file][0]
+                resident = ResidentSource(file, [(os.path.join(target_out, rel_out), main_lang, sub_lang)
+                                                 for target_out, main_lang, sub_lang in targets])
+                try:
+                    resident.load(classifier, ignore_one_line=ignore_one_line)
+                    resident.export(save_as_json=save_as_json, ndjson=ndjson, pass_through=pass_through)
+                except Exception:
+                    # e.g. the file is still being written. It'll be loaded when it changes again.
+                    print(f"Failed to process {file}.\n{traceback.format_exc()}", end="")
+                    sources.pop(file, None)
+                    continue
+                sources[file] = resident
+                updated.append(resident)
+            for file in removed:
+                print(f"{file} was removed.")
+                resident = sources.pop(file, None)
+                if resident is not None:
+                    resident.remove_outputs()
+                if manifest is not None:
+                    manifest.files.pop(BuildManifest.get_key(file), None)
+
+            if len(updated) > 0 or len(removed) > 0 or patterns_changed:
+                if manifest is not None:
+                    for resident in updated:
+                        manifest.update(resident.file, resident.new_files)
+                    manifest.save()
+                if class_cache is not None and len(classifier.pop_new_flags()) > 0:
+                    class_cache.save()
+                print(f"Updated {len(updated)} file(s) in {time.perf_counter() - start:.3f}s.")
+            if first:
+                print(f"Watching {source} and {patterns_path}... (Press Ctrl+C to stop.)")
+                first = False
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+
+def close_paks(paks: dict[str, PakWriter]):
+    for pak in paks.values():
+        if pak.close():
+            print(f"Saved {len(pak.entries)} file(s) to {pak.file}")
         else:
-            merge_dir(file, out, main_lang, sub_lang,
-                      ignore_entries, one_line_entries,
-                      three_lines_entries,
-                      save_as_json=save_as_json, ignore_one_line=ignore_one_line)
+            print(f"{pak.file} is up to date.")
+
+
+def print_failed(failed):
+    if len(failed) == 0:
+        return
+    print(f"{len(failed)} file(s) failed.")
+    for file, _ in failed:
+        print(f"  {file}")
+    raise RuntimeError(f"Failed to process {len(failed)} file(s).")
 
 
 if __name__ == "__main__":
     args = get_args()
 
-    main_lang: int = SHORT_LANG_TO_INT[args.main_lang]
-    sub_lang: int = SHORT_LANG_TO_INT[args.sub_lang]
+    if len(args.pairs) == 0:
+        pairs = [(args.main_lang, args.sub_lang)]
+        targets = [(args.out, SHORT_LANG_TO_INT[args.main_lang], SHORT_LANG_TO_INT[args.sub_lang])]
+    else:
+        # Each pair has its own output root.
+        pairs = args.pairs
+        targets = [(os.path.join(args.out, f"{main}_{sub}"), SHORT_LANG_TO_INT[main], SHORT_LANG_TO_INT[sub])
+                   for main, sub in pairs]
 
-    patterns_json: dict = read_json(args.patterns_json)
-    ignore_entries: list[str] = patterns_json.get("ignore_entries", [])
-    one_line_entries: list[str] = patterns_json.get("one_line_entries", [])
-    three_lines_entries: list[str] = patterns_json.get("three_lines_entries", [])
+    set_merge_cache_size(args.merge_cache_size)
+    class_cache_path = None
+    if not args.no_class_cache:
+        class_cache_path = args.class_cache
+        if class_cache_path is None:
+            class_cache_path = os.path.join(args.out, ClassificationCache.FILE_NAME)
 
     save_as_json: bool = args.save_as_json
+    ndjson: bool = args.ndjson
     ignore_one_line: bool = args.ignore_one_line
 
-    if os.path.isfile(args.source):
-        merge_msg(args.source, args.out, main_lang, sub_lang,
-                  ignore_entries, one_line_entries,
-                  three_lines_entries,
-                  save_as_json=save_as_json, ignore_one_line=ignore_one_line)
-    elif os.path.isdir(args.source):
-        merge_dir(args.source, args.out, main_lang, sub_lang,
-                  ignore_entries, one_line_entries,
-                  three_lines_entries,
-                  save_as_json=save_as_json, ignore_one_line=ignore_one_line)
+    if args.watch:
+        watch(args.source, args.out, pairs, targets, args.patterns_json,
+              save_as_json=save_as_json, ignore_one_line=ignore_one_line, ndjson=ndjson,
+              exclude=args.exclude, class_cache_path=class_cache_path, rebuild=args.rebuild,
+              interval=args.watch_interval, pass_through=args.pass_through)
+        sys.exit(0)
+
+    patterns_json: dict = read_json(args.patterns_json)
+    classifier, class_cache = load_classifier(patterns_json, class_cache_path)
+
+    settings = get_settings(pairs, patterns_json, ignore_one_line=ignore_one_line,
+                            save_as_json=save_as_json, ndjson=ndjson, pass_through=args.pass_through)
+    manifest = BuildManifest(args.out, settings, rebuild=args.rebuild)
+
+    paks = None
+    if args.pak is not None:
+        paks = {os.path.abspath(out): PakWriter(os.path.join(out, args.pak),
+                                                compress=args.pak_compress, jobs=args.jobs)
+                for out, _, _ in targets}
+
+    profile = None if args.profile_report is None else []
+    failed = []
+    start = time.perf_counter()
+    try:
+        if os.path.isfile(args.source):
+            if manifest is None or not manifest.is_up_to_date(args.source):
+                stats = {}
+                outputs = None if paks is None else []
+                new_files = merge_msg_pairs(args.source, targets,
+                                            classifier,
+                                            save_as_json=save_as_json, ignore_one_line=ignore_one_line,
+                                            stats=stats, ndjson=ndjson, low_memory=args.low_memory,
+                                            outputs=outputs, pass_through=args.pass_through)
+                if outputs is not None:
+                    write_outputs(outputs, pass_through=args.pass_through, paks=paks)
+                if manifest is not None:
+                    manifest.update(args.source, new_files)
+                if profile is not None:
+                    profile.append(stats)
+                print_merge_cache_stats(*get_merge_cache_counts())
+            else:
+                print(f"{args.source} is up to date.")
+        elif os.path.isdir(args.source):
+            failed = merge_dir_pairs(args.source, targets,
+                                     classifier,
+                                     save_as_json=save_as_json, ignore_one_line=ignore_one_line,
+                                     jobs=args.jobs, manifest=manifest, profile=profile, ndjson=ndjson,
+                                     exclude=args.exclude, prefetch=args.prefetch,
+                                     pipeline=args.pipeline, low_memory=args.low_memory,
+                                     pass_through=args.pass_through, paks=paks)
+        if paks is not None and len(failed) == 0:
+            close_paks(paks)
+    finally:
+        if paks is not None:
+            for pak in paks.values():
+                pak.abort()
+        if manifest is not None:
+            manifest.save()
+        if class_cache is not None and len(classifier.pop_new_flags()) > 0:
+            class_cache.save()
+        if profile is not None:
+            report = save_report(profile, args.profile_report,
+                                 wall_time=time.perf_counter() - start,
+                                 slowest=args.profile_slowest)
+            print_summary(report)
+            print(f"Saved profile report to {args.profile_report}")
+    print_failed(failed)
@@ -0,0 +1,212 @@
+"""MurmurHash3 (x86, 32-bit) without the mmh3 module.
+
+Notes:
+    RE Engine uses murmur3 with seed 0xFFFFFFFF for path hashes in .pak files
+    and for entry name hashes in .msg files. Strings are hashed as UTF-16LE.
+    Paths are hashed twice. (lower case and upper case)
+
+    # Sample codes
+    from murmur3 import murmur3_32, hash_path
+    murmur3_32(b"hello", 0)  # 0x248bfa47
+    lower, upper = hash_path("natives/STM/Message/foo.msg.22")
+
+    # Batches
+    murmur3_32_many and hash_wstrs hash many strings at once.
+    Each string has a 64-bit lane in big integers, and all strings are processed by a few big integer operations
+    for each 4-byte block. It's several times faster than hashing strings one by one in pure Python.
+    hash_wstrs also caches hashes of strings. (e.g. entry names of files that are parsed again)
+
+    # mmh3 compatibility
+    hash(key, seed, signed) works like mmh3.hash. remove_dependencies.py uses it for REMSG_Converter.
+"""
+
+import struct
+
+SEED = 0xFFFFFFFF
+MASK = 0xFFFFFFFF
+C1 = 0xcc9e2d51
+C2 = 0x1b873593
+
+
+def murmur3_32(data: bytes, seed: int = 0) -> int:
+    h = seed & MASK
+    length = len(data)
+    nblocks = length // 4
+    for (k, ) in struct.iter_unpack("<I", data[:nblocks * 4]):
+        k = (k * C1) & MASK
+        k = ((k << 15) | (k >> 17)) & MASK
+        k = (k * C2) & MASK
+        h ^= k
+        h = ((h << 13) | (h >> 19)) & MASK
+        h = (h * 5 + 0xe6546b64) & MASK
+
+    tail = data[nblocks * 4:]
+    if len(tail) > 0:
+        k = int.from_bytes(tail, "little")
+        k = (k * C1) & MASK
+        k = ((k << 15) | (k >> 17)) & MASK
+        k = (k * C2) & MASK
+        h ^= k
+
+    h ^= length
+    h ^= h >> 16
+    h = (h * 0x85ebca6b) & MASK
+    h ^= h >> 13
+    h = (h * 0xc2b2ae35) & MASK
+    h ^= h >> 16
+    return h
+
+
+# 64-bit lane with 1 in it
+LANE_ONE = b"\x01" + b"\x00" * 7
+# Number of strings to hash at once in murmur3_32_many
+BATCH_SIZE = 4096
+# Smaller batches are hashed one by one.
+BATCH_MIN = 8
+
+
+def murmur3_32_lanes(buffers: list[bytes], seed: int = 0) -> list[int]:
+    """Hash buffers at once. Each buffer has a 64-bit lane in big integers.
+
+    Notes:
+        A lane has a 32-bit value. Products of two 32-bit values fit in a lane,
+        so multiplications and shifts don't break other lanes when the results are masked.
+        Buffers are sorted by length. So, lanes that have blocks at each position are always the lowest ones.
+    """
+    count = len(buffers)
+    order = sorted(range(count), key=lambda i: len(buffers[i]), reverse=True)
+    lengths = [len(buffers[i]) for i in order]
+    row = lengths[0] // 4 * 4
+    matrix = b"".join(buffers[i][:length // 4 * 4].ljust(row, b"\x00") for i, length in zip(order, lengths))
+    ones = int.from_bytes(LANE_ONE * count, "little")
+    lane_mask = ones * MASK
+    h = ones * (seed & MASK)
+
+    active = count
+    for j in range(row // 4):
+        while lengths[active - 1] // 4 <= j:
+            active -= 1
+        bits = active * 64
+        mask = (1 << bits) - 1
+        lanes = lane_mask & mask
+        # j-th block of the active buffers
+        column = bytearray(active * 8)
+        start = j * 4
+        for i in range(4):
+            column[i::8] = matrix[start + i:(active - 1) * row + start + i + 1:row]
+        k = int.from_bytes(column, "little")
+        k = (k * C1) & lanes
+        k = ((k << 15) | (k >> 17)) & lanes
+        k = (k * C2) & lanes
+        low = (h & mask) ^ k
+        low = ((low << 13) | (low >> 19)) & lanes
+        low = (low * 5 + (ones & mask) * 0xe6546b64) & lanes
+        h = (h >> bits << bits) | low
+
+    # Tails are 0 for buffers without tails. They don't change h.
+    tails = b"".join(buffers[i][length // 4 * 4:].ljust(8, b"\x00") for i, length in zip(order, lengths))
+    k = int.from_bytes(tails, "little")
+    k = (k * C1) & lane_mask
+    k = ((k << 15) | (k >> 17)) & lane_mask
+    k = (k * C2) & lane_mask
+    h ^= k
+
+    h ^= int.from_bytes(struct.pack(f"<{count}Q", *lengths), "little")
+    h ^= (h >> 16) & lane_mask
+    h = (h * 0x85ebca6b) & lane_mask
+    h ^= (h >> 13) & lane_mask
+    h = (h * 0xc2b2ae35) & lane_mask
+    h ^= (h >> 16) & lane_mask
+
+    hashes = [0] * count
+    for i, value in zip(order, struct.unpack(f"<{count}Q", h.to_bytes(count * 8, "little"))):
+        hashes[i] = value
+    return hashes
+
+
+def murmur3_32_many(buffers: list[bytes], seed: int = 0) -> list[int]:
+    """Same as [murmur3_32(buffer, seed) for buffer in buffers] but much faster for many buffers.
+
+    Notes:
+        Buffers are hashed in batches of similar lengths.
+        A batch is split when lengths get shorter than half of the longest one,
+        so short buffers are not padded to the length of long ones.
+    """
+    count = len(buffers)
+    if count < BATCH_MIN:
+        return [murmur3_32(buffer, seed) for buffer in buffers]
+    order = sorted(range(count), key=lambda i: len(buffers[i]), reverse=True)
+    hashes = [0] * count
+    start = 0
+    while start < count:
+        end = start + 1
+        min_length = len(buffers[order[start]]) // 2
+        while end < count and end - start < BATCH_SIZE and len(buffers[order[end]]) >= min_length:
+            end += 1
+        batch = order[start:end]
+        if len(batch) < BATCH_MIN:
+            batch_hashes = [murmur3_32(buffers[i], seed) for i in batch]
+        else:
+            batch_hashes = murmur3_32_lanes([buffers[i] for i in batch], seed)
+        for i, value in zip(batch, batch_hashes):
+            hashes[i] = value
+        start = end
+    return hashes
+
+
+# Hashes of strings that are already hashed. It's cleared when it gets larger than HASH_CACHE_SIZE.
+HASH_CACHE_SIZE = 1 << 18
+_hash_cache: dict[str, int] = {}
+
+
+def hash_wstrs(strings: list[str]) -> list[int]:
+    """Hash strings as UTF-16LE with the seed for RE Engine.
+    Strings that are not cached are hashed in one batch.
+    """
+    cache = _hash_cache
+    if len(cache) >= HASH_CACHE_SIZE:
+        cache.clear()
+    new_strings = list(dict.fromkeys(string for string in strings if string not in cache))
+    if len(new_strings) > 0:
+        buffers = [string.encode("utf-16-le") for string in new_strings]
+        cache.update(zip(new_strings, murmur3_32_many(buffers, SEED)))
+    return [cache[string] for string in strings]
+
+
+def hash_wstr(string: str) -> int:
+    """Hash a string as UTF-16LE with the seed for RE Engine."""
+    value = _hash_cache.get(string)
+    if value is None:
+        value = murmur3_32(string.encode("utf-16-le"), SEED)
+        if len(_hash_cache) < HASH_CACHE_SIZE:
+            _hash_cache[string] = value
+    return value
+
+
+def normalize_path(path: str) -> str:
+    """Use "/" as separators and remove the leading "/"."""
+    return path.replace("\\", "/").lstrip("/")
+
+
+def hash_path(path: str) -> tuple[int, int]:
+    """Get (lower case hash, upper case hash) of a path in .pak files."""
+    path = normalize_path(path)
+    return hash_wstr(path.lower()), hash_wstr(path.upper())
+
+
+def hash_paths(paths: list[str]) -> list[tuple[int, int]]:
+    """Same as [hash_path(path) for path in paths] but hashes paths in batches."""
+    paths = [normalize_path(path) for path in paths]
+    lower = murmur3_32_many([path.lower().encode("utf-16-le") for path in paths], SEED)
+    upper = murmur3_32_many([path.upper().encode("utf-16-le") for path in paths], SEED)
+    return list(zip(lower, upper))
+
+
+def hash(key, seed: int = 0, signed=True) -> int:
+    """Same as mmh3.hash. str keys are encoded as UTF-8."""
+    if isinstance(key, str):
+        key = key.encode("utf-8")
+    value = murmur3_32(key, seed)
+    if signed and value & 0x80000000:
+        value -= 1 << 32
+    return value
@@ -0,0 +1,115 @@
+"""Profile report for make_dualsub runs.
+
+Notes:
+    It makes a json report from stats of merge_msg_pairs.
+    The report has records for each file, totals for each stage,
+    histograms of seconds and file sizes, and the slowest files.
+
+    # Sample codes
+    from profile_report import save_report
+    profile = []
+    merge_dir(..., profile=profile)
+    save_report(profile, "profile.json", wall_time=wall_time)
+"""
+
+import bisect
+from io_util import save_json
+
+STAGES = ["import", "classify", "merge", "export"]
+
+# Upper bounds for histogram buckets
+TIME_BOUNDS = [0.001, 0.01, 0.1, 1.0, 10.0]
+SIZE_BOUNDS = [1 << 10, 10 << 10, 100 << 10, 1 << 20, 10 << 20]
+
+
+def format_time(sec: float) -> str:
+    if sec < 1:
+        return f"{sec * 1000:g}ms"
+    return f"{sec:g}s"
+
+
+def format_size(size: int) -> str:
+    for unit in ["B", "KiB", "MiB"]:
+        if size < 1024:
+            return f"{size:g}{unit}"
+        size /= 1024
+    return f"{size:g}GiB"
+
+
+def make_histogram(values: list, bounds: list, format_bound) -> dict[str, int]:
+    """Count values for each bucket. (e.g. {"<1ms": 3, "<10ms": 5, ..., ">=10s": 0})"""
+    counts = [0] * (len(bounds) + 1)
+    for val in values:
+        counts[bisect.bisect_right(bounds, val)] += 1
+    labels = [f"<{format_bound(bound)}" for bound in bounds] + [f">={format_bound(bounds[-1])}"]
+    return dict(zip(labels, counts))
+
+
+def get_total_time(stats: dict) -> float:
+    return sum(stats[stage] for stage in STAGES)
+
+
+def make_report(profile: list[dict], wall_time: float = None, slowest: int = 20) -> dict:
+    """Make a report from a list of stats. See merge_msg_pairs for the stats."""
+    files = []
+    for stats in profile:
+        record = dict(stats)
+        record["total"] = get_total_time(stats)
+        files.append(record)
+
+    totals = {stage: sum(record[stage] for record in files) for stage in STAGES}
+    totals["total"] = sum(totals[stage] for stage in STAGES)
+    entries = sum(record["entries"] for record in files)
+    in_bytes = sum(record["in_bytes"] for record in files)
+    summary = {
+        "files": len(files),
+        "entries": entries,
+        "in_bytes": in_bytes,
+        "out_bytes": sum(record["out_bytes"] for record in files),
+        "changed_entries": sum(sum(record.get("changed_entries", [])) for record in files),
+        "seconds": totals,
+    }
+    peak_memory = [record["peak_memory"] for record in files if "peak_memory" in record]
+    if len(peak_memory) > 0:
+        summary["peak_memory"] = max(peak_memory)
+    if wall_time is not None:
+        summary["wall_time"] = wall_time
+        if wall_time > 0:
+            summary["entries_per_sec"] = entries / wall_time
+            summary["mb_per_sec"] = in_bytes / (1 << 20) / wall_time
+
+    histograms = {
+        stage: make_histogram([record[stage] for record in files], TIME_BOUNDS, format_time)
+        for stage in STAGES + ["total"]
+    }
+    histograms["in_bytes"] = make_histogram([record["in_bytes"] for record in files],
+                                            SIZE_BOUNDS, format_size)
+    if len(peak_memory) > 0:
+        histograms["peak_memory"] = make_histogram(peak_memory, SIZE_BOUNDS, format_size)
+
+    slowest_files = sorted(files, key=lambda record: record["total"], reverse=True)[:slowest]
+    return {
+        "summary": summary,
+        "histograms": histograms,
+        "slowest": slowest_files,
+        "files": files
+    }
+
+
+def print_summary(report: dict):
+    summary = report["summary"]
+    seconds = summary["seconds"]
+    print(f"Profiled {summary['files']} file(s), {summary['entries']} entries.")
+    for stage in STAGES:
+        rate = seconds[stage] / seconds["total"] * 100 if seconds["total"] > 0 else 0
+        print(f"  {stage}: {seconds[stage]:.3f}s ({rate:.1f}%)")
+    if "peak_memory" in summary:
+        print(f"  peak memory: {format_size(summary['peak_memory'])}")
+    for record in report["slowest"][:5]:
+        print(f"  {record['total']:.3f}s: {record['file']}")
+
+
+def save_report(profile: list[dict], file: str, wall_time: float = None, slowest: int = 20):
+    report = make_report(profile, wall_time=wall_time, slowest=slowest)
+    save_json(report, file)
+    return report
@@ -1,4 +1,7 @@
-"""Remove mmh3 and chardet from REMSG_Converter."""
+"""Remove mmh3 and chardet from REMSG_Converter.
+
+mmh3 is replaced with murmur3.py. So, hashes of entry names are still verified.
+"""
 import os
 import shutil
 
@@ -36,7 +39,7 @@ def copy_file(file, src_dir="REMSG_Converter", new_dir="src"):
     mkdir(new_dir)
     shutil.copy(orig_path, new_dir)
 
-def edit_file(file, removable_functions, removable_lines, pass_lines,
+def edit_file(file, removable_functions, removable_lines, pass_lines, replace_lines=None,
                 src_dir="REMSG_Converter", new_dir="src"):
     orig_path = os.path.join(src_dir, file)
     mkdir(new_dir)
@@ -58,6 +61,9 @@ def edit_file(file, removable_functions, removable_lines, pass_lines,
         if skip:
             continue
 
+        if replace_lines is not None and line.rstrip("\n") in replace_lines:
+            line = replace_lines[line.rstrip("\n")] + "\n"
+
         for pass_l in pass_lines:
             if line.startswith(pass_l):
                 line, indent = comment_out(line)
@@ -86,19 +92,17 @@ if __name__=="__main__":
     }
 
     removable_lines = {
-        "REMSG.py": [
-            "import mmh3",
-            "                assert nameHash == entry.hash"
-        ],
         "REMSGUtil.py": [
             "import chardet"
         ]
     }
 
-    pass_lines = {
-        "REMSG.py": [
-            "                nameHash = mmh3"
-        ]
+    pass_lines = {}
+
+    replace_lines = {
+        "REMSG.py": {
+            "import mmh3": "import murmur3 as mmh3"
+        }
     }
 
     python_files = ["REMSG.py", "REMSGUtil.py", "REWString.py", "HexTool.py"]
@@ -107,7 +111,8 @@ if __name__=="__main__":
         rem_f = removable_functions.get(file, [])
         rem_l = removable_lines.get(file, [])
         pass_l = pass_lines.get(file, [])
-        if rem_f == [] and rem_l == [] and pass_l == []:
+        rep_l = replace_lines.get(file, {})
+        if rem_f == [] and rem_l == [] and pass_l == [] and rep_l == {}:
             copy_file(file)
         else:
-            edit_file(file, rem_f, rem_l, pass_l)
+            edit_file(file, rem_f, rem_l, pass_l, rep_l)
@@ -3,17 +3,55 @@
 Notes:
     It'll use only UI related files from *.list.
     It won't take long time to extract.
+    extract_pak.py can extract them without REtool.exe (e.g. on Linux)
+    when the .pak is not encrypted.
 
-    python src/run_retool.py retool pak file_list [-o=out]
+    python src/run_retool.py retool pak file_list [-o=out] [options]
     - retool: path to REtool.exe
     - pak: path to .pak
     - file_list: path to *.list.
     - out: output folder
+    - --shards=N: split the list into N shards and run N extractors at the same time.
+    - --retries=N: run failed shards again up to N times.
+    - --report=json: save results of all shards.
+    UI related paths are saved as src/custom.list. Hashes of all paths in *.list are saved as out/.list_index.
+
+    # Shards
+    Each shard is extracted into its own folder (out/.retool_shards/shard_*) and
+    its files are moved to out when the extractor succeeds.
+    So, failed shards can be retried without broken files in out.
+    Output lines of extractors are printed as soon as they are written, with shard indices.
+
+    # Extractor command
+    Use --command to run another extractor. (e.g. tests/retool_stub.py)
+    It's a command line with placeholders. It runs in the output folder of the shard.
+    - {retool}: path to the retool argument
+    - {list}: .list of the shard
+    - {pak}: path to .pak
+    - {out}: output folder of the shard
+    A shard succeeds when the command returns 0 and prints a line that matches --success_pattern.
 """
 
 import argparse
+import collections
+from concurrent.futures import ThreadPoolExecutor
 import os
+import re
+import shlex
+import shutil
 import subprocess
+import threading
+import time
+from io_util import save_json
+from list_filter import filter_list, print_counts
+
+DEFAULT_COMMAND = "{retool} -h {list} -x {pak} -skipUnknowns -noExtractDir"
+SUCCESS_PATTERN = "^Extracted "
+SHARD_DIR = ".retool_shards"
+INDEX_FILE = ".list_index"  # ListIndex of the .list. It's saved in the output folder.
+# Number of output lines to keep in the report for each shard
+TAIL_LINES = 20
+
 
 def mkdir(dir):
     os.makedirs(dir, exist_ok=True)
@@ -26,15 +64,30 @@ def get_args():
     parser.add_argument('pak', type=str, help='.pak for RE Engine games')
     parser.add_argument('file_list', type=str, help='.list for RETool')
     parser.add_argument('-o', '--out', type=str, default="out", help='output directory.')
+    parser.add_argument('--shards', type=int, default=1, help='Number of extractors to run at the same time.')
+    parser.add_argument('--retries', type=int, default=1, help='Max number of retries for each failed shard.')
+    parser.add_argument('--command', type=str, default=DEFAULT_COMMAND,
+                        help='Extractor command with placeholders. ({retool}, {list}, {pak}, {out})')
+    parser.add_argument('--success_pattern', type=str, default=SUCCESS_PATTERN,
+                        help='Regex for a line that the extractor prints when it succeeds. Use "" to skip the check.')
+    parser.add_argument('--report', type=str, default=None, help='json file to save results of shards.')
     args = parser.parse_args()
-    check_file_path(args.retool, "exe")
+    if args.command == DEFAULT_COMMAND:
+        check_file_path(args.retool, "exe")
+    elif not os.path.isfile(args.retool):
+        raise RuntimeError(f"{args.retool} is NOT a file.")
     check_file_path(args.pak, "pak")
     check_file_path(args.file_list, "list")
+    if args.shards < 1:
+        raise RuntimeError(f"--shards should be 1 or more. ({args.shards})")
+    if args.retries < 0:
+        raise RuntimeError(f"--retries should be 0 or more. ({args.retries})")
     print("Settings")
     print(f"  REtool: {args.retool}")
     print(f"  pak   : {args.pak}")
     print(f"  list  : {args.file_list}")
     print(f"  output: {args.out}")
+    print(f"  shards: {args.shards}")
     return args
 
 
@@ -47,45 +100,161 @@ def check_file_path(file, ext):
         raise RuntimeError(f"{file} is NOT a file.")
 
 
-def run_cmd(cmd):
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (stdout, stderr) = proc.communicate()
-    stdout = stdout.decode()
-    print(stdout)
-    if proc.returncode != 0:
-        err_msg = stderr.decode()
-        if len(err_msg) > 0:
-            raise RuntimeError(err_msg)
-    return stdout
+def split_list(msg_list, shards: int, work_dir) -> list[tuple[str, int]]:
+    """Split a .list into shards of contiguous lines. Returns (shard list, number of paths) for each shard."""
+    with open(msg_list, "rb") as f:
+        lines = [line if line.endswith(b"\n") else line + b"\n" for line in f if line.strip() != b""]
+    size = max(1, -(-len(lines) // shards))
+    mkdir(work_dir)
+    shard_lists = []
+    for i, start in enumerate(range(0, len(lines), size)):
+        shard_list = os.path.join(work_dir, f"shard_{i:03}.list")
+        with open(shard_list, "wb") as f:
+            f.writelines(lines[start:start + size])
+        shard_lists.append((shard_list, len(lines[start:start + size])))
+    return shard_lists
+
+
+def make_command(template: str, values: dict[str, str]) -> list[str]:
+    args = shlex.split(template, posix=os.name != "nt")
+    for key, val in values.items():
+        args = [arg.replace("{" + key + "}", val) for arg in args]
+    return args
+
+
+def move_files(src_dir, out) -> int:
+    """Move all files in src_dir to out. Returns the number of files."""
+    count = 0
+    for root, _, files in os.walk(src_dir):
+        new_dir = os.path.join(out, os.path.relpath(root, src_dir))
+        for file in files:
+            mkdir(new_dir)
+            os.replace(os.path.join(root, file), os.path.join(new_dir, file))
+            count += 1
+    return count
+
+
+class ShardRunner:
+    """Run an extractor for each shard with retries."""
+    def __init__(self, template: str, values: dict[str, str], out, retries=1, success_pattern=SUCCESS_PATTERN):
+        self.template = template
+        self.values = values
+        self.out = out
+        self.retries = retries
+        self.success = re.compile(success_pattern) if success_pattern else None
+        self.__print_lock = threading.Lock()
+
+    def print(self, index: int, line: str):
+        with self.__print_lock:
+            print(f"[{index}] {line}", flush=True)
+
+    def run_once(self, index: int, command: list[str], cwd) -> tuple[int, bool, list[str]]:
+        """Run the command and stream its output. Returns (return code, matched, last lines)."""
+        tail = collections.deque(maxlen=TAIL_LINES)
+        matched = self.success is None
+        proc = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        with proc.stdout:
+            for raw in proc.stdout:
+                line = raw.decode(errors="replace").rstrip()
+                self.print(index, line)
+                tail.append(line)
+                if not matched and self.success.search(line) is not None:
+                    matched = True
+        return proc.wait(), matched, list(tail)
+
+    def run(self, index: int, shard_list, count: int) -> dict:
+        shard_out = os.path.join(os.path.dirname(shard_list), f"shard_{index:03}")
+        values = dict(self.values, list=os.path.abspath(shard_list), out=os.path.abspath(shard_out))
+        command = make_command(self.template, values)
+        result = {"index": index, "list": shard_list, "paths": count, "attempts": 0, "files": 0}
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            result["attempts"] = attempt + 1
+            if attempt > 0:
+                self.print(index, f"Retrying... ({attempt}/{self.retries})")
+            shutil.rmtree(shard_out, ignore_errors=True)
+            mkdir(shard_out)
+            try:
+                returncode, matched, tail = self.run_once(index, command, shard_out)
+                error = None
+                if returncode != 0:
+                    error = f"The extractor returned {returncode}."
+                elif not matched:
+                    error = "The extractor raised an unexpected error."
+            except OSError as e:
+                returncode, tail, error = None, [], str(e)
+            result.update({"returncode": returncode, "error": error, "tail": tail})
+            if error is None:
+                result["files"] = move_files(shard_out, self.out)
+                shutil.rmtree(shard_out, ignore_errors=True)
+                break
+            self.print(index, error)
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+
+def merge_results(results: list[dict], wall_time: float) -> dict:
+    failed = [result["index"] for result in results if result["error"] is not None]
+    return {
+        "summary": {
+            "shards": len(results),
+            "paths": sum(result["paths"] for result in results),
+            "files": sum(result["files"] for result in results),
+            "attempts": sum(result["attempts"] for result in results),
+            "failed": len(failed),
+            "wall_time": wall_time
+        },
+        "failed": failed,
+        "shards": results
+    }
+
 
+def run_retool(retool, msg_list, pak, out, shards=1, retries=1,
+               command=DEFAULT_COMMAND, success_pattern=SUCCESS_PATTERN) -> dict:
+    """Extract files in msg_list with shards.
 
-def run_retool(retool, msg_list, pak, out):
+    Returns:
+        dict: merged report of shards. (See merge_results)
+    """
     print("Running REtool...")
-    batch = os.path.join(os.path.dirname(__file__), "run_retool.bat")
     mkdir(out)
-    stdout = run_cmd(('cmd', '/c',
-                      batch,
-                      os.path.abspath(retool),
-                      os.path.abspath(msg_list),
-                      os.path.abspath(pak),
-                      os.path.abspath(out)))
-    if not stdout.split("\n")[-2].startswith("Extracted "):
-        raise RuntimeError("REtool raised an unexpected error.")
+    work_dir = os.path.join(out, SHARD_DIR)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    start = time.perf_counter()
+    shard_lists = split_list(msg_list, shards, work_dir)
+    values = {"retool": os.path.abspath(retool), "pak": os.path.abspath(pak)}
+    runner = ShardRunner(command, values, out, retries=retries, success_pattern=success_pattern)
+    with ThreadPoolExecutor(max_workers=len(shard_lists) or 1) as executor:
+        futures = [executor.submit(runner.run, i, shard_list, count)
+                   for i, (shard_list, count) in enumerate(shard_lists)]
+        results = [future.result() for future in futures]
+    report = merge_results(results, time.perf_counter() - start)
+    if len(report["failed"]) == 0:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    summary = report["summary"]
+    print(f"Extracted {summary['files']} file(s) with {summary['shards']} shard(s).")
+    return report
 
 
-def make_msg_list(file_list):
-    print("Generating src\custom.list...")
-    batch = os.path.join(os.path.dirname(__file__), "make_list.bat")
-    run_cmd(('cmd', '/c', batch, os.path.abspath(file_list)))
+def make_msg_list(file_list, msg_list, index_file=None):
+    print(f"Generating {msg_list}...")
+    counts = filter_list(file_list, msg_list, index_file=index_file)
+    print_counts(counts)
+    return sum(counts.values())
 
 
 if __name__ == "__main__":
     args = get_args()
-    make_msg_list(args.file_list)
     msg_list = os.path.join(os.path.dirname(__file__), "custom.list")
-    with open(msg_list, "r") as f:
-        f.seek(0, 2)
-        if f.tell() == 0:
-            raise RuntimeError(f"No msg files in {args.file_list}")
-    run_retool(args.retool, msg_list, args.pak, args.out)
-    print(f"Done!")
\ No newline at end of file
+    mkdir(args.out)
+    if make_msg_list(args.file_list, msg_list, index_file=os.path.join(args.out, INDEX_FILE)) == 0:
+        raise RuntimeError(f"No msg files in {args.file_list}")
+    report = run_retool(args.retool, msg_list, args.pak, args.out, shards=args.shards, retries=args.retries,
+                        command=args.command, success_pattern=args.success_pattern)
+    if args.report is not None:
+        save_json(report, args.report)
+        print(f"Saved report to {args.report}")
+    if len(report["failed"]) > 0:
+        shards = ", ".join(str(index) for index in report["failed"])
+        raise RuntimeError(f"REtool failed for shard(s): {shards}")
+    print(f"Done!")
@@ -0,0 +1,172 @@
+"""Walker for source folders.
+
+Notes:
+    It walks a folder with os.scandir, so file types come from cached DirEntry info
+    instead of a stat call for each file.
+    Files are yielded lazily in the same order as sorted(os.listdir) recursion.
+    Each item is (file, out) where out is the output folder that mirrors the source tree.
+
+    # Filters
+    include and exclude are lists of patterns for base names.
+    - Patterns that start with "." are suffixes. "*" in them matches an extension. (e.g. ".msg.*", ".gui.540034")
+    - Other patterns are globs. (e.g. "cs_ui0600.gui.*", "streaming")
+    Excluded folders are not walked.
+
+    # Sample codes
+    from source_walker import walk_files, prefetch_files
+    for file, out in walk_files("natives", "out", include=[".msg.*"]):
+        print(file, out)
+    for file, out, data in prefetch_files(walk_files("natives", "out", include=[".msg.*"])):
+        print(file, len(data))
+
+    # Polling
+    snapshot_files gets mtimes and sizes of files. Compare two snapshots with diff_snapshots
+    to find changed files. It works on any file system because it only uses stat.
+"""
+
+import fnmatch
+import os
+import queue
+import re
+import threading
+
+
+def pattern_to_regex(pattern: str) -> str:
+    if pattern.startswith("."):
+        # Suffix. "*" doesn't match dots. So, ".msg.*" matches "a.msg.22" but not "a.msg.22.json".
+        return "(?s:.*)" + "[^.]*".join(re.escape(part) for part in pattern.split("*")) + r"\Z"
+    return fnmatch.translate(pattern)
+
+
+def compile_patterns(patterns: list[str]):
+    if patterns is None or len(patterns) == 0:
+        return None
+    return re.compile("|".join(f"(?:{pattern_to_regex(pattern)})" for pattern in patterns))
+
+
+def parse_patterns(patterns: str) -> list[str]:
+    """Parse comma separated patterns. (e.g. ".msg.*,.gui.*")"""
+    return [pattern.strip() for pattern in patterns.split(",") if pattern.strip() != ""]
+
+
+class SourceFilter:
+    def __init__(self, include: list[str] = None, exclude: list[str] = None):
+        self.include = compile_patterns(include)
+        self.exclude = compile_patterns(exclude)
+
+    def match_file(self, name: str) -> bool:
+        if self.exclude is not None and self.exclude.match(name):
+            return False
+        return self.include is None or self.include.match(name) is not None
+
+    def match_dir(self, name: str) -> bool:
+        return self.exclude is None or self.exclude.match(name) is None
+
+
+def walk_files(source: str, out: str = "",
+               include: list[str] = None, exclude: list[str] = None,
+               recursive=True, keep_root=True):
+    """Yield (file, out) for files in a folder.
+
+    Args:
+        source: folder or file. A file is yielded with out as it is when it matches the filter.
+        out: output folder.
+        recursive: walk sub folders or not.
+        keep_root: use out/basename(source) as the output folder for the files in source.
+
+    Returns:
+        Iterator of (file, out)
+    """
+    source_filter = SourceFilter(include=include, exclude=exclude)
+    if not os.path.isdir(source):
+        if source_filter.match_file(os.path.basename(source)):
+            yield source, out
+        return
+    if keep_root:
+        out = os.path.join(out, os.path.basename(os.path.normpath(source)))
+    yield from walk_dir(source, out, source_filter, recursive)
+
+
+def walk_dir(directory: str, out: str, source_filter: SourceFilter, recursive: bool):
+    with os.scandir(directory) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_file():
+            if source_filter.match_file(entry.name):
+                yield entry.path, out
+        elif recursive and entry.is_dir() and source_filter.match_dir(entry.name):
+            yield from walk_dir(entry.path, os.path.join(out, entry.name), source_filter, recursive)
+
+
+def snapshot_files(source: str, out: str = "", include: list[str] = None, exclude: list[str] = None,
+                   recursive=True) -> dict[str, tuple[str, int, int]]:
+    """Get (out, mtime_ns, size) for each file. See walk_files for the arguments."""
+    snapshot = {}
+    for file, file_out in walk_files(source, out, include=include, exclude=exclude, recursive=recursive):
+        try:
+            stat = os.stat(file)
+        except OSError:
+            # Removed while walking.
+            continue
+        snapshot[file] = (file_out, stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def diff_snapshots(old: dict, new: dict) -> tuple[list[str], list[str]]:
+    """Get (changed or added files, removed files) between two snapshots."""
+    changed = [file for file, info in new.items() if old.get(file) != info]
+    removed = [file for file in old if file not in new]
+    return changed, removed
+
+
+PREFETCH_DEPTH = 8
+
+
+def prefetch_files(items, depth: int = PREFETCH_DEPTH):
+    """Read files on a background thread while the caller processes previous ones.
+
+    Args:
+        items: iterable of (file, out). (e.g. walk_files(...))
+        depth: max number of files to keep in memory.
+
+    Returns:
+        Iterator of (file, out, data)
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read_files():
+        try:
+            for file, out in items:
+                with open(file, "rb") as f:
+                    data = f.read()
+                if not put((file, out, data)):
+                    return
+        except BaseException as e:
+            put(e)
+            return
+        put(end)
+
+    thread = threading.Thread(target=read_files, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is end:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,35 @@
+import os
+import sys
+
+# Scripts in src import each other as top-level modules.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+import pytest  # noqa: E402
+from REMessage import Message  # noqa: E402
+
+
+def make_msg(entry_count=8, version=22, prefix="ch_mes_Sys_") -> Message:
+    """Make a .msg with Japanese and English text."""
+    msg = Message()
+    msg.version = version
+    msg.langs = [0, 1]
+    msg.attr_types = [2]
+    msg.attr_names = ["note"]
+    for i in range(entry_count):
+        msg.add_entry(f"{prefix}{i:04}", [f"ja text {i}", f"en text {i}"], attributes=[""])
+    return msg
+
+
+@pytest.fixture
+def msg_tree(tmp_path):
+    """Folder with .msg files. Returns (folder, files)."""
+    src = tmp_path / "src"
+    files = []
+    for i in range(12):
+        directory = src / f"dir_{i % 3}"
+        directory.mkdir(parents=True, exist_ok=True)
+        file = str(directory / f"f{i:02}.msg.22")
+        make_msg(prefix=f"ch_mes_{i}_").export_msg(file)
+        files.append(file)
+    return str(src), files
@@ -0,0 +1,44 @@
+"""Stub of REtool.exe for tests.
+
+Notes:
+    It writes each path in the .list into the current folder. The content of a file is its path.
+    The .pak is not read.
+
+    python tests/retool_stub.py list pak [--fail_once=shard_001]
+    - fail_once: crash once for shards whose .list name contains it.
+      A partial file is written before the crash, and a marker is saved next to the .list.
+"""
+
+import argparse
+import os
+import sys
+
+
+def write_file(path):
+    directory = os.path.dirname(path)
+    if directory != "":
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        f.write(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('list', type=str)
+    parser.add_argument('pak', type=str)
+    parser.add_argument('--fail_once', type=str, default=None)
+    args = parser.parse_args()
+    marker = args.list + ".failed"
+    if args.fail_once is not None and args.fail_once in os.path.basename(args.list) and not os.path.exists(marker):
+        open(marker, "w").close()
+        write_file("natives/partial.msg.22")
+        print("Crashed", flush=True)
+        sys.exit(3)
+    count = 0
+    with open(args.list) as f:
+        for line in f:
+            path = line.strip()
+            if path != "":
+                write_file(path)
+                count += 1
+    print(f"Extracted {count} files")
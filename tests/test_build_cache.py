@@ -0,0 +1,41 @@
+from build_cache import BuildManifest, ClassificationCache, hash_json
+
+
+def test_class_cache_keeps_recent_tables(tmp_path):
+    path = str(tmp_path / ClassificationCache.FILE_NAME)
+    hashes = [hash_json({"ignore_entries": [str(i)]}) for i in range(ClassificationCache.MAX_TABLES + 3)]
+    for i, patterns_hash in enumerate(hashes):
+        cache = ClassificationCache(path, patterns_hash)
+        cache.table[f"name{i}"] = i
+        cache.save()
+    cache = ClassificationCache(path, hashes[0])
+    assert cache.table == {}
+    assert list(cache.tables) == hashes[-ClassificationCache.MAX_TABLES:] + [hashes[0]]
+
+    # Using an old table again makes it the newest one.
+    cache = ClassificationCache(path, hashes[-ClassificationCache.MAX_TABLES])
+    cache.save()
+    cache.save()
+    cache = ClassificationCache(path, hashes[-1])
+    assert cache.table == {f"name{len(hashes) - 1}": len(hashes) - 1}
+    assert hashes[-ClassificationCache.MAX_TABLES] in cache.tables
+
+
+def test_manifest_rebuild_still_records(tmp_path):
+    out = str(tmp_path / "out")
+    src = tmp_path / "a.msg.22"
+    src.write_bytes(b"abc")
+    new_file = tmp_path / "out" / "a.msg.22"
+    new_file.parent.mkdir()
+    new_file.write_bytes(b"xyz")
+
+    manifest = BuildManifest(out, {"pairs": []}, rebuild=True)
+    assert not manifest.is_up_to_date(str(src))
+    manifest.update(str(src), [str(new_file)])
+    manifest.save()
+
+    manifest = BuildManifest(out, {"pairs": []})
+    assert manifest.is_up_to_date(str(src))
+    assert manifest.is_up_to_date(str(src), data=b"abc")
+    assert not manifest.is_up_to_date(str(src), data=b"abcd")
+    assert not BuildManifest(out, {"pairs": ["en+ja"]}).is_up_to_date(str(src))
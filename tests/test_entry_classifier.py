@@ -0,0 +1,82 @@
+import random
+import re
+import pytest
+from entry_classifier import EntryClassifier, PatternSet, parse_fast_path, pack_flags
+
+PATTERNS = [
+    ".*_QuestReward$",  # suffix
+    "^Dev1_Term.*",  # prefix
+    "ch_mes_sys",  # prefix without ^
+    "^Exact Name$",  # equal
+    ".*Help.*",  # substring
+    ".*_cap",  # substring without .* at the end
+    "ch_mes_[0-9]+_title$",  # regex
+    ".*Item.*_(?:name|exp)$",  # regex
+]
+# Global flags can't be used in the middle of a joined regex.
+UNJOINABLE = ["(?i)dev2_.*", "Sys_[0-9]+$"]
+
+PIECES = ["ch_mes_sys", "_QuestReward", "Dev1_Term", "Exact Name", "Help", "_cap", "ch_mes_12_title", "Item",
+          "_name", "_exp", "dev2_", "DEV2_", "Sys_", "Sys_1", "\n", "x", "_", "1"]
+
+
+def reference(patterns: list[str], name: str) -> bool:
+    return any(re.match(pattern, name) for pattern in patterns)
+
+
+def random_names(count: int, seed=0) -> list[str]:
+    rng = random.Random(seed)
+    return ["".join(rng.choice(PIECES) for _ in range(rng.randrange(1, 5))) for _ in range(count)]
+
+
+@pytest.mark.parametrize("pattern, expected", [
+    (".*_QuestReward$", ("endswith", "_QuestReward")),
+    ("^Dev1_Term.*", ("startswith", "Dev1_Term")),
+    ("ch_mes_sys", ("startswith", "ch_mes_sys")),
+    ("^Exact Name$", ("equal", "Exact Name")),
+    (".*Help.*", ("in", "Help")),
+    (".*_cap", ("in", "_cap")),
+    ("ch_mes_[0-9]+_title$", None),
+    ("a.b", None),
+])
+def test_fast_paths(pattern, expected):
+    assert parse_fast_path(pattern) == expected
+
+
+@pytest.mark.parametrize("patterns", [PATTERNS, UNJOINABLE, PATTERNS + UNJOINABLE])
+def test_pattern_set_matches_re_match(patterns):
+    pattern_set = PatternSet(patterns)
+    names = random_names(3000) + ["", "Exact Name", "Exact Name\n", "a_QuestReward\n", "Help\nx", "\nHelp"]
+    for name in names:
+        assert pattern_set.match(name) == reference(patterns, name), repr(name)
+
+
+def test_unjoinable_patterns_are_used_one_by_one():
+    pattern_set = PatternSet(UNJOINABLE)
+    assert pattern_set.regex is None
+    assert len(pattern_set.regex_list) == 2
+    assert pattern_set.match("DEV2_a") and pattern_set.match("Sys_12") and not pattern_set.match("a_Sys_1")
+
+
+def test_classifier_cache():
+    classifier = EntryClassifier.from_json({
+        "ignore_entries": [".*Help.*"],
+        "one_line_entries": ["ch_mes_sys"],
+        "three_lines_entries": [".*_cap", "^Exact Name$"]
+    })
+    assert classifier.classify("ch_mes_sys_Help_cap") == (True, True, True)
+    assert classifier.classify("Exact Name") == (False, False, True)
+    assert classifier.classify("other") == (False, False, False)
+    new_flags = classifier.pop_new_flags()
+    assert new_flags == {"ch_mes_sys_Help_cap": 7, "Exact Name": 4, "other": 0}
+    assert classifier.pop_new_flags() == {}
+
+    # Cached names are not matched again.
+    classifier.cache["other"] = pack_flags((True, False, False))
+    assert classifier.classify("other") == (True, False, False)
+    assert classifier.match("other") == (False, False, False)
+
+    worker = EntryClassifier.from_json({})
+    worker.add_flags(new_flags)
+    assert worker.classify("Exact Name") == (False, False, True)
+    assert worker.pop_new_flags() == new_flags
@@ -0,0 +1,31 @@
+import pytest
+from REFontSlot import FontSlot
+
+
+def make_json(version: int) -> dict:
+    slots = []
+    for i in range(FontSlot.SLOT_COUNT):
+        slot = {"files": [{"name": f"natives/stm/font/f{i}_{k}.oft", "unk": [1.0, 2.5, float(k), 0.0]}
+                          for k in range(i % 3)]}
+        if version == 4 and i % 2 == 1:
+            slot["unk0"] = [{"names": ["a", f"b{i}", ""], "unk": [0.5, 1.0], "unk2": [1, 2, 3, i]}]
+        slots.append(slot)
+    return {"type": "FontSlot", "version": version, "slots": slots}
+
+
+@pytest.mark.parametrize("version", [2, 4])
+def test_bytes_round_trip(tmp_path, version):
+    j = make_json(version)
+    fslt = FontSlot()
+    fslt.set_json(j)
+    data = fslt.to_bytes()
+    # Writing twice gives the same data.
+    assert fslt.to_bytes() == data
+    assert FontSlot.from_bytes(data).get_json() == fslt.get_json()
+    assert FontSlot.from_buffer(bytearray(data)).to_bytes() == data
+
+    file = str(tmp_path / f"a.fslt.{version}")
+    fslt.export_fslt(file)
+    imported = FontSlot()
+    imported.import_fslt(file)
+    assert imported.to_bytes() == data
@@ -0,0 +1,112 @@
+import struct
+import pytest
+from REGUI import GUIResource, PropType
+from edit_gui import edit_gui_data
+
+# name, type, value
+ATTRIBUTES = [
+    ("Position", PropType.Vec3, [10.0, 20.0, 30.0]),
+    ("Size", PropType.Size, [100.0, 50.0]),
+    ("Rect", PropType.Rect, [1.0, 2.0, 3.0, 4.0]),
+    ("Alpha", PropType.F32, 0.5),
+    ("Count", PropType.U32, 3),
+    ("Message", PropType.Str16, "テキスト"),
+]
+FLOAT_FORMATS = {PropType.Vec3: "<3f", PropType.Size: "<2f", PropType.Rect: "<4f"}
+
+
+class GUIBuilder:
+    """Make a minimal .gui.540034 with elements that have sub elements and no clips."""
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def alloc(self, data: bytes, align=8) -> int:
+        self.buf.extend(b"\x00" * (-len(self.buf) % align))
+        offset = len(self.buf)
+        self.buf.extend(data)
+        return offset
+
+    def str8(self, string: str) -> int:
+        return self.alloc(string.encode() + b"\x00", 1)
+
+    def str16(self, string: str) -> int:
+        return self.alloc(string.encode("utf-16-le") + b"\x00\x00", 2)
+
+    def sub_element(self, name: str) -> int:
+        head = self.alloc(bytes(48 + 40))
+        attrs = self.alloc(bytes(8 + 32 * len(ATTRIBUTES)))
+        struct.pack_into("<Q", self.buf, attrs, len(ATTRIBUTES))
+        for i, (attr_name, prop_type, value) in enumerate(ATTRIBUTES):
+            offset = attrs + 8 + 32 * i
+            struct.pack_into("<IiQ", self.buf, offset, prop_type, -1, self.str8(attr_name))
+            if prop_type == PropType.F32:
+                struct.pack_into("<f", self.buf, offset + 16, value)
+            elif prop_type == PropType.U32:
+                struct.pack_into("<Q", self.buf, offset + 16, value)
+            elif prop_type == PropType.Str16:
+                struct.pack_into("<Q", self.buf, offset + 16, self.str16(value))
+            else:
+                value_offs = self.alloc(struct.pack(FLOAT_FORMATS[prop_type], *value))
+                struct.pack_into("<Q", self.buf, offset + 16, value_offs)
+        extra = self.alloc(struct.pack("<Q", 0))
+        struct.pack_into("<5Q", self.buf, head + 48, self.str16(name), self.str8("via.gui.Text"), attrs, 0, extra)
+        return head
+
+    def element(self, name: str, sub_names: list[str]) -> int:
+        head = self.alloc(bytes(48))
+        subs = [self.sub_element(sub_name) for sub_name in sub_names]
+        subs_offs = self.alloc(struct.pack(f"<Q{len(subs)}Q", len(subs), *subs))
+        clips_offs = self.alloc(struct.pack("<II", 0, 0))
+        struct.pack_into("<4Q", self.buf, head + 16,
+                         self.str16(name), self.str8("via.gui.Control"), subs_offs, clips_offs)
+        return head
+
+    def build(self, elements: dict[str, list[str]]) -> bytes:
+        head = self.alloc(bytes(80 + 8 * len(elements)))
+        struct.pack_into("<I4s", self.buf, head, 540034, GUIResource.MAGIC)
+        offsets = [self.element(name, sub_names) for name, sub_names in elements.items()]
+        view = self.sub_element("view")
+        struct.pack_into(f"<QQ{len(offsets)}Q", self.buf, head + 64, view, len(offsets), *offsets)
+        return bytes(self.buf)
+
+
+def make_gui() -> bytes:
+    return GUIBuilder().build({"main": ["c_caption", "c_value"], "c_mode": ["c_preview"]})
+
+
+def test_gui_round_trip():
+    data = make_gui()
+    gui = GUIResource.from_bytes(bytearray(data))
+    assert gui.to_bytes() == data
+    assert [elm.name for elm in gui.elements] == ["main", "c_mode"]
+    sub_elm = gui["main"]["c_caption"]
+    assert [(attr.name, attr.value) for attr in sub_elm.attributes] == [
+        (name, value) for name, _, value in ATTRIBUTES
+    ]
+    assert gui.view.name == "view"
+
+    for name, value in [("Alpha", 0.25), ("Count", 7), ("Rect", [5.0, 6.0, 7.0, 8.0])]:
+        sub_elm[name].set_value(value)
+    new = GUIResource.from_bytes(gui.to_bytes())
+    values = {attr.name: attr.value for attr in new["main"]["c_caption"].attributes}
+    assert (values["Alpha"], values["Count"], values["Rect"]) == (0.25, 7, [5.0, 6.0, 7.0, 8.0])
+    # Other sub elements are not changed.
+    assert [attr.value for attr in new["main"]["c_value"].attributes] == [value for _, _, value in ATTRIBUTES]
+
+    with pytest.raises(RuntimeError, match="require 3 values"):
+        sub_elm["Position"].set_value([1.0, 2.0])
+    with pytest.raises(RuntimeError, match="Can't change"):
+        sub_elm["Message"].set_value("new")
+
+
+def test_edit_gui_keeps_other_components():
+    data = make_gui()
+    new_data = edit_gui_data("cs_ui3070.gui.540034", data)
+    new = GUIResource.from_bytes(new_data)
+    assert new["main"]["c_caption"]["Position"].value == [10.0, -20.0, 30.0]
+    assert new["main"]["c_value"]["Position"].value == [10.0, 20.0, 30.0]
+    # Only the edited value is changed.
+    changed = [i for i, (a, b) in enumerate(zip(data, new_data)) if a != b]
+    offset = GUIResource.from_bytes(data)["main"]["c_caption"]["Position"].value_offs
+    assert all(offset <= i < offset + 8 for i in changed)
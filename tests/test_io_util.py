@@ -0,0 +1,145 @@
+import io
+import os
+import stat
+import struct
+import pytest
+import io_util
+from io_util import (UMASK, U64, BinaryReader, write_file_atomic, copy_file_atomic, open_temp,
+                     commit_temp, find_wstr_end, read_str, read_wstr, save_ndjson, iter_ndjson)
+
+
+def get_mode(file):
+    return stat.S_IMODE(os.stat(file).st_mode)
+
+
+def test_write_file_atomic_skips_same_content(tmp_path):
+    file = str(tmp_path / "a.msg.22")
+    assert write_file_atomic(b"abc", file)
+    mtime = os.stat(file).st_mtime_ns
+    assert not write_file_atomic(b"abc", file)
+    assert os.stat(file).st_mtime_ns == mtime
+    assert write_file_atomic(b"abcd", file)
+    with open(file, "rb") as f:
+        assert f.read() == b"abcd"
+    assert os.listdir(tmp_path) == ["a.msg.22"]
+
+
+def test_save_ndjson_can_be_read_while_writing(tmp_path):
+    file = str(tmp_path / "a.ndjson")
+    seen = []
+
+    def records():
+        for i in range(3):
+            # Records yielded so far are already in the file.
+            seen.append(list(iter_ndjson(file)) if os.path.exists(file) else None)
+            yield {"i": i}
+
+    assert save_ndjson(records(), file, flush_lines=1, atomic=False)
+    assert seen == [[], [{"i": 0}], [{"i": 0}, {"i": 1}]]
+    assert list(iter_ndjson(file)) == [{"i": 0}, {"i": 1}, {"i": 2}]
+
+    # Atomic saves show nothing until the end and skip the same content.
+    seen.clear()
+    os.remove(file)
+    assert save_ndjson(records(), file, flush_lines=1)
+    assert seen == [None, None, None]
+    assert not save_ndjson(records(), file)
+    assert os.listdir(tmp_path) == ["a.ndjson"]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX permissions")
+def test_outputs_have_default_permissions(tmp_path):
+    # mkstemp makes 0600 files. Outputs should have the same permissions as open() makes.
+    expected = 0o666 & ~UMASK
+    file = str(tmp_path / "a.msg.22")
+    write_file_atomic(b"abc", file)
+    assert get_mode(file) == expected
+
+    copied = str(tmp_path / "b.msg.22")
+    copy_file_atomic(file, copied)
+    assert get_mode(copied) == expected
+
+    committed = str(tmp_path / "c.msg.22")
+    f, tmp = open_temp(committed)
+    with f:
+        f.write(b"xyz")
+    assert commit_temp(tmp, committed)
+    assert get_mode(committed) == expected
+
+
+def test_binary_reader_values_and_arrays(tmp_path):
+    data = (struct.pack("<hHiIQf", -2, 3, -4, 5, 6, 1.5) + struct.pack("<3I", 7, 8, 9)
+            + struct.pack("<2Q", 10, 11) + struct.pack("<2f", 0.25, -0.5))
+    file = tmp_path / "a.bin"
+    file.write_bytes(data)
+    for reader in [BinaryReader(data), BinaryReader(memoryview(data)), BinaryReader.open_file(str(file))]:
+        with reader:
+            assert len(reader) == len(data)
+            values = [reader.read_int16(), reader.read_uint16(), reader.read_int32(), reader.read_uint32(),
+                      reader.read_uint64(), reader.read_float32()]
+            assert values == [-2, 3, -4, 5, 6, 1.5]
+            assert reader.read_uint32_array(3).tolist() == [7, 8, 9]
+            assert reader.read_uint64_array(2).tolist() == [10, 11]
+            assert reader.read_float32_array(2).tolist() == [0.25, -0.5]
+            assert reader.tell() == len(data)
+            with pytest.raises(struct.error):
+                reader.read_uint32_array(1)
+
+            # unpack_from doesn't move the position.
+            assert reader.unpack_from(U64, 12) == (6,)
+            assert reader.tell() == len(data)
+            reader.seek(2)
+            assert reader.unpack(struct.Struct("<Hi")) == (3, -4)
+            assert reader.seek(-4, 2) == len(data) - 4
+            assert reader.read() == struct.pack("<f", -0.5)
+            assert reader.read(4) == b""
+            assert reader.seek(-4, 1) == len(data) - 4
+
+
+def test_binary_reader_empty_file(tmp_path):
+    file = tmp_path / "empty.bin"
+    file.write_bytes(b"")
+    with BinaryReader.open_file(str(file)) as reader:
+        assert len(reader) == 0
+        assert reader.read() == b""
+
+
+def test_find_wstr_end_is_aligned():
+    # "A䈀" has "\x00\x00" at an odd position.
+    data = "A䈀".encode("utf-16-le") + b"\x00\x00"
+    assert find_wstr_end(data, 0) == 4
+    assert find_wstr_end(b"\x41\x00", 0) == -1
+
+
+def test_binary_reader_string_pool():
+    names = b"Position\x00Position\x00"
+    wide = "テキスト".encode("utf-16-le") + b"\x00\x00"
+    reader = BinaryReader(names + wide + b"x")
+    assert reader.read_str() == "Position"
+    assert reader.tell() == 9
+    assert reader.read_str() == "Position"
+    assert reader.read_wstr() == "テキスト"
+    assert reader.tell() == len(names) + len(wide)
+    # Strings are decoded once for each offset and interned.
+    assert reader.read_str_at(0) is reader.read_str_at(9)
+    assert reader.read_wstr_at(len(names)) == "テキスト"
+    assert reader.tell() == len(names) + len(wide)
+    with pytest.raises(RuntimeError, match="not terminated"):
+        reader.read_str()
+    with pytest.raises(RuntimeError, match="not terminated"):
+        reader.read_wstr_at(len(names) + len(wide))
+
+
+def test_read_null_terminated_from_file(monkeypatch):
+    monkeypatch.setattr(io_util, "STR_CHUNK_SIZE", 4)
+    text = "long text " * 10
+    f = io.BytesIO(b"abc\x00" + text.encode("utf-16-le") + b"\x00\x00" + b"tail")
+    assert read_str(f) == "abc"
+    assert f.tell() == 4
+    assert read_wstr(f) == text
+    # The position is right after the terminator, not at the end of the file.
+    assert f.read() == b"tail"
+    f.seek(0)
+    f.read(len(f.getvalue()) - 4)
+    with pytest.raises(RuntimeError, match="not terminated"):
+        read_wstr(f)
@@ -0,0 +1,75 @@
+import list_filter
+from list_filter import filter_list, load_index
+
+LIST_LINES = [
+    "natives/STM/Message/Sys/ch_mes_sys.msg.22",
+    "natives/X64/Message/Sys/ch_mes_sys.msg.22.X64",
+    "natives/STM/GUI/ui0100.gui.540034",
+    "natives/STM/GUI/ui0100.gui.540034.STM",
+    "natives/STM/Font/main.fslt.1",
+    "natives/STM/Texture/ui0100.tex.143221013",
+    "natives/STM/messages/readme.txt",
+    "",
+]
+
+
+def findstr(lines, word):
+    """Same as findstr in make_list.bat"""
+    return [line for line in lines if word in line]
+
+
+def test_default_rules_match_findstr(tmp_path):
+    file_list = tmp_path / "game.list"
+    file_list.write_text("\n".join(LIST_LINES) + "\n")
+    out = tmp_path / "custom.list"
+    counts = filter_list(str(file_list), str(out))
+    assert counts == {"msg": 2, "fslt": 1, "gui": 2}
+    expected = set(findstr(LIST_LINES, ".msg.") + findstr(LIST_LINES, ".fslt.") + findstr(LIST_LINES, ".gui."))
+    assert set(out.read_text().splitlines()) == expected
+
+
+def test_index_is_hashed_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(list_filter, "HASH_BATCH_SIZE", 3)
+    file_list = tmp_path / "game.list"
+    file_list.write_text("\n".join(LIST_LINES) + "\n")
+    out = str(tmp_path / "custom.list")
+    index_file = str(tmp_path / "game.list.index")
+    filter_list(str(file_list), out, index_file=index_file)
+    index = load_index(str(file_list), index_file)
+    assert len(index) == len(LIST_LINES) - 1
+    assert all(line in index for line in LIST_LINES if line != "")
+    assert "natives/STM/none.msg.22" not in index
+
+    # The index is current. Paths are not hashed again.
+    monkeypatch.setattr(list_filter, "hash_list_paths", None)
+    filter_list(str(file_list), out, index_file=index_file)
+    monkeypatch.undo()
+
+    file_list.write_text("natives/STM/new.msg.22\n")
+    filter_list(str(file_list), out, index_file=index_file)
+    index = load_index(str(file_list), index_file)
+    assert len(index) == 1 and "natives/STM/new.msg.22" in index
+
+
+def test_list_is_read_once(tmp_path, monkeypatch):
+    file_list = tmp_path / "game.list"
+    file_list.write_text("\n".join(LIST_LINES) + "\n")
+    out = str(tmp_path / "custom.list")
+    index_file = str(tmp_path / "game.list.index")
+    opened = []
+
+    def counting_open(file, *args, **kwargs):
+        opened.append(file)
+        return open(file, *args, **kwargs)
+
+    monkeypatch.setattr(list_filter, "open", counting_open, raising=False)
+    monkeypatch.setattr(list_filter, "hash_file_content", None)
+    # No index. Paths are hashed while streaming.
+    filter_list(str(file_list), out, index_file=index_file)
+    assert opened.count(str(file_list)) == 1
+    # The index is current.
+    opened.clear()
+    filter_list(str(file_list), out, index_file=index_file)
+    assert opened.count(str(file_list)) == 1
+    monkeypatch.undo()
+    assert load_index(str(file_list), index_file).digest == list_filter.hash_file_content(str(file_list))
@@ -0,0 +1,210 @@
+import os
+import pytest
+import make_dualsub
+from build_cache import BuildManifest
+from entry_classifier import EntryClassifier
+from REMessage import Message
+from conftest import make_msg
+
+
+def make_unchanged_msg(file):
+    """Make a .msg that has no entries to merge."""
+    msg = Message()
+    msg.version = 22
+    msg.langs = [0, 1]
+    for i, text in enumerate(["", "same text"]):
+        msg.add_entry(f"ch_mes_{i:04}", [text, text])
+    msg.export_msg(file)
+
+
+def merge_tree(src, out, manifest=None, **kwargs):
+    targets = [(out, 1, 0)]  # English + Japanese
+    return make_dualsub.merge_dir_pairs(src, targets, EntryClassifier.from_json({}),
+                                        manifest=manifest, **kwargs)
+
+
+def assert_same_outputs(src, files, out1, out2):
+    for file in files:
+        rel = os.path.relpath(file, os.path.dirname(src))
+        with open(os.path.join(out1, rel), "rb") as f1, open(os.path.join(out2, rel), "rb") as f2:
+            assert f1.read() == f2.read()
+
+
+class FailingManifest(BuildManifest):
+    def __init__(self, out, error: type):
+        super().__init__(out, {})
+        self.error = error
+
+    def update(self, file, outputs):
+        raise self.error("update failed")
+
+
+def test_pipeline_matches_serial(msg_tree, tmp_path):
+    src, files = msg_tree
+    serial, pipeline = str(tmp_path / "serial"), str(tmp_path / "pipeline")
+    assert merge_tree(src, serial) == []
+    assert merge_tree(src, pipeline, pipeline=True, jobs=2) == []
+    assert_same_outputs(src, files, serial, pipeline)
+
+
+def test_low_memory_reports_peak_memory(msg_tree, tmp_path, capsys):
+    src, files = msg_tree
+    serial, low_memory = str(tmp_path / "serial"), str(tmp_path / "low_memory")
+    assert merge_tree(src, serial) == []
+    capsys.readouterr()
+    profile = []
+    assert merge_tree(src, low_memory, low_memory=True, profile=profile) == []
+    # The stream writer splices the pool. So, decoded entries are compared instead of bytes.
+    for file in files:
+        rel = os.path.relpath(file, os.path.dirname(src))
+        expected, actual = Message(), Message()
+        expected.import_msg(os.path.join(serial, rel))
+        actual.import_msg(os.path.join(low_memory, rel))
+        assert [(entry.name, entry.langs) for entry in actual.entries] == \
+            [(entry.name, entry.langs) for entry in expected.entries]
+    # Peak memory is printed and recorded for each file without --profile_report.
+    assert capsys.readouterr().out.count("Peak memory: ") == len(files)
+    assert sorted(stats["file"] for stats in profile) == sorted(files)
+    assert all(stats["peak_memory"] > 0 for stats in profile)
+
+
+def test_pipeline_records_writer_errors(msg_tree, tmp_path, capsys):
+    src, files = msg_tree
+    out = str(tmp_path / "out")
+    failed = merge_tree(src, out, manifest=FailingManifest(out, ValueError), pipeline=True, jobs=1)
+    assert sorted(file for file, _ in failed) == sorted(files)
+    assert "Failed to write outputs of" in capsys.readouterr().out
+
+
+def test_pipeline_raises_when_writer_stops(msg_tree, tmp_path):
+    # The writer thread dies with the first file. More files than the queue size should not hang.
+    src, _ = msg_tree
+    out = str(tmp_path / "out")
+    with pytest.raises(RuntimeError, match="writer thread"):
+        merge_tree(src, out, manifest=FailingManifest(out, SystemExit), pipeline=True, jobs=1)
+
+
+def test_unchanged_file_is_not_removed_when_out_is_its_folder(tmp_path):
+    # e.g. python make_dualsub.py a.msg.22 -o .
+    file = str(tmp_path / "a.msg.22")
+    make_unchanged_msg(file)
+    targets = [(str(tmp_path), 1, 0)]
+    classifier = EntryClassifier.from_json({})
+    assert make_dualsub.merge_msg_pairs(file, targets, classifier) == []
+    assert os.path.isfile(file)
+
+    outputs = []
+    make_dualsub.merge_msg_pairs(file, targets, classifier, outputs=outputs)
+    assert outputs == []
+    make_dualsub.merge_msg_pairs(file, targets, classifier, low_memory=True)
+    assert os.path.isfile(file)
+
+    # Stale outputs in other folders are still removed.
+    out = tmp_path / "out"
+    out.mkdir()
+    (out / "a.msg.22").write_bytes(b"old")
+    make_dualsub.merge_msg_pairs(file, [(str(out), 1, 0)], classifier)
+    assert not (out / "a.msg.22").exists()
+
+
+def run_watch(monkeypatch, src, out, patterns_path, steps, **kwargs):
+    """Run watch and call a step before each poll. It stops after the last step."""
+    steps = list(steps)
+
+    def sleep(_):
+        if len(steps) == 0:
+            raise KeyboardInterrupt()
+        steps.pop(0)()
+
+    monkeypatch.setattr(make_dualsub.time, "sleep", sleep)
+    make_dualsub.watch(src, out, [("en", "ja")], [(out, 1, 0)], patterns_path, **kwargs)
+
+
+def read_langs(file) -> list[list[str]]:
+    msg = Message()
+    msg.import_msg(file)
+    return [entry.langs for entry in msg.entries]
+
+
+def bump_mtime(path):
+    # mtimes of quick edits can be the same on coarse file systems.
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_watch_rebuilds_changed_files_and_patterns(monkeypatch, tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    file = str(src / "a.msg.22")
+    make_msg(entry_count=3, prefix="ch_mes_").export_msg(file)
+    patterns_path = tmp_path / "patterns.json"
+    patterns_path.write_text("{}")
+    out = str(tmp_path / "out")
+    new_file = os.path.join(out, "src", "a.msg.22")
+    history = []
+
+    def edit_source():
+        history.append(read_langs(new_file))
+        msg = make_msg(entry_count=3, prefix="ch_mes_")
+        msg.entries[1].set_content(["新しい", "new text"])
+        msg.export_msg(file)
+        bump_mtime(file)
+
+    def ignore_entry():
+        history.append(read_langs(new_file))
+        patterns_path.write_text('{"ignore_entries": [".*0002$"]}')
+        bump_mtime(patterns_path)
+
+    def ignore_all():
+        history.append(read_langs(new_file))
+        patterns_path.write_text('{"ignore_entries": [".*"]}')
+        bump_mtime(patterns_path)
+
+    def check_removed():
+        history.append(os.path.exists(new_file))
+
+    run_watch(monkeypatch, str(src), out, str(patterns_path), [edit_source, ignore_entry, ignore_all, check_removed])
+    merged = [[f"ja text {i}\r\nen text {i}", f"en text {i}\r\nja text {i}"] for i in range(3)]
+    assert history[0] == merged
+    # Only the changed file is merged again.
+    assert history[1] == [merged[0], ["新しい\r\nnew text", "new text\r\n新しい"], merged[2]]
+    # Entries reclassified by the new patterns get the original text back.
+    assert history[2] == [merged[0], ["新しい\r\nnew text", "new text\r\n新しい"], ["ja text 2", "en text 2"]]
+    # The output is removed when no entries are merged.
+    assert history[3] is False
+    assert read_langs(file)[1] == ["新しい", "new text"]
+
+
+@pytest.mark.parametrize("pass_through", ["copy", "hardlink"])
+@pytest.mark.parametrize("mode", ["direct", "outputs", "low_memory"])
+def test_pass_through_unchanged_file(tmp_path, capsys, pass_through, mode):
+    file = str(tmp_path / "a.msg.22")
+    make_unchanged_msg(file)
+    with open(file, "rb") as f:
+        data = f.read()
+    classifier = EntryClassifier.from_json({})
+
+    def merge(out):
+        kwargs = {"pass_through": pass_through, "low_memory": mode == "low_memory"}
+        if mode == "outputs":
+            outputs = []
+            new_files = make_dualsub.merge_msg_pairs(file, [(out, 1, 0)], classifier, outputs=outputs, **kwargs)
+            make_dualsub.write_outputs(outputs, pass_through=pass_through)
+            return new_files
+        return make_dualsub.merge_msg_pairs(file, [(out, 1, 0)], classifier, **kwargs)
+
+    out = str(tmp_path / "out")
+    new_file = os.path.join(out, "a.msg.22")
+    assert merge(out) == [new_file]
+    with open(new_file, "rb") as f:
+        assert f.read() == data
+    assert os.path.samefile(file, new_file) == (pass_through == "hardlink")
+    capsys.readouterr()
+    assert merge(out) == [new_file]
+    assert f"{new_file} is up to date." in capsys.readouterr().out
+
+    # The output is the source itself. It's kept as it is.
+    assert merge(str(tmp_path)) == [file]
+    with open(file, "rb") as f:
+        assert f.read() == data
+    assert sorted(os.listdir(tmp_path)) == ["a.msg.22", "out"]
@@ -0,0 +1,136 @@
+import uuid
+import pytest
+from REMessage import (Message, MessageStreamWriter, KEY, ENTRY_HEAD, encrypt, decrypt,
+                       iter_ndjson_entries)
+from conftest import make_msg
+
+
+def decrypt_bytes(data: bytes) -> bytes:
+    """Byte by byte version of decrypt"""
+    prev = 0
+    plain = bytearray()
+    for i, byte in enumerate(data):
+        plain.append(byte ^ prev ^ KEY[i % len(KEY)])
+        prev = byte
+    return bytes(plain)
+
+
+def read_msg(data: bytes, **kwargs) -> Message:
+    msg = Message()
+    msg.read(data, **kwargs)
+    return msg
+
+
+def test_encrypt_and_decrypt():
+    plain = "テキスト text\n".encode("utf-16-le") * 40
+    enc = encrypt(plain)
+    assert decrypt_bytes(enc) == plain
+    assert decrypt(enc) == plain
+    # Parts of the pool can be encrypted and decrypted with their positions.
+    half = 37
+    assert encrypt(plain[:half]) + encrypt(plain[half:], start=half, prev=enc[half - 1]) == enc
+    assert decrypt(enc[half:], start=half, prev=enc[half - 1]) == plain[half:]
+
+
+@pytest.mark.parametrize("version", [12, 22])
+def test_new_message_round_trip(version):
+    msg = Message()
+    msg.version = version
+    msg.langs = [0, 1]
+    msg.attr_types = [0, 1, 2]
+    msg.attr_names = ["count", "rate", "note"]
+    guid = uuid.UUID("01234567-89ab-cdef-0123-456789abcdef")
+    msg.add_entry("ch_mes_0000", ["こんにちは", "Hello"], guid=guid, attributes=[-3, 0.5, "memo"])
+    msg.add_entry("ch_mes_0001", ["", "Empty Japanese"])
+
+    new = read_msg(msg.to_bytes())
+    assert (new.version, new.langs, new.attr_types, new.attr_names) == (version, [0, 1], [0, 1, 2],
+                                                                        ["count", "rate", "note"])
+    assert [entry.name for entry in new.entries] == ["ch_mes_0000", "ch_mes_0001"]
+    assert [entry.langs for entry in new.entries] == [["こんにちは", "Hello"], ["", "Empty Japanese"]]
+    assert new.entries[0].guid == guid
+    assert new.entries[0].attributes == [-3, 0.5, "memo"]
+    assert new.entries[1].attributes == [0, 0, ""]
+    assert new.to_bytes() == msg.to_bytes()
+
+
+def test_edit_keeps_untouched_entries():
+    original = make_msg().to_bytes()
+    msg = read_msg(original)
+    assert msg.to_bytes() == original
+    msg.entries[3].set_content(["ja text 3", "new text"])
+    new = read_msg(msg.to_bytes())
+    assert [entry.langs for entry in new.entries] == [
+        ["ja text 3", "new text"] if i == 3 else [f"ja text {i}", f"en text {i}"] for i in range(8)
+    ]
+    assert [entry.name for entry in new.entries] == [entry.name for entry in read_msg(original).entries]
+
+
+def test_stream_writer_matches_edit(tmp_path):
+    original = make_msg(entry_count=20).to_bytes()
+    file = tmp_path / "new.msg.22"
+    msg = read_msg(original, stream=True)
+    with open(file, "w+b") as f:
+        writer = MessageStreamWriter(msg, f)
+        for entry in msg.iter_entries():
+            if entry.name.endswith("5"):
+                entry.set_content([entry.langs[1], entry.langs[0]])
+            writer.write_entry(entry)
+        writer.close()
+    assert writer.changed_count == 2
+
+    new = read_msg(file.read_bytes())
+    for i, entry in enumerate(new.entries):
+        texts = [f"ja text {i}", f"en text {i}"]
+        assert entry.langs == (texts[::-1] if i % 10 == 5 else texts)
+
+
+def test_broken_name_hash_is_detected():
+    msg = read_msg(make_msg().to_bytes())
+    data = bytearray(msg.to_bytes())
+    hash_offset = msg.entries[2].head_offset + ENTRY_HEAD.size - 20
+    data[hash_offset] ^= 1
+    with pytest.raises(RuntimeError, match="Hash of an entry name"):
+        read_msg(bytes(data))
+    with pytest.raises(RuntimeError, match="Hash of an entry name"):
+        list(read_msg(bytes(data), stream=True).iter_entries())
+    assert len(read_msg(bytes(data), verify=False).entries) == 8
+
+
+def test_ndjson_round_trip(tmp_path):
+    file = str(tmp_path / "a.msg.22.ndjson")
+    msg = read_msg(make_msg(entry_count=3).to_bytes())
+    assert msg.export_ndjson(file)
+    assert not msg.export_ndjson(file)
+    records = list(iter_ndjson_entries(file))
+    assert records == [(entry.name, entry.guid, dict(zip(msg.langs, entry.langs))) for entry in msg.entries]
+
+
+def test_stream_reads_long_text():
+    # Longer than the decryption window of StreamStringPool.
+    msg = make_msg(entry_count=2)
+    long_text = "long text " * 100
+    msg.entries[1].set_content([long_text, "short"])
+    new = read_msg(msg.to_bytes(), stream=True)
+    assert [entry.langs for entry in new.iter_entries()] == [["ja text 0", "en text 0"], [long_text, "short"]]
+
+
+def test_pool_is_rebuilt_when_most_entries_change():
+    original = make_msg(entry_count=40).to_bytes()
+    msg = read_msg(original)
+    msg.entries[0].set_content(["ja text 0", "new text"])
+    spliced = msg.to_bytes()
+    # New text of few changes is appended to the original pool.
+    assert spliced[msg.data_offs:len(original)] == original[msg.data_offs:]
+    assert len(spliced) > len(original)
+
+    msg = read_msg(original)
+    for entry in msg.entries:
+        entry.set_content([entry.langs[0], entry.langs[1].replace("en", "EN")])
+    assert msg.get_replaced_size() > len(original) * Message.REWRITE_RATIO
+    rebuilt = msg.to_bytes()
+    # Replaced strings are not kept.
+    assert len(rebuilt) == len(original)
+    new = read_msg(rebuilt)
+    assert [entry.langs for entry in new.entries] == [[f"ja text {i}", f"EN text {i}"] for i in range(40)]
+    assert [entry.guid for entry in new.entries] == [entry.guid for entry in msg.entries]
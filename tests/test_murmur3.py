@@ -0,0 +1,59 @@
+import random
+import pytest
+import murmur3
+from murmur3 import murmur3_32, murmur3_32_lanes, murmur3_32_many, hash_wstrs, hash_wstr, hash_path, hash_paths
+
+# Known values of MurmurHash3_x86_32
+VECTORS = [
+    (b"", 0, 0),
+    (b"", 1, 0x514E28B7),
+    (b"", 0xFFFFFFFF, 0x81F16F39),
+    (b"\x00\x00\x00\x00", 0, 0x2362F9DE),
+    (b"aaaa", 0x9747B28C, 0x5A97808A),
+    (b"abc", 0, 0xB3DD93FA),
+    (b"hello", 0, 0x248BFA47),
+    (b"Hello, world!", 0x9747B28C, 0x24884CBA),
+    (b"The quick brown fox jumps over the lazy dog", 0x9747B28C, 0x2FA826CD),
+]
+
+
+def random_buffers(count, max_length, seed=0):
+    rng = random.Random(seed)
+    return [rng.randbytes(rng.randrange(max_length + 1)) for _ in range(count)]
+
+
+@pytest.mark.parametrize("data, seed, expected", VECTORS)
+def test_known_vectors(data, seed, expected):
+    assert murmur3_32(data, seed) == expected
+
+
+def test_lanes_match_scalar():
+    buffers = [data for data, _, _ in VECTORS] + random_buffers(200, 40)
+    for seed in [0, 0x9747B28C, murmur3.SEED]:
+        assert murmur3_32_lanes(buffers, seed) == [murmur3_32(buffer, seed) for buffer in buffers]
+
+
+def test_many_matches_scalar(monkeypatch):
+    # Small batches to split buffers by size and by length.
+    monkeypatch.setattr(murmur3, "BATCH_SIZE", 64)
+    buffers = random_buffers(500, 300, seed=1) + random_buffers(3, 2000, seed=2)
+    assert murmur3_32_many(buffers, murmur3.SEED) == [murmur3_32(buffer, murmur3.SEED) for buffer in buffers]
+    assert murmur3_32_many(buffers[:3]) == [murmur3_32(buffer) for buffer in buffers[:3]]
+
+
+def test_wstr_and_path_hashes():
+    names = [f"ch_mes_Sys_{i:04}" for i in range(50)] + ["ch_mes_Sys_0000", "テキスト", ""]
+    expected = [murmur3_32(name.encode("utf-16-le"), murmur3.SEED) for name in names]
+    assert hash_wstrs(names) == expected
+    assert [hash_wstr(name) for name in names] == expected
+    paths = [f"natives/STM/Message/Sys/ch_mes_{i}.msg.22" for i in range(20)] + ["\\natives\\STM\\a.msg.22"]
+    assert hash_paths(paths) == [hash_path(path) for path in paths]
+    assert hash_path("\\natives\\STM\\a.msg.22") == hash_path("NATIVES/stm/A.MSG.22")
+
+
+def test_mmh3_compatible_hash():
+    # Values from the mmh3 documentation
+    assert murmur3.hash("foo") == -156908512
+    assert murmur3.hash("foo", 42) == -1322301282
+    assert murmur3.hash("foo", signed=False) == 4138058784
+    assert murmur3.hash(b"hello") == 0x248BFA47
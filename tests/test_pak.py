@@ -0,0 +1,97 @@
+import os
+import struct
+import pytest
+from REPak import (PakWriter, PakReader, PakEntry, extract_paths, HEADER, ENTRY, ENTRY_V2, MAGIC,
+                   FEATURE_ENCRYPTED_TABLE, COMPRESSION_NONE, COMPRESSION_DEFLATE)
+
+FILES = {
+    "natives/STM/Message/a.msg.22": b"text " * 1000,
+    "natives/STM/Message/b.msg.22": os.urandom(4096),  # incompressible
+    "natives/STM/GUI/c.gui.540034": b"",
+}
+
+
+def write_pak(file, files, **kwargs):
+    with PakWriter(str(file), **kwargs) as pak:
+        for path, data in files.items():
+            pak.add(path, data)
+
+
+@pytest.mark.parametrize("compress, jobs", [(False, 1), (True, 1), (True, 4)])
+def test_pak_round_trip(tmp_path, compress, jobs):
+    file = tmp_path / "mod.pak"
+    write_pak(file, FILES, compress=compress, jobs=jobs)
+    data = file.read_bytes()
+    assert HEADER.unpack_from(data, 0) == (MAGIC, 4, 0, 0, len(FILES), 0)
+    with PakReader(str(file)) as pak:
+        assert len(pak.entries) == len(FILES)
+        for path, content in FILES.items():
+            assert pak.read(path) == content
+        # Paths are case insensitive.
+        assert pak.read("NATIVES/stm/message/A.MSG.22") == FILES["natives/STM/Message/a.msg.22"]
+        assert pak.find("natives/STM/Message/none.msg.22") is None
+        compressed = pak.find("natives/STM/Message/a.msg.22")
+        raw = pak.find("natives/STM/Message/b.msg.22")
+        assert compressed.compression == (COMPRESSION_DEFLATE if compress else COMPRESSION_NONE)
+        assert compressed.compressed_size < compressed.size or not compress
+        assert raw.compression == COMPRESSION_NONE and raw.compressed_size == raw.size
+
+
+def test_pak_writer_skips_same_content(tmp_path):
+    file = tmp_path / "mod.pak"
+    with PakWriter(str(file)) as pak:
+        pak.add("natives/STM/a.msg.22", b"abc")
+        with pytest.raises(RuntimeError, match="already in the pak"):
+            pak.add("NATIVES/STM/A.msg.22", b"def")
+    pak = PakWriter(str(file))
+    pak.add("natives/STM/a.msg.22", b"abc")
+    assert not pak.close()
+
+
+def test_extract_paths_prefers_later_paks(tmp_path):
+    base, patch = tmp_path / "re_chunk_000.pak", tmp_path / "re_chunk_000.pak.patch_001.pak"
+    write_pak(base, FILES, compress=True)
+    write_pak(patch, {"natives/STM/Message/a.msg.22": b"patched"})
+    out = str(tmp_path / "out")
+    paths = list(FILES) + ["natives/STM/Message/none.msg.22"]
+    with PakReader(str(base)) as base_pak, PakReader(str(patch)) as patch_pak:
+        files, missing = extract_paths([base_pak, patch_pak], paths, out, jobs=2)
+    assert missing == ["natives/STM/Message/none.msg.22"]
+    assert sorted(files) == sorted(os.path.join(out, path) for path in FILES)
+    expected = dict(FILES, **{"natives/STM/Message/a.msg.22": b"patched"})
+    for path, content in expected.items():
+        with open(os.path.join(out, path), "rb") as f:
+            assert f.read() == content
+
+
+def test_read_v2_table(tmp_path):
+    file = tmp_path / "old.pak"
+    content = b"old pak"
+    entry = PakEntry("natives/STM/a.msg.22")
+    offset = HEADER.size + ENTRY_V2.size
+    file.write_bytes(HEADER.pack(MAGIC, 2, 0, 0, 1, 0)
+                     + ENTRY_V2.pack(offset, len(content), entry.hash_lower, entry.hash_upper)
+                     + content)
+    with PakReader(str(file)) as pak:
+        assert pak.read("natives/STM/a.msg.22") == content
+
+
+def test_encrypted_paks_are_rejected(tmp_path):
+    file = tmp_path / "mod.pak"
+    write_pak(file, FILES)
+    data = bytearray(file.read_bytes())
+
+    # Encrypted entry
+    attributes_offset = HEADER.size + ENTRY.size - 16
+    struct.pack_into("<Q", data, attributes_offset, 1 << 16)
+    file.write_bytes(data)
+    with PakReader(str(file)) as pak:
+        entry = next(iter(pak.entries.values()))
+        with pytest.raises(RuntimeError, match="Encrypted files"):
+            pak.read_entry(entry)
+
+    # Encrypted table
+    HEADER.pack_into(data, 0, MAGIC, 4, 0, FEATURE_ENCRYPTED_TABLE, len(FILES), 0)
+    file.write_bytes(data)
+    with pytest.raises(RuntimeError, match="encrypted table"):
+        PakReader(str(file))
@@ -0,0 +1,100 @@
+import os
+import sys
+import pytest
+from run_retool import SHARD_DIR, split_list, move_files, run_retool
+
+STUB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retool_stub.py")
+PATHS = [f"natives/STM/Message/ch_mes_{i:02}.msg.22" for i in range(9)]
+
+
+def stub_command(fail_once=None):
+    command = f'"{sys.executable}" "{STUB}" {{list}} {{pak}}'
+    if fail_once is not None:
+        command += f" --fail_once={fail_once}"
+    return command
+
+
+@pytest.fixture
+def msg_list(tmp_path):
+    file = tmp_path / "custom.list"
+    file.write_text("\n".join(PATHS) + "\n\n")
+    return str(file)
+
+
+@pytest.fixture
+def pak(tmp_path):
+    file = tmp_path / "re_chunk_000.pak"
+    file.write_bytes(b"")
+    return str(file)
+
+
+def read_tree(out):
+    """Get the content of each file in out. Shard folders are skipped."""
+    files = {}
+    for root, dirs, names in os.walk(out):
+        if SHARD_DIR in dirs:
+            dirs.remove(SHARD_DIR)
+        for name in names:
+            file = os.path.join(root, name)
+            with open(file) as f:
+                files[os.path.relpath(file, out).replace(os.sep, "/")] = f.read()
+    return files
+
+
+def test_split_list(msg_list, tmp_path):
+    shard_lists = split_list(msg_list, 4, str(tmp_path / "work"))
+    assert [count for _, count in shard_lists] == [3, 3, 3]
+    lines = []
+    for shard_list, _ in shard_lists:
+        with open(shard_list) as f:
+            lines += f.read().splitlines()
+    assert lines == PATHS
+
+
+def test_move_files_merges_folders(tmp_path):
+    src, out = tmp_path / "shard", tmp_path / "out"
+    (src / "a" / "b").mkdir(parents=True)
+    (src / "a" / "b" / "new.msg.22").write_text("new")
+    (src / "a" / "same.msg.22").write_text("shard")
+    (out / "a").mkdir(parents=True)
+    (out / "a" / "same.msg.22").write_text("old")
+    (out / "a" / "old.msg.22").write_text("old")
+    assert move_files(str(src), str(out)) == 2
+    assert read_tree(str(out)) == {"a/b/new.msg.22": "new", "a/same.msg.22": "shard", "a/old.msg.22": "old"}
+    assert read_tree(str(src)) == {}
+
+
+def test_retry_failed_shard(msg_list, pak, tmp_path):
+    out = str(tmp_path / "out")
+    report = run_retool("REtool.exe", msg_list, pak, out, shards=3, retries=1, command=stub_command("shard_001"))
+    # The partial file of the failed attempt is not moved to out.
+    assert read_tree(out) == {path: path for path in PATHS}
+    assert not os.path.exists(os.path.join(out, SHARD_DIR))
+    assert report["failed"] == []
+    assert [shard["attempts"] for shard in report["shards"]] == [1, 2, 1]
+    assert [shard["files"] for shard in report["shards"]] == [3, 3, 3]
+    summary = report["summary"]
+    assert (summary["shards"], summary["paths"], summary["files"], summary["attempts"]) == (3, 9, 9, 4)
+    assert summary["failed"] == 0
+
+
+def test_failed_shard_is_reported(msg_list, pak, tmp_path):
+    out = str(tmp_path / "out")
+    report = run_retool("REtool.exe", msg_list, pak, out, shards=3, retries=0, command=stub_command("shard_001"))
+    assert report["failed"] == [1]
+    failed = report["shards"][1]
+    assert failed["returncode"] == 3 and failed["files"] == 0
+    assert failed["tail"] == ["Crashed"]
+    assert report["summary"]["files"] == 6 and report["summary"]["failed"] == 1
+    assert set(read_tree(out)) == set(PATHS[:3] + PATHS[6:])
+    # Shard folders are kept to check the failed ones.
+    assert os.path.isdir(os.path.join(out, SHARD_DIR))
+
+
+def test_success_pattern(msg_list, pak, tmp_path):
+    out = str(tmp_path / "out")
+    report = run_retool("REtool.exe", msg_list, pak, out, shards=1, retries=0,
+                        command=stub_command(), success_pattern="^Done")
+    assert report["failed"] == [0]
+    assert report["shards"][0]["error"] == "The extractor raised an unexpected error."
+    assert read_tree(out) == {}
@@ -0,0 +1,100 @@
+import os
+import re
+import pytest
+from source_walker import walk_files, prefetch_files, snapshot_files, diff_snapshots, pattern_to_regex
+import edit_gui
+from test_gui import make_gui
+
+TREE = [
+    "natives/STM/Message/a.msg.22",
+    "natives/STM/Message/a.msg.22.json",
+    "natives/STM/Message/sub/b.msg.22",
+    "natives/STM/GUI/cs_ui3070.gui.540034",
+    "natives/STM/GUI/ui0100.gui.540034",
+    "natives/STM/streaming/c.msg.22",
+    "natives/STM/readme.txt",
+]
+
+
+@pytest.fixture
+def tree(tmp_path):
+    src = tmp_path / "src"
+    for path in TREE:
+        file = src / path
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_bytes(path.encode())
+    return str(src)
+
+
+def rel_items(items, src, out):
+    """(file, out) -> (file relative to src, out relative to the output folder)"""
+    return [(os.path.relpath(file, src).replace(os.sep, "/"), os.path.relpath(file_out, out).replace(os.sep, "/"))
+            for file, file_out in items]
+
+
+def test_pattern_to_regex():
+    suffix = re.compile(pattern_to_regex(".msg.*"))
+    assert suffix.match("a.msg.22") and not suffix.match("a.msg.22.json")
+    glob = re.compile(pattern_to_regex("cs_ui*.gui.*"))
+    assert glob.match("cs_ui3070.gui.540034") and not glob.match("ui0100.gui.540034")
+
+
+def test_walk_files_with_filters(tree, tmp_path):
+    out = str(tmp_path / "out")
+    items = walk_files(tree, out, include=[".msg.*"], exclude=["streaming"])
+    assert rel_items(items, tree, out) == [
+        ("natives/STM/Message/a.msg.22", "src/natives/STM/Message"),
+        ("natives/STM/Message/sub/b.msg.22", "src/natives/STM/Message/sub"),
+    ]
+    items = walk_files(tree, out, include=[".gui.*", "*.txt"], exclude=["ui0100*"], keep_root=False)
+    assert rel_items(items, tree, out) == [
+        ("natives/STM/GUI/cs_ui3070.gui.540034", "natives/STM/GUI"),
+        ("natives/STM/readme.txt", "natives/STM"),
+    ]
+    message = os.path.join(tree, "natives/STM/Message")
+    assert rel_items(walk_files(message, out, recursive=False), message, out) == [
+        ("a.msg.22", "Message"), ("a.msg.22.json", "Message")
+    ]
+    # A file is yielded with out as it is.
+    file = os.path.join(message, "a.msg.22")
+    assert list(walk_files(file, out, include=[".msg.*"])) == [(file, out)]
+    assert list(walk_files(file, out, include=[".gui.*"])) == []
+
+
+def test_prefetch_files(tree):
+    items = list(walk_files(tree, "out", include=[".msg.*"]))
+    prefetched = list(prefetch_files(iter(items), depth=1))
+    assert [(file, out) for file, out, _ in prefetched] == items
+    for file, _, data in prefetched:
+        with open(file, "rb") as f:
+            assert f.read() == data
+    with pytest.raises(FileNotFoundError):
+        list(prefetch_files([(os.path.join(tree, "none.msg.22"), "out")]))
+
+
+def test_snapshots(tree):
+    old = snapshot_files(tree, "out", include=[".msg.*"])
+    changed_file = os.path.join(tree, "natives/STM/Message/a.msg.22")
+    with open(changed_file, "ab") as f:
+        f.write(b"!")
+    removed_file = os.path.join(tree, "natives/STM/streaming/c.msg.22")
+    os.remove(removed_file)
+    new = snapshot_files(tree, "out", include=[".msg.*"])
+    assert diff_snapshots(old, new) == ([changed_file], [removed_file])
+
+
+def test_edit_gui_dir_layout(tmp_path):
+    src = tmp_path / "natives"
+    for path in ["STM/GUI/cs_ui3070.gui.540034", "STM/GUI/ui0100.gui.540034"]:
+        file = src / path
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_bytes(make_gui())
+    out = tmp_path / "out"
+    edit_gui.edit_gui_dir(str(src), str(out))
+    assert sorted(str(file.relative_to(out)).replace(os.sep, "/") for file in out.rglob("*") if file.is_file()) == [
+        "natives/STM/GUI/cs_ui3070.gui.540034"
+    ]
+    edit_gui.dump_gui(str(src), str(tmp_path / "json"), no_clip=True)
+    assert sorted(file.name for file in (tmp_path / "json" / "natives" / "STM" / "GUI").iterdir()) == [
+        "cs_ui3070.gui.540034.json", "ui0100.gui.540034.json"
+    ]